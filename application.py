@@ -20,28 +20,47 @@ if sys.stdout.encoding != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.detach(), encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.detach(), encoding='utf-8')
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response, send_file
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import os
+import io
 import base64
 import json
 import uuid
+import hashlib
 import time
+import threading
 import re
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
 from typing import Dict, Tuple, List, Set
 from modules.rag_system import RAGSystem
-from modules.speech_processor import SpeechProcessor
+from modules.answer_cache import normalize_question
+from modules.speech_processor import SpeechProcessor, AudioUploadError
 from modules.openai_tts_client import OpenAITTSClient
 from modules.coe_font_client import CoeFontClient
 from modules.emotion_voice_params import get_emotion_voice_params
-from openai import OpenAI
+from modules.audio_cache import AudioCache, make_engine_cache_key, parse_data_url, to_data_url, estimate_audio_duration
+from modules.greeting_audio_bank import GreetingAudioBank
+from modules.static_audio_prerender import load_static_audio_manifest, warm_audio_cache_from_manifest, PRERENDER_EMOTIONS
+from modules.audio_chunk_pipeline import OrderedAudioChunkPipeline
+from modules.audio_encoder import AudioEncoder
+from modules.ffmpeg_pool import get_ffmpeg_pool
+from modules.audio_postprocess import AudioPostProcessor
+from modules.tts_hedging import HedgedTTSRunner, get_engine_preference
+from modules.circuit_breaker import CircuitBreaker, start_breaker_probes
+from modules.lip_sync import analyze_audio, LIP_SYNC_FPS
+from modules.audio_splicer import splice_audio
+from modules.phrase_audio_library import PhraseAudioLibrary
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from modules.http_transport import get_openai_client, prewarm_connections, get_transport_stats
+from modules.single_flight import get_single_flight, make_flight_key, create_chat_completion, get_coalescing_stats
 
 # 静的Q&Aシステム
-from static_qa_data import get_static_response, STATIC_QA_PAIRS
+from static_qa_data import (get_static_response_multilang, get_staged_response_multilang, get_current_stage,
+                            get_repeat_question_prefix, STATIC_QA_PAIRS, REPEAT_QUESTION_PREFIXES)
 
 # 環境変数をロード
 load_dotenv()
@@ -63,7 +82,8 @@ socketio = SocketIO(
     engineio_logger=False,  # ログ出力を抑制
     allow_upgrades=True,
     transports=['websocket', 'polling'],
-    max_http_buffer_size=1e8,
+    # 録音はチャンクに分けて送られるため、1メッセージの上限は従来の一括送信（Base64）が収まる程度にする
+    max_http_buffer_size=int(os.getenv('SOCKETIO_MAX_BUFFER_BYTES', str(16 * 1024 * 1024))),
     path='/socket.io/',
     always_connect=True,
     cookie=False,
@@ -315,27 +335,61 @@ except Exception as e:
 speech_processor = SpeechProcessor()
 tts_client = OpenAITTSClient()
 
+# ffmpeg（音声変換・デコード）は常駐ワーカープロセスで実行する
+get_ffmpeg_pool().start(socketio.start_background_task, socketio.sleep)
+
 # COEFONTクライアントの初期化
-try:
-    coe_font_client = CoeFontClient()
-    use_coe_font = coe_font_client.is_available()
-    print(f"🎵 CoeFont利用可能: {use_coe_font}")
-    if not use_coe_font:
-        print("⚠️ CoeFont設定が不完全です:")
-        print(f"   COEFONT_ACCESS_KEY: {'✓' if os.getenv('COEFONT_ACCESS_KEY') else '✗'}")
-        print(f"   COEFONT_ACCESS_SECRET: {'✓' if os.getenv('COEFONT_ACCESS_SECRET') else '✗'}")
-        print(f"   COEFONT_VOICE_ID: {'✓' if os.getenv('COEFONT_VOICE_ID') else '✗'}")
-    else:
-        print("✅ CoeFont設定完了")
-        # 初期化時に接続テストを実行
-        if coe_font_client.test_connection():
-            print("✅ CoeFont接続テスト成功")
-        else:
-            print("❌ CoeFont接続テスト失敗")
-            use_coe_font = False
-except Exception as e:
-    print(f"❌ CoeFont初期化エラー: {e}")
-    use_coe_font = False
+coe_font_client = CoeFontClient()
+coe_font_configured = coe_font_client.is_available()
+print(f"🎵 CoeFont設定: {'完了' if coe_font_configured else '不完全'}")
+if not coe_font_configured:
+    print("⚠️ CoeFont設定が不完全です:")
+    print(f"   COEFONT_ACCESS_KEY: {'✓' if os.getenv('COEFONT_ACCESS_KEY') else '✗'}")
+    print(f"   COEFONT_ACCESS_SECRET: {'✓' if os.getenv('COEFONT_ACCESS_SECRET') else '✗'}")
+    print(f"   COEFONT_VOICE_ID: {'✓' if os.getenv('COEFONT_VOICE_ID') else '✗'}")
+
+# 上流APIへの接続を起動時に確立しておく（初回リクエストのTLSハンドシェイクを省く）
+socketio.start_background_task(prewarm_connections)
+
+# TTSエンジンごとのサーキットブレーカー（接続状態は起動時と障害時のプローブで確認）
+def make_tts_breaker(name, probe):
+    return CircuitBreaker(
+        name,
+        window=int(os.getenv('TTS_BREAKER_WINDOW', '20')),
+        min_calls=int(os.getenv('TTS_BREAKER_MIN_CALLS', '5')),
+        failure_rate_threshold=float(os.getenv('TTS_BREAKER_FAILURE_RATE', '0.5')),
+        slow_call_seconds=float(os.getenv('TTS_BREAKER_SLOW_SECONDS', '10')),
+        slow_rate_threshold=float(os.getenv('TTS_BREAKER_SLOW_RATE', '0.8')),
+        open_seconds=float(os.getenv('TTS_BREAKER_OPEN_SECONDS', '30')),
+        probe=probe
+    )
+
+tts_breakers = {
+    'coe_font': make_tts_breaker('coe_font', coe_font_client.ping),
+    'openai_tts': make_tts_breaker('openai_tts', tts_client.ping)
+}
+probed_breakers = [tts_breakers['openai_tts']]
+if coe_font_configured:
+    probed_breakers.append(tts_breakers['coe_font'])
+start_breaker_probes(
+    probed_breakers,
+    socketio.start_background_task,
+    socketio.sleep,
+    interval=float(os.getenv('TTS_BREAKER_PROBE_INTERVAL', '5'))
+)
+
+def is_coe_font_available():
+    """CoeFontが設定済みで、ブレーカーが通している状態か"""
+    return coe_font_configured and tts_breakers['coe_font'].is_available()
+
+# TTS音声キャッシュ（メモリLRU＋ワーカー共有ディスク）
+audio_cache = AudioCache()
+
+# 配信用の音声圧縮（CoeFontのWAVをOpus/MP3に変換）
+audio_encoder = AudioEncoder()
+
+# 合成音声の後処理（無音除去・音量正規化・サンプリングレート統一）。後処理後の音声をキャッシュ・配信する
+audio_postprocessor = AudioPostProcessor(decode_pcm=audio_encoder.decode_pcm)
 
 # キャッシュ統計情報
 cache_stats = {
@@ -344,7 +398,26 @@ cache_stats = {
     'cache_misses': 0,
     'total_time_saved': 0.0,
     'coe_font_requests': 0,
-    'openai_tts_requests': 0
+    'openai_tts_requests': 0,
+    'tts_cache_hits': 0,
+    'tts_cache_misses': 0,
+    'tts_cache_bytes_served': 0,
+    'audio_http_requests': 0,
+    'audio_http_not_modified': 0,
+    'audio_http_bytes_sent': 0,
+    'audio_binary_messages': 0,
+    'audio_binary_bytes': 0,
+    'streamed_turns': 0,
+    'streamed_audio_chunks': 0,
+    'streamed_first_audio_seconds': 0.0,
+    'response_partials': 0,
+    'deferred_audio_requests': 0,
+    'deferred_audio_pending': 0,
+    'deferred_audio_rejected': 0,
+    'deferred_audio_failures': 0,
+    'deferred_audio_seconds': 0.0,
+    'spliced_audio': 0,
+    'spliced_audio_cache_hits': 0
 }
 
 # ====== 🧠 会話記憶システム用のデータ構造（強化版） ======
@@ -378,28 +451,30 @@ def calculate_relationship_level(conversation_count):
     
     return RELATIONSHIP_LEVELS[0]
 
+# ====== 🎯 関係性レベル別の挨拶メッセージ ======
+RELATIONSHIP_GREETINGS = {
+    'ja': {
+        'formal': "こんにちは〜！私は京友禅の職人で、手描友禅を15年やっているREIといいます。友禅染のことなら何でも聞いてくださいね。着物や染色について、何か知りたいことはありますか？",
+        'slightly_casual': "どんどん興味が湧いてきた？もっとお話しよう♪",
+        'casual': "もっと友禅の話をしてマスターになろう",
+        'friendly': "かなり詳しくなってきたね！まだまだなんでも答えるで〜",
+        'friend': "おめでとう！もう友禅マスターやね♪",
+        'bestfriend': "ここまで来たらもう親友やね♪"
+    },
+    'en': {
+        'formal': "Hello! I am Rei, a Kyoto Yuzen artisan with 15 years of experience in hand-painted Yuzen. Please feel free to ask me anything about Yuzen dyeing, kimono, or traditional textile arts. Is there anything you'd like to know?",
+        'slightly_casual': "Are you getting more and more interested? Let's talk more♪",
+        'casual': "Let's talk more about Yuzen and become a master.",
+        'friendly': "You've become quite knowledgeable! I'll still answer any questions you have~",
+        'friend': "Congratulations! You're now a Yuzen master!",
+        'bestfriend': "If you've come this far, you're already best friends"
+    }
+}
+
 def get_relationship_adjusted_greeting(language, relationship_style):
     """関係性レベルに応じた挨拶メッセージを生成"""
-    greetings = {
-        'ja': {
-            'formal': "こんにちは〜！私は京友禅の職人で、手描友禅を15年やっているREIといいます。友禅染のことなら何でも聞いてくださいね。着物や染色について、何か知りたいことはありますか？",
-            'slightly_casual': "どんどん興味が湧いてきた？もっとお話しよう♪",
-            'casual': "もっと友禅の話をしてマスターになろう",
-            'friendly': "かなり詳しくなってきたね！まだまだなんでも答えるで〜",
-            'friend': "おめでとう！もう友禅マスターやね♪",
-            'bestfriend': "ここまで来たらもう親友やね♪"
-        },
-        'en': {
-            'formal': "Hello! I am Rei, a Kyoto Yuzen artisan with 15 years of experience in hand-painted Yuzen. Please feel free to ask me anything about Yuzen dyeing, kimono, or traditional textile arts. Is there anything you'd like to know?",
-            'slightly_casual': "Are you getting more and more interested? Let's talk more♪",
-            'casual': "Let's talk more about Yuzen and become a master.",
-            'friendly': "You've become quite knowledgeable! I'll still answer any questions you have~",
-            'friend': "Congratulations! You're now a Yuzen master!",
-            'bestfriend': "If you've come this far, you're already best friends"
-        }
-    }
-    
-    return greetings.get(language, greetings['ja']).get(relationship_style, greetings[language]['formal'])
+    greetings = RELATIONSHIP_GREETINGS.get(language, RELATIONSHIP_GREETINGS['ja'])
+    return greetings.get(relationship_style, greetings['formal'])
 
 def get_session_data(session_id):
     """セッションデータを取得（感情履歴対応版）"""
@@ -515,10 +590,6 @@ def update_emotion_history(session_id, emotion, mental_state=None):
                 'timestamp': datetime.now().isoformat()
             })
 
-def normalize_question(question):
-    """質問を正規化（重複判定用）"""
-    return question.lower().replace('？', '').replace('?', '').replace('。', '').replace('、', '').replace('！', '').replace('!', '').strip()
-
 def get_question_count(session_id, visitor_id, question):
     """質問の回数を取得"""
     normalized = normalize_question(question)
@@ -614,43 +685,266 @@ def get_context_prompt(conversation_history, question_count=1, relationship_styl
     
     return "\n".join(context_parts)
 
-# 音声生成関数（CoeFontを優先）
-def generate_audio_by_language(text, language, emotion_params=None):
-    """言語に応じて適切な音声エンジンを使用（CoeFont優先）"""
+def get_tts_cache_key(text, engine, emotion_params=None):
+    """エンジンごとの実効パラメータを含めた音声キャッシュキーを生成"""
+    return make_engine_cache_key(
+        text, engine, emotion_params,
+        coe_font_client=coe_font_client if engine == 'coe_font' else None,
+        tts_client=tts_client,
+        postprocess=audio_postprocessor.fingerprint
+    )
+
+# 音声はソケットにBase64で埋め込まず /audio/<キャッシュキー> から配信する
+# （無効にした場合はSocket.IOのバイナリ添付で送る。サーバー内部では常に /audio/<キー> の参照で扱う）
+AUDIO_URL_DELIVERY = os.getenv('AUDIO_URL_DELIVERY', 'true').lower() == 'true'
+AUDIO_URL_PREFIX = '/audio/'
+AUDIO_HTTP_MAX_AGE = int(os.getenv('AUDIO_HTTP_MAX_AGE', str(365 * 24 * 3600)))
+AUDIO_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+def get_encoded_audio(cache_key, codec, source=None):
+    """
+    圧縮形式に変換した音声を取得（未変換なら変換してキャッシュに保存）
+    
+    Returns:
+        (バイト列, MIMEタイプ, 変換後のキャッシュキー)、変換できなければNone
+    """
+    variant_key = audio_encoder.variant_key(cache_key, codec)
+    cached = audio_cache.peek(variant_key)
+    if cached is not None:
+        return cached[0], cached[1], variant_key
+    
+    source = source or audio_cache.peek(cache_key)
+    if source is None or not audio_encoder.should_encode(source[1], codec):
+        return None
+    encoded = audio_encoder.encode(source[0], codec)
+    if encoded is None:
+        return None
+    encoded_bytes, encoded_mime, _ = encoded
+    audio_cache.put(variant_key, encoded_bytes, encoded_mime)
+    return encoded_bytes, encoded_mime, variant_key
+
+def audio_reference(cache_key, audio_bytes, mime):
+    """キャッシュ済みの音声の参照（/audio/<キー>、圧縮配信する場合は ?codec= 付き）"""
+    codec = audio_encoder.codec if audio_encoder.should_encode(mime) else None
+    url = f"{AUDIO_URL_PREFIX}{cache_key}"
+    return f"{url}?codec={codec}" if codec else url
+
+def client_audio(audio):
+    """
+    音声の参照をクライアントへ送る形にする
+    （URL配信が無効なら、キャッシュの音声を {'data': バイト列, 'mime': MIMEタイプ} のバイナリ添付にする）
+    """
+    if AUDIO_URL_DELIVERY or not audio or not audio.startswith(AUDIO_URL_PREFIX):
+        return audio
+    source_key, _, query = audio[len(AUDIO_URL_PREFIX):].partition('?')
+    entry = audio_cache.peek(source_key)
+    if entry is None:
+        return None
+    codec = query[len('codec='):] if query.startswith('codec=') else None
+    if codec:
+        encoded = get_encoded_audio(source_key, codec, entry)
+        if encoded:
+            entry = encoded[:2]
+    cache_stats['audio_binary_messages'] += 1
+    cache_stats['audio_binary_bytes'] += len(entry[0])
+    return {'data': entry[0], 'mime': entry[1]}
+
+def lookup_cached_audio(cache_key):
+    """音声キャッシュを参照し、ヒットすれば音声の参照（URLまたはdata URL）を返す"""
+    cached = audio_cache.get(cache_key)
+    if cached is None:
+        cache_stats['tts_cache_misses'] += 1
+        return None
+    audio_bytes, mime = cached
+    cache_stats['tts_cache_hits'] += 1
+    cache_stats['tts_cache_bytes_served'] += len(audio_bytes)
+    print(f"💾 音声キャッシュヒット: [audio_data {len(audio_bytes)} bytes]")
+    return audio_reference(cache_key, audio_bytes, mime)
+
+def store_processed_audio(cache_key, audio_bytes, mime, engine):
+    """
+    合成直後の音声を後処理してからキャッシュに保存し、音声の参照を返す
+    """
+    try:
+        processed = audio_postprocessor.process(audio_bytes, mime, engine)
+    except Exception as e:
+        # キーには後処理の指紋が含まれるため、未処理の音声は保存せずそのまま返す
+        print(f"❌ 音声後処理エラー ({engine}): {e}")
+        return to_data_url(audio_bytes, mime)
+    if processed is None:
+        return store_audio_bytes(cache_key, audio_bytes, mime)
+    return store_audio_bytes(cache_key, processed, 'audio/wav')
+
+def store_audio_bytes(cache_key, audio_bytes, mime):
+    """
+    音声のバイト列をキャッシュに保存し、音声の参照を返す
+    （キャッシュに保存できなかった場合はdata URL）
+    """
+    audio_cache.put(cache_key, audio_bytes, mime)
+    if not audio_cache.contains(cache_key):
+        return to_data_url(audio_bytes, mime)
+    if audio_encoder.should_encode(mime):
+        # 配信前に圧縮しておき、クライアントの初回取得を待たせない
+        get_encoded_audio(cache_key, audio_encoder.codec, (audio_bytes, mime))
+    return audio_reference(cache_key, audio_bytes, mime)
+
+# 口の開き具合（リップシンク）と再生時間をサーバー側で解析して音声と一緒に送る
+LIP_SYNC_ENABLED = os.getenv('LIP_SYNC_ENABLED', 'true').lower() == 'true'
+
+def lip_sync_cache_key(source_key):
+    """リップシンク情報のキャッシュキー（元の音声のキーから決まる）"""
+    return hashlib.sha256(f"{source_key}:lipsync:{LIP_SYNC_FPS}".encode('utf-8')).hexdigest()
+
+def get_audio_metadata(audio):
+    """
+    音声の参照（URLまたはdata URL）から再生時間とリップシンク用エンベロープを取得
+    （解析結果は音声キャッシュに保存し、同じ音声では再解析しない）
+    
+    Returns:
+        {'audioDuration': 秒, 'lipSync': {'duration', 'fps', 'envelope'}} （応答データに展開して使う）
+    """
+    metadata = {'audioDuration': None, 'lipSync': None}
+    if not audio:
+        return metadata
+    
+    entry = None
+    if audio.startswith(AUDIO_URL_PREFIX):
+        source_key = audio[len(AUDIO_URL_PREFIX):].split('?', 1)[0]
+    else:
+        entry = parse_data_url(audio)
+        if not entry[0]:
+            return metadata
+        source_key = hashlib.sha256(entry[0]).hexdigest()
+    
+    metadata_key = lip_sync_cache_key(source_key)
+    cached = audio_cache.peek(metadata_key) if LIP_SYNC_ENABLED else None
+    if cached is not None:
+        lip_sync = json.loads(cached[0].decode('utf-8'))
+        return {'audioDuration': lip_sync['duration'], 'lipSync': lip_sync}
+    
+    entry = entry or audio_cache.peek(source_key)
+    if entry is None:
+        return metadata
+    audio_bytes, mime = entry
+    
+    lip_sync = None
+    if LIP_SYNC_ENABLED:
+        try:
+            lip_sync = analyze_audio(audio_bytes, mime, decode_pcm=audio_encoder.decode_pcm)
+        except Exception as e:
+            print(f"❌ リップシンク解析エラー: {e}")
+    if lip_sync is None:
+        # 解析できない場合はヘッダから再生時間だけ推定
+        duration = estimate_audio_duration(audio_bytes, mime)
+        metadata['audioDuration'] = round(duration, 3) if duration is not None else None
+        return metadata
+    
+    audio_cache.put(metadata_key, json.dumps(lip_sync).encode('utf-8'), 'application/json')
+    return {'audioDuration': lip_sync['duration'], 'lipSync': lip_sync}
+
+# ====== TTSエンジンの選択とヘッジ ======
+TTS_HEDGING_ENABLED = os.getenv('TTS_HEDGING_ENABLED', 'true').lower() == 'true'
+
+TTS_ENGINE_PREFERENCE = get_engine_preference()
+
+# ヘッジ用のスレッドプール（generate_audio_by_language自体が tts_executor 上で呼ばれるため別プールにする）
+tts_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TTS_MAX_CONCURRENCY', '3')) * 2,
+    thread_name_prefix='tts-hedge'
+)
+
+tts_hedger = HedgedTTSRunner(
+    executor=tts_hedge_executor,
+    percentile=float(os.getenv('TTS_HEDGE_PERCENTILE', '90')),
+    min_delay=float(os.getenv('TTS_HEDGE_MIN_DELAY', '1.0')),
+    max_delay=float(os.getenv('TTS_HEDGE_MAX_DELAY', '8.0')),
+    default_delay=float(os.getenv('TTS_HEDGE_DEFAULT_DELAY', '3.0'))
+)
+
+def get_engine_order(language):
+    """
+    言語ごとの優先順でエンジンのリストを返す
+    （CoeFontは日本語の声のため日本語のみ。ブレーカーがopenのエンジンは除く）
+    """
+    engines = ['openai_tts']
+    if language == 'ja' and coe_font_configured:
+        engines.append('coe_font')
+    preferred = TTS_ENGINE_PREFERENCE.get(language, 'coe_font' if language == 'ja' else 'openai_tts')
+    engines.sort(key=lambda engine: 0 if engine == preferred else 1)
+    available = [engine for engine in engines if tts_breakers[engine].is_available()]
+    # 全エンジンがopenの場合はそのまま返す（呼び出し時にブレーカーが即座に拒否する）
+    return available or engines
+
+def synthesize_with_engine(text, language, engine, emotion_params=None):
+    """指定エンジンで音声を生成（キャッシュ参照・保存込み）。失敗時None"""
+    cache_key = get_tts_cache_key(text, engine, emotion_params)
+    cached_audio = lookup_cached_audio(cache_key)
+    if cached_audio:
+        return cached_audio
+    
+    breaker = tts_breakers[engine]
+    if not breaker.allow_request():
+        print(f"⛔ {engine} はサーキットブレーカーが開いているためスキップ")
+        return None
+    
+    start_time = time.time()
     try:
-        # 日本語の場合は常にCoeFontを試す
-        if language == 'ja' and use_coe_font:
+        if engine == 'coe_font':
             print(f"🎵 CoeFont音声生成開始: {text[:30]}... (感情: {emotion_params})")
-            print(f"   CoeFont利用可能: {use_coe_font}")
             print(f"   Voice ID: {coe_font_client.coefont_id}")
-            
-            audio_data = coe_font_client.generate_audio(text, emotion=emotion_params)
-            
-            if audio_data:
+            generated = coe_font_client.generate_audio_bytes(text, emotion=emotion_params)
+            if generated:
                 cache_stats['coe_font_requests'] += 1
-                print(f"✅ CoeFont音声生成成功: [audio_data {len(audio_data)} bytes]")
-                return audio_data
-            else:
-                print("❌ CoeFont音声生成失敗 → OpenAI TTSにフォールバック")
-        elif language == 'ja' and not use_coe_font:
-            print(f"⚠️ 日本語だがCoeFont無効（use_coe_font={use_coe_font}）")
-        
-        print(f"🎵 OpenAI TTS音声生成開始: {text[:30]}... (言語: {language})")
-        
-        if language == 'ja':
-            voice = "nova"
         else:
-            voice = "echo"
-        
-        audio_data = tts_client.generate_audio(text, voice=voice, emotion_params=emotion_params)
+            print(f"🎵 OpenAI TTS音声生成開始: {text[:30]}... (言語: {language})")
+            voice = "nova" if language == 'ja' else "echo"
+            generated = tts_client.generate_audio_bytes(text, voice=voice, emotion_params=emotion_params)
+            if generated:
+                cache_stats['openai_tts_requests'] += 1
+    except Exception as e:
+        print(f"❌ {engine} 音声生成エラー: {e}")
+        generated = None
+    
+    elapsed = time.time() - start_time
+    if not generated or not generated[0]:
+        print(f"❌ {engine} 音声生成失敗")
+        breaker.record_failure()
+        return None
+    
+    audio_bytes, mime = generated
+    breaker.record_success(elapsed)
+    tts_hedger.record_latency(engine, elapsed)
+    print(f"✅ {engine} 音声生成成功: [audio_data {len(audio_bytes)} bytes] ({elapsed:.2f}秒)")
+    return store_processed_audio(cache_key, audio_bytes, mime, engine)
+
+# 音声生成関数（言語別の優先エンジン＋ヘッジ）
+tts_single_flight = get_single_flight('tts')
+
+def generate_audio_by_language(text, language, emotion_params=None):
+    """言語に応じて適切な音声エンジンを使用（同じ内容の合成が実行中なら結果を共有）"""
+    key = make_flight_key('tts', text, language, emotion_params)
+    return tts_single_flight.do(key, lambda: _generate_audio_by_language(text, language, emotion_params))
+
+def _generate_audio_by_language(text, language, emotion_params=None):
+    """言語に応じて適切な音声エンジンを使用（優先エンジンが遅い場合は代替エンジンと競争・キャッシュ対応）"""
+    try:
+        engines = get_engine_order(language)
+        # キャッシュ済みなら優先エンジンが期限内に即座に返すため、ヘッジは発生しない
+        synthesize = lambda engine: synthesize_with_engine(text, language, engine, emotion_params)
         
-        if audio_data:
-            cache_stats['openai_tts_requests'] += 1
-            print(f"✅ OpenAI TTS音声生成成功: [audio_data {len(audio_data)} bytes]")
-            return audio_data
+        if TTS_HEDGING_ENABLED and len(engines) > 1:
+            audio_data = tts_hedger.run(engines[0], engines[1], synthesize)
         else:
-            print("❌ OpenAI TTS音声生成も失敗")
-            return None
+            # 直列フォールバック
+            audio_data = None
+            for engine in engines:
+                audio_data = synthesize(engine)
+                if audio_data:
+                    break
+        
+        if not audio_data:
+            print("❌ すべての音声エンジンで生成に失敗")
+        return audio_data
             
     except Exception as e:
         print(f"❌ 音声生成エラー: {e}")
@@ -658,12 +952,291 @@ def generate_audio_by_language(text, language, emotion_params=None):
         traceback.print_exc()
         return None
 
+def synthesize_greeting(text, language, emotion):
+    """挨拶音声を優先順にエンジンで生成し、(音声データ, 使用したエンジン) を返す"""
+    for engine in get_engine_order(language):
+        audio_data = synthesize_with_engine(text, language, engine, emotion)
+        if audio_data:
+            return audio_data, engine
+    return None, None
+
+def get_greeting_voice_config():
+    """挨拶音声バンクの再生成判定に使う現在の音声設定"""
+    return {
+        'use_coe_font': coe_font_configured,
+        'coefont_id': coe_font_client.coefont_id if coe_font_configured else None,
+        'coefont_params': coe_font_client.get_emotion_params('happy') if coe_font_configured else None,
+        'openai_voice': tts_client.voice,
+        'openai_speed': tts_client.speed,
+        'openai_model': tts_client.model,
+        'url_delivery': AUDIO_URL_DELIVERY,
+        'engine_preference': TTS_ENGINE_PREFERENCE,
+        'audio_encoding': audio_encoder.codec,
+        'audio_postprocess': audio_postprocessor.fingerprint
+    }
+
+# 挨拶音声バンク（全関係性スタイル×全言語の挨拶を事前生成）
+greeting_audio_bank = GreetingAudioBank(
+    get_greetings=lambda: RELATIONSHIP_GREETINGS,
+    synthesize=synthesize_greeting,
+    get_voice_config=get_greeting_voice_config,
+    get_preferred_engine=lambda language: get_engine_order(language)[0],
+    emotion='happy',
+    refresh_interval=float(os.getenv('GREETING_BANK_REFRESH_SEC', '300'))
+)
+greeting_audio_bank.start(socketio.start_background_task, socketio.sleep)
+
+# 静的Q&A回答の事前生成音声（python -m modules.static_audio_prerender で生成）
+static_audio_manifest = load_static_audio_manifest()
+static_audio_stats = {
+    'manifest_entries': len(static_audio_manifest.get('entries', {})) if static_audio_manifest else 0,
+    'manifest_generated_at': static_audio_manifest.get('generated_at') if static_audio_manifest else None,
+    'warmed_audio': 0
+}
+
+def warm_static_audio():
+    """事前生成音声をメモリキャッシュへ展開"""
+    static_audio_stats['warmed_audio'] = warm_audio_cache_from_manifest(static_audio_manifest, audio_cache)
+    print(f"🎧 事前生成音声の展開完了: {static_audio_stats['warmed_audio']}件")
+
+if static_audio_manifest:
+    socketio.start_background_task(warm_static_audio)
+else:
+    print("⚠️ 静的Q&Aの事前生成音声マニフェストがありません（python -m modules.static_audio_prerender で生成できます）")
+
+# ====== 定型フレーズ音声の連結（繰り返し質問の前置き＋キャッシュ済みの回答） ======
+PHRASE_SPLICING_ENABLED = os.getenv('PHRASE_SPLICING_ENABLED', 'true').lower() == 'true'
+PHRASE_CROSSFADE_MS = float(os.getenv('PHRASE_CROSSFADE_MS', '30'))
+
+phrase_audio_library = PhraseAudioLibrary(
+    phrases={'ja': list(REPEAT_QUESTION_PREFIXES.values())},
+    synthesize=lambda text, language, engine, emotion: synthesize_with_engine(text, language, engine, emotion),
+    get_engines=lambda language: get_engine_order(language),
+    emotions=PRERENDER_EMOTIONS
+)
+if PHRASE_SPLICING_ENABLED:
+    phrase_audio_library.start(socketio.start_background_task)
+
+def get_cached_audio_bytes(audio):
+    """音声の参照（URLまたはdata URL）から (バイト列, MIMEタイプ) を取得"""
+    if audio.startswith(AUDIO_URL_PREFIX):
+        return audio_cache.peek(audio[len(AUDIO_URL_PREFIX):].split('?', 1)[0])
+    audio_bytes, mime = parse_data_url(audio)
+    return (audio_bytes, mime) if audio_bytes else None
+
+def generate_spliced_audio(prefix, text, language, emotion_params=None):
+    """
+    前置きフレーズの音声とキャッシュ済みの回答音声をつないで返す
+    （どちらもキャッシュ済みなら上流TTSは呼ばない。回答が未合成ならNone）
+    """
+    for engine in get_engine_order(language):
+        body_key = get_tts_cache_key(text, engine, emotion_params)
+        if not audio_cache.contains(body_key):
+            continue
+        
+        prefix_key = get_tts_cache_key(prefix, engine, emotion_params)
+        splice_key = hashlib.sha256(f"{prefix_key}:{body_key}:{PHRASE_CROSSFADE_MS}".encode('utf-8')).hexdigest()
+        cached = audio_cache.get(splice_key)
+        if cached is not None:
+            cache_stats['spliced_audio_cache_hits'] += 1
+            return audio_reference(splice_key, cached[0], cached[1])
+        
+        prefix_audio = phrase_audio_library.get(prefix, language, engine, emotion_params)
+        prefix_entry = get_cached_audio_bytes(prefix_audio) if prefix_audio else None
+        body_entry = audio_cache.peek(body_key)
+        if prefix_entry is None or body_entry is None:
+            continue
+        
+        start_time = time.time()
+        spliced = splice_audio([prefix_entry, body_entry], PHRASE_CROSSFADE_MS, decode_pcm=audio_encoder.decode_pcm)
+        if spliced is None:
+            print(f"⚠️ 前置き音声の連結に失敗 ({engine})")
+            continue
+        cache_stats['spliced_audio'] += 1
+        print(f"🧩 前置き音声を連結: {engine} ({(time.time() - start_time) * 1000:.0f}ms, TTS呼び出しなし)")
+        return store_audio_bytes(splice_key, spliced, 'audio/wav')
+    return None
+
+def generate_answer_audio(text, language, emotion_params=None, prefix=''):
+    """回答の音声を生成（前置きがあれば、キャッシュ済みの回答音声との連結を優先）"""
+    if prefix and PHRASE_SPLICING_ENABLED:
+        try:
+            audio_data = generate_spliced_audio(prefix, text, language, emotion_params)
+        except Exception as e:
+            print(f"❌ 前置き音声の連結エラー: {e}")
+            audio_data = None
+        if audio_data:
+            return audio_data
+    return generate_audio_by_language(prefix + text, language, emotion_params=emotion_params)
+
+# ====== 文単位の音声ストリーミング ======
+STREAMING_TURN_ENABLED = os.getenv('STREAMING_TURN_ENABLED', 'true').lower() == 'true'
+
+# 文ごとの音声合成に使うスレッドプール（上流TTSへの同時リクエスト数の上限）
+tts_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TTS_MAX_CONCURRENCY', '3')),
+    thread_name_prefix='tts'
+)
+
+# 生成途中の回答テキスト（response_partial）を送る最短間隔（秒）
+RESPONSE_PARTIAL_INTERVAL = float(os.getenv('RESPONSE_PARTIAL_INTERVAL_MS', '50')) / 1000.0
+
+def should_stream_turn(data):
+    """このターンを文単位の音声ストリーミングで処理するか"""
+    return STREAMING_TURN_ENABLED and rag_system is not None and bool(data.get('streamAudio'))
+
+def answer_with_streaming_audio(question, **rag_kwargs):
+    """
+    RAGの回答をストリーミング生成し、文ごとの音声を audio_chunk イベントで順番どおりに送信
+    
+    Returns:
+        (RAGの回答辞書, メッセージID, 送信した音声チャンク数)
+    """
+    language = rag_kwargs.get('language', 'ja')
+    message_id = uuid.uuid4().hex
+    voice_engine = get_engine_order(language)[0]
+    sentences = []
+    
+    def emit_chunk(index, text, audio, emotion):
+        emit('audio_chunk', {
+            'messageId': message_id,
+            'index': index,
+            'text': text,
+            'audio': client_audio(audio),
+            **get_audio_metadata(audio),
+            'emotion': emotion,
+            'language': language,
+            'voice_engine': voice_engine
+        })
+    
+    pipeline = OrderedAudioChunkPipeline(
+        synthesize=lambda text, emotion: generate_audio_by_language(text, language, emotion_params=emotion),
+        emit_chunk=emit_chunk,
+        executor=tts_executor
+    )
+    
+    def on_sentence(sentence, emotion):
+        sentence = adjust_response_for_language(sentence, language)
+        sentences.append(sentence)
+        pipeline.submit(sentence, emotion)
+        pipeline.drain()
+    
+    partial_state = {'sent_at': 0.0}
+    
+    def on_partial(text):
+        # 英語モードで翻訳前の日本語が混ざる途中経過は表示しない
+        if language == 'en' and JAPANESE_CHAR_PATTERN.search(text):
+            return
+        now = time.time()
+        if now - partial_state['sent_at'] < RESPONSE_PARTIAL_INTERVAL:
+            return
+        partial_state['sent_at'] = now
+        cache_stats['response_partials'] += 1
+        emit('response_partial', {'messageId': message_id, 'text': text})
+    
+    response_data_rag = rag_system.answer_with_suggestions_streaming(
+        question, on_sentence=on_sentence, on_partial=on_partial, **rag_kwargs
+    )
+    audio_chunk_count = pipeline.finish()
+    
+    # 送信した音声と表示テキストを一致させる
+    response_data_rag['answer'] = ('' if language == 'ja' else ' ').join(sentences)
+    
+    pipeline_stats = pipeline.get_stats()
+    cache_stats['streamed_turns'] += 1
+    cache_stats['streamed_audio_chunks'] += audio_chunk_count
+    if pipeline_stats['first_chunk_latency'] is not None:
+        cache_stats['streamed_first_audio_seconds'] += pipeline_stats['first_chunk_latency']
+        print(f"🔊 音声ストリーミング完了: {audio_chunk_count}チャンク "
+              f"(最初の音声まで {pipeline_stats['first_chunk_latency']:.2f}秒, 合成失敗 {pipeline_stats['failed']}件)")
+    return response_data_rag, message_id, audio_chunk_count
+
+# ====== テキスト先行配信（音声は audio_ready で後から送信） ======
+TEXT_FIRST_ENABLED = os.getenv('TEXT_FIRST_ENABLED', 'true').lower() == 'true'
+TTS_MAX_PENDING = int(os.getenv('TTS_MAX_PENDING', '20'))
+TTS_DEFERRED_TIMEOUT = float(os.getenv('TTS_DEFERRED_TIMEOUT', '30'))
+deferred_audio_lock = threading.Lock()
+
+def should_defer_audio(data):
+    """テキストを先に送信し、音声を audio_ready で後送するか"""
+    return TEXT_FIRST_ENABLED and bool(data.get('deferredAudio'))
+
+def deliver_audio_later(sid, message_id, text, language, emotion, prefix=''):
+    """
+    音声合成を tts_executor で実行し、完了したら audio_ready イベントで送信
+    
+    待ちが TTS_MAX_PENDING を超える場合や合成の失敗・タイムアウト時は audio=None を送り、
+    クライアントはテキストのみの表示にフォールバックする。
+    """
+    voice_engine = get_engine_order(language)[0]
+    
+    def emit_audio_ready(audio, error=None):
+        socketio.emit('audio_ready', {
+            'messageId': message_id,
+            'audio': client_audio(audio),
+            **get_audio_metadata(audio),
+            'emotion': emotion,
+            'language': language,
+            'voice_engine': voice_engine,
+            'error': error
+        }, to=sid)
+    
+    with deferred_audio_lock:
+        cache_stats['deferred_audio_requests'] += 1
+        accepted = cache_stats['deferred_audio_pending'] < TTS_MAX_PENDING
+        if accepted:
+            cache_stats['deferred_audio_pending'] += 1
+        else:
+            cache_stats['deferred_audio_rejected'] += 1
+    if not accepted:
+        print(f"⚠️ 音声合成の待ちが上限（{TTS_MAX_PENDING}件）に達したため音声を省略")
+        emit_audio_ready(None, 'busy')
+        return
+    
+    def release_slot(_future):
+        with deferred_audio_lock:
+            cache_stats['deferred_audio_pending'] -= 1
+    
+    start_time = time.time()
+    future = tts_executor.submit(generate_answer_audio, text, language, emotion, prefix)
+    # タイムアウトしても合成自体は続く（結果はキャッシュに残る）ため、枠は合成完了時に返す
+    future.add_done_callback(release_slot)
+    
+    def wait_and_emit():
+        error = None
+        try:
+            audio = future.result(timeout=TTS_DEFERRED_TIMEOUT)
+            if not audio:
+                error = 'failed'
+        except FuturesTimeoutError:
+            print(f"⏱️ 後送音声の合成がタイムアウト（{TTS_DEFERRED_TIMEOUT}秒）")
+            audio, error = None, 'timeout'
+        except Exception as e:
+            print(f"❌ 後送音声の合成エラー: {e}")
+            audio, error = None, 'failed'
+        elapsed = time.time() - start_time
+        with deferred_audio_lock:
+            cache_stats['deferred_audio_seconds'] += elapsed
+            if error:
+                cache_stats['deferred_audio_failures'] += 1
+        emit_audio_ready(audio, error)
+        print(f"🔊 後送音声を送信: {message_id[:8]} ({elapsed:.2f}秒{', ' + error if error else ''})")
+    
+    socketio.start_background_task(wait_and_emit)
+
+# 日本語の文字（ひらがな・カタカナ・漢字）
+JAPANESE_CHAR_PATTERN = re.compile(r'[\u3040-\u30ff\u4e00-\u9fff]')
+
 def adjust_response_for_language(response, language):
     """言語に応じて回答を調整"""
+    if language == 'en' and not JAPANESE_CHAR_PATTERN.search(response or ''):
+        # 既に英語の回答（英語版の静的Q&Aなど）は翻訳しない
+        return response
     if language == 'en':
-        client = OpenAI()
+        client = get_openai_client()
         try:
-            translation = client.chat.completions.create(
+            translation = create_chat_completion(
+                client,
                 model="gpt-3.5-turbo-16k",
                 messages=[
                     {
@@ -698,9 +1271,10 @@ def analyze_emotion(text):
     if confidence < 0.7:
         print(f"📊 信頼度が低いため({confidence:.2f})、GPTでも確認します")
         
-        client = OpenAI()
+        client = get_openai_client()
         try:
-            response = client.chat.completions.create(
+            response = create_chat_completion(
+                client,
                 model="gpt-3.5-turbo",  # 感情分析は通常のgpt-3.5-turboで十分
                 messages=[
                     {"role": "system", "content": "入力されたテキストの感情を分析し、happy, sad, angry, surprised, neutralのいずれか1つだけを返してください。"},
@@ -728,6 +1302,28 @@ def analyze_emotion(text):
     print(f"🔍 最終感情判定: {emotion}")
     return emotion
 
+def find_static_response(message, language, session_info):
+    """
+    静的Q&A・段階別Q&Aからセッションの言語の回答を探す（上流呼び出しなし）
+
+    事前生成ジョブ（static_audio_prerender）が音声を用意しているのと同じ言語・同じ文面を返すため、
+    ヒットすれば翻訳も音声合成の上流呼び出しも不要になる。
+    """
+    lang = 'en' if language == 'en' else 'ja'
+    response = get_static_response_multilang(message, lang)
+    if response:
+        return response
+    stage = get_current_stage(len(session_info.get('selected_suggestions', [])))
+    return get_staged_response_multilang(message, lang, stage)
+
+def normalize_static_response(static_response):
+    """静的Q&Aの結果を {'answer', 'emotion'} 形式にそろえる"""
+    if isinstance(static_response, dict):
+        return static_response
+    # 静的Q&Aは回答文のみを返すため、感情はローカルの分析器で判定する（上流呼び出しなし）
+    emotion, _ = emotion_analyzer.analyze_emotion(static_response)
+    return {'answer': static_response, 'emotion': emotion}
+
 def generate_prioritized_suggestions(session_info, visitor_info, relationship_style, language='ja'):
     """優先順位付きサジェスチョン生成（重複防止対応）"""
     # 選択済みサジェスチョンを取得
@@ -865,6 +1461,18 @@ def print_cache_stats():
         print(f"💨 総時間短縮: {cache_stats['total_time_saved']:.2f}秒")
         print(f"🎵 CoeFont使用回数: {cache_stats['coe_font_requests']}")
         print(f"🗣️ OpenAI TTS使用回数: {cache_stats['openai_tts_requests']}")
+        tts_lookups = cache_stats['tts_cache_hits'] + cache_stats['tts_cache_misses']
+        if tts_lookups > 0:
+            print(f"💾 音声キャッシュヒット率: {cache_stats['tts_cache_hits'] / tts_lookups * 100:.1f}% "
+                  f"({cache_stats['tts_cache_hits']}/{tts_lookups}, 配信 {cache_stats['tts_cache_bytes_served'] // 1024}KB)")
+        hedging_stats = tts_hedger.get_stats()
+        if hedging_stats['hedged'] > 0:
+            print(f"🏁 TTSヘッジ: {hedging_stats['hedged']}回 (代替勝ち {hedging_stats['hedge_wins']} / "
+                  f"優先勝ち {hedging_stats['hedge_losses']} / 無駄な呼び出し {hedging_stats['wasted_calls']})")
+        encoding_stats = audio_encoder.get_stats()
+        if encoding_stats['encodes'] > 0:
+            print(f"🗜️ 音声圧縮 ({encoding_stats['codec']}): 圧縮率 {encoding_stats['compression_ratio']:.1f}倍, "
+                  f"平均変換時間 {encoding_stats['avg_encode_ms']:.0f}ms ({encoding_stats['encodes']}件)")
         print(f"================================\n")
 
 # ============== ルート定義 ==============
@@ -941,28 +1549,105 @@ def show_cache_stats():
         'available_static_qa': len(STATIC_QA_PAIRS),
         'coe_font_requests': cache_stats['coe_font_requests'],
         'openai_tts_requests': cache_stats['openai_tts_requests'],
-        'coe_font_available': use_coe_font,
+        'tts_cache_hits': cache_stats['tts_cache_hits'],
+        'tts_cache_misses': cache_stats['tts_cache_misses'],
+        'tts_cache_hit_rate': (cache_stats['tts_cache_hits'] / max(cache_stats['tts_cache_hits'] + cache_stats['tts_cache_misses'], 1)) * 100,
+        'tts_cache_bytes_served': cache_stats['tts_cache_bytes_served'],
+        'tts_cache': audio_cache.get_stats(),
+        'greeting_bank': greeting_audio_bank.get_stats(),
+        'static_audio': static_audio_stats,
+        'audio_http_requests': cache_stats['audio_http_requests'],
+        'audio_http_not_modified': cache_stats['audio_http_not_modified'],
+        'audio_http_bytes_sent': cache_stats['audio_http_bytes_sent'],
+        'audio_binary_messages': cache_stats['audio_binary_messages'],
+        'audio_binary_bytes': cache_stats['audio_binary_bytes'],
+        'audio_encoding': audio_encoder.get_stats(),
+        'tts_hedging': tts_hedger.get_stats(),
+        'http_transport': get_transport_stats(),
+        'coalescing': get_coalescing_stats(),
+        'speech': speech_processor.get_stats(),
+        'ffmpeg_pool': get_ffmpeg_pool().get_stats(),
+        'prompt': rag_system.prompt_assembler.get_stats() if rag_system else None,
+        'answer_cache': rag_system.answer_cache.get_stats() if rag_system else None,
+        'exact_answer_cache': rag_system.exact_answer_cache.get_stats() if rag_system else None,
+        'embedding_cache': rag_system.embeddings.cache.get_stats() if rag_system else None,
+        'retrieval_cache': rag_system.retrieval_cache.get_stats() if rag_system else None,
+        'streamed_turns': cache_stats['streamed_turns'],
+        'streamed_audio_chunks': cache_stats['streamed_audio_chunks'],
+        'streamed_avg_first_audio_seconds': cache_stats['streamed_first_audio_seconds'] / max(cache_stats['streamed_turns'], 1),
+        'response_partials': cache_stats['response_partials'],
+        'audio_postprocess': audio_postprocessor.get_stats(),
+        'phrase_audio': phrase_audio_library.get_stats(),
+        'spliced_audio': cache_stats['spliced_audio'],
+        'spliced_audio_cache_hits': cache_stats['spliced_audio_cache_hits'],
+        'deferred_audio': {
+            'requests': cache_stats['deferred_audio_requests'],
+            'pending': cache_stats['deferred_audio_pending'],
+            'rejected': cache_stats['deferred_audio_rejected'],
+            'failures': cache_stats['deferred_audio_failures'],
+            'avg_seconds': cache_stats['deferred_audio_seconds'] / max(cache_stats['deferred_audio_requests'] - cache_stats['deferred_audio_rejected'], 1)
+        },
+        'coe_font_available': is_coe_font_available(),
+        'tts_breakers': {name: breaker.get_stats() for name, breaker in tts_breakers.items()},
         'system_status': {
-            'coe_font': 'available' if use_coe_font else 'unavailable',
+            'coe_font': 'available' if is_coe_font_available() else 'unavailable',
             'openai_tts': 'available',
             'rag_system': 'available'
         }
     })
 
+@app.route('/audio/<cache_key>')
+def serve_audio(cache_key):
+    """合成音声を配信（ETag・Range・長期キャッシュ対応）"""
+    if not AUDIO_KEY_PATTERN.fullmatch(cache_key):
+        return jsonify({'error': 'invalid audio id'}), 404
+    entry = audio_cache.peek(cache_key)
+    if entry is None:
+        return jsonify({'error': 'audio not found'}), 404
+    
+    audio_bytes, mime = entry
+    etag = cache_key
+    
+    # ?codec=opus|mp3 の場合は圧縮済みの音声を返す（変換できなければ元の音声）
+    codec = request.args.get('codec')
+    if codec and audio_encoder.should_encode(mime, codec):
+        encoded = get_encoded_audio(cache_key, codec, entry)
+        if encoded:
+            audio_bytes, mime, etag = encoded
+    
+    # キャッシュキーは内容から決まるため、そのままETagに使い不変リソースとして扱う
+    response = send_file(
+        io.BytesIO(audio_bytes),
+        mimetype=mime,
+        conditional=True,
+        etag=etag,
+        max_age=AUDIO_HTTP_MAX_AGE
+    )
+    response.headers['Cache-Control'] = f'public, max-age={AUDIO_HTTP_MAX_AGE}, immutable'
+    
+    cache_stats['audio_http_requests'] += 1
+    if response.status_code == 304:
+        cache_stats['audio_http_not_modified'] += 1
+    else:
+        cache_stats['audio_http_bytes_sent'] += response.content_length or 0
+    return response
+
 @app.route('/coefont-status')
 def show_coefont_status():
     """CoeFont設定状態を詳細表示"""
     status = {
-        'coe_font_available': use_coe_font,
+        'coe_font_available': is_coe_font_available(),
+        'breaker': tts_breakers['coe_font'].get_stats(),
         'access_key_set': bool(coe_font_client.access_key),
         'access_secret_set': bool(coe_font_client.access_secret),
         'voice_id_set': bool(coe_font_client.coefont_id),
         'test_connection': False,
-        'error_message': None
+        'error_message': None,
+        'audio_encoding': audio_encoder.get_stats()
     }
     
     # 接続テストを実行
-    if use_coe_font:
+    if coe_font_configured:
         try:
             test_result = coe_font_client.test_connection()
             status['test_connection'] = test_result
@@ -1086,6 +1771,9 @@ def handle_connect():
     
     emit('current_language', {'language': language})
     
+    # 変換なしで音声認識に回せる録音形式をクライアントに伝える
+    emit('recording_config', speech_processor.get_recording_config())
+    
     # 関係性レベルに応じた初期挨拶
     greeting_message = get_relationship_adjusted_greeting(language, relationship_style)
     greeting_emotion = "happy"
@@ -1093,23 +1781,19 @@ def handle_connect():
     # 🎯 初回の感情を記録
     update_emotion_history(session_id, greeting_emotion)
     
-    try:
-        audio_data = generate_audio_by_language(
-            greeting_message, 
-            language, 
-            emotion_params=greeting_emotion
-        )
-    except Exception as e:
-        print(f"❌ 挨拶音声生成エラー: {e}")
-        audio_data = None
+    # 事前生成済みの挨拶音声を使用（接続時に上流TTSは呼ばない）
+    audio_data = greeting_audio_bank.get(language, relationship_style)
+    if audio_data is None:
+        print(f"⚠️ 挨拶音声が未生成のためテキストのみで送信: {language}/{relationship_style}")
     
     greeting_data = {
         'message': greeting_message,
         'emotion': greeting_emotion,
-        'audio': audio_data,
+        'audio': client_audio(audio_data),
+        **get_audio_metadata(audio_data),
         'isGreeting': True,
         'language': language,
-        'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+        'voice_engine': get_engine_order(language)[0],
         'relationshipLevel': relationship_style,
         'mentalState': data['mental_state']  # 🎯 精神状態も送信
     }
@@ -1147,23 +1831,19 @@ def handle_set_language(data):
     greeting_message = get_relationship_adjusted_greeting(language, relationship_style)
     greeting_emotion = "happy"
     
-    try:
-        audio_data = generate_audio_by_language(
-            greeting_message, 
-            language, 
-            emotion_params=greeting_emotion
-        )
-    except Exception as e:
-        print(f"❌ 挨拶音声生成エラー: {e}")
-        audio_data = None
+    # 事前生成済みの挨拶音声を使用（言語切り替え時も上流TTSは呼ばない）
+    audio_data = greeting_audio_bank.get(language, relationship_style)
+    if audio_data is None:
+        print(f"⚠️ 挨拶音声が未生成のためテキストのみで送信: {language}/{relationship_style}")
     
     greeting_data = {
         'message': greeting_message,
         'emotion': greeting_emotion,
-        'audio': audio_data,
+        'audio': client_audio(audio_data),
+        **get_audio_metadata(audio_data),
         'isGreeting': True,
         'language': language,
-        'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+        'voice_engine': get_engine_order(language)[0],
         'relationshipLevel': relationship_style,
         'mentalState': session_info['mental_state']
     }
@@ -1179,6 +1859,9 @@ def handle_set_language(data):
 def handle_disconnect():
     session_id = request.sid
     
+    # 受信途中の録音を破棄
+    abort_audio_upload(session_id)
+    
     # セッション終了時に訪問者データを更新
     if session_id in session_data:
         session_info = session_data[session_id]
@@ -1249,7 +1932,7 @@ def handle_message(data):
             return
         
         # 静的キャッシュをチェック
-        static_response = get_static_response(message)
+        static_response = find_static_response(message, language, session_info)
         
         if static_response:
             cache_hit_time = time.time()
@@ -1261,6 +1944,7 @@ def handle_message(data):
             estimated_saved_time = 6.0
             cache_stats['total_time_saved'] += estimated_saved_time
             
+            static_response = normalize_static_response(static_response)
             emotion = static_response['emotion']
             response = static_response['answer']
             suggestions = static_response.get('suggestions', [])
@@ -1268,32 +1952,26 @@ def handle_message(data):
             # 🎯 感情履歴を更新
             update_emotion_history(session_id, emotion, session_info['mental_state'])
             
-            # 質問回数に応じて応答を調整
-            if question_count > 1:
-                if question_count == 2:
-                    response = f"あ、さっきも聞かれたね。{response}"
-                elif question_count == 3:
-                    response = f"また同じ質問？よっぽど気になるんやね〜。{response}"
-                elif question_count >= 4:
-                    response = f"もう覚えてや〜（笑）でも、もう一回説明するね。{response}"
-            
-            if language == 'en':
-                response = adjust_response_for_language(response, language)
-                translated_suggestions = []
-                for suggestion in suggestions:
-                    translated = adjust_response_for_language(suggestion, language)
-                    translated_suggestions.append(translated)
-                suggestions = translated_suggestions
+            # 質問回数に応じて応答を調整（音声は前置きと回答を別々に用意して連結する）
+            # 回答はセッションの言語で引いているため翻訳しない（前置きは日本語のみ）
+            repeat_prefix = get_repeat_question_prefix(question_count) if language != 'en' else ''
+            answer_text = response
+            response = repeat_prefix + answer_text
             
-            try:
-                audio_data = generate_audio_by_language(
-                    response, 
-                    language, 
-                    emotion_params=emotion
-                )
-            except Exception as e:
-                print(f"❌ キャッシュ応答の音声合成エラー: {e}")
-                audio_data = None
+            message_id = uuid.uuid4().hex
+            defer_audio = should_defer_audio(data)
+            audio_data = None
+            if not defer_audio:
+                try:
+                    audio_data = generate_answer_audio(
+                        answer_text, 
+                        language, 
+                        emotion_params=emotion,
+                        prefix=repeat_prefix
+                    )
+                except Exception as e:
+                    print(f"❌ キャッシュ応答の音声合成エラー: {e}")
+                    audio_data = None
             
             # 優先順位付きサジェスチョンを生成（キャッシュヒット時も）
             visitor_info = get_visitor_data(visitor_id) if visitor_id else None
@@ -1304,19 +1982,24 @@ def handle_message(data):
             response_data = {
                 'message': response,
                 'emotion': emotion,
-                'audio': audio_data,
+                'audio': client_audio(audio_data),
+                **get_audio_metadata(audio_data),
                 'suggestions': suggestions,
                 'language': language,
                 'cached': True,
                 'processing_time': processing_time,
-                'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+                'voice_engine': get_engine_order(language)[0],
                 'currentTopic': current_topic,
                 'relationshipLevel': relationship_level_style,
-                'mentalState': session_info['mental_state']  # 🎯 精神状態も送信
+                'mentalState': session_info['mental_state'],  # 🎯 精神状態も送信
+                'messageId': message_id,
+                'audioPending': defer_audio
             }
             
             print(f"⚡ キャッシュ応答送信完了 - 感情: {emotion}, 処理時間: {processing_time:.3f}秒")
             emit('response', response_data)
+            if defer_audio:
+                deliver_audio_later(request.sid, message_id, answer_text, language, emotion, prefix=repeat_prefix)
             return
         
         # キャッシュミス → 通常処理（関係性レベル・感情履歴対応）
@@ -1342,6 +2025,8 @@ def handle_message(data):
         )
         
         # RAGシステムで回答とサジェスションを生成（文脈付き）
+        streamed = False
+        message_id = uuid.uuid4().hex
         try:
             # RAGシステムが利用可能かチェック
             if rag_system is None:
@@ -1357,8 +2042,7 @@ def handle_message(data):
                 ]
             else:
                 # RAGシステムに文脈と関係性レベルを渡す
-                response_data_rag = rag_system.answer_with_suggestions(
-                    message, 
+                rag_kwargs = dict(
                     context=context_prompt,
                     question_count=question_count,
                     relationship_style=relationship_level_style,
@@ -1366,6 +2050,12 @@ def handle_message(data):
                     language=language,  # 🎯 新規追加：言語パラメータ
                     explained_terms=session_info.get('explained_terms', {})  # 🎯 新規追加：説明済み用語
                 )
+                if should_stream_turn(data):
+                    # 文ごとに音声を合成して audio_chunk で先行送信
+                    response_data_rag, message_id, audio_chunk_count = answer_with_streaming_audio(message, **rag_kwargs)
+                    streamed = True
+                else:
+                    response_data_rag = rag_system.answer_with_suggestions(message, **rag_kwargs)
                 response = response_data_rag['answer']
                 next_suggestions = response_data_rag.get('suggestions', [])
                 current_emotion = response_data_rag.get('current_emotion', user_emotion)  # 🎯 現在の感情を取得
@@ -1420,15 +2110,20 @@ def handle_message(data):
         final_emotion = current_emotion
         print(f"🎯 最終的に使用する感情: {final_emotion}")
         
-        try:
-            audio_data = generate_audio_by_language(
-                response, 
-                language, 
-                emotion_params=final_emotion
-            )
-        except Exception as e:
-            print(f"❌ 音声合成エラー: {e}")
+        defer_audio = should_defer_audio(data) and not streamed
+        if streamed or defer_audio:
+            # 音声は audio_chunk で送信済み、または audio_ready で後送
             audio_data = None
+        else:
+            try:
+                audio_data = generate_audio_by_language(
+                    response, 
+                    language, 
+                    emotion_params=final_emotion
+                )
+            except Exception as e:
+                print(f"❌ 音声合成エラー: {e}")
+                audio_data = None
         
         end_time = time.time()
         processing_time = end_time - start_time
@@ -1436,19 +2131,27 @@ def handle_message(data):
         response_data = {
             'message': response,
             'emotion': final_emotion,
-            'audio': audio_data,
+            'audio': client_audio(audio_data),
+            **get_audio_metadata(audio_data),
             'suggestions': next_suggestions,
             'language': language,
             'cached': False,
             'processing_time': processing_time,
-            'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+            'voice_engine': get_engine_order(language)[0],
             'currentTopic': current_topic,
             'relationshipLevel': relationship_level_style,
-            'mentalState': session_info['mental_state']  # 🎯 精神状態も送信
+            'mentalState': session_info['mental_state'],  # 🎯 精神状態も送信
+            'streamed': streamed,
+            'messageId': message_id,
+            'audioPending': defer_audio
         }
+        if streamed:
+            response_data['audioChunkCount'] = audio_chunk_count
         
         print(f"📤 通常処理応答送信完了 - 感情: {final_emotion}, 処理時間: {processing_time:.3f}秒")
         emit('response', response_data)
+        if defer_audio:
+            deliver_audio_later(request.sid, message_id, response, language, final_emotion)
         
     except Exception as e:
         print(f"❌ メッセージ処理エラー: {e}")
@@ -1474,25 +2177,84 @@ def handle_message(data):
 # 音声メッセージハンドラー（感情履歴対応）
 @socketio.on('audio_message')
 def handle_audio_message(data):
+    """録音全体をBase64で一括送信する従来の形式"""
+    audio_data = data.get('audio')
+    if not audio_data:
+        emit('error', {'message': '音声データが受信できませんでした'})
+        return
+    respond_to_voice_message(
+        data,
+        lambda language: speech_processor.transcribe_audio(audio_data, language=language),
+        time.time()
+    )
+
+# ====== 🎤 録音のストリーミングアップロード（audio_upload_start → audio_upload_chunk × N → audio_upload_end） ======
+audio_uploads = {}  # セッションID -> AudioUploadStream
+
+def abort_audio_upload(session_id):
+    stream = audio_uploads.pop(session_id, None)
+    if stream is not None:
+        stream.abort()
+
+@socketio.on('audio_upload_start')
+def handle_audio_upload_start(data=None):
+    session_id = request.sid
+    abort_audio_upload(session_id)  # 終了しなかった前回のアップロードは破棄
+    audio_uploads[session_id] = speech_processor.open_upload_stream((data or {}).get('mimeType'))
+
+@socketio.on('audio_upload_chunk')
+def handle_audio_upload_chunk(data):
+    session_id = request.sid
+    stream = audio_uploads.get(session_id)
+    if stream is None:
+        return  # 中断済みのアップロードの残り
+    try:
+        stream.feed(int(data.get('seq', 0)), data.get('data'))
+    except (AudioUploadError, TypeError, ValueError) as e:
+        print(f"❌ 音声アップロード中断: {e}")
+        abort_audio_upload(session_id)
+        emit('audio_upload_aborted', {'message': str(e)})
+        emit('error', {'message': '音声データが大きすぎるか、受信に失敗しました'})
+
+@socketio.on('audio_upload_end')
+def handle_audio_upload_end(data):
     start_time = time.time()
-    
+    session_id = request.sid
+    stream = audio_uploads.pop(session_id, None)
+    if stream is None:
+        emit('error', {'message': '音声データが受信できませんでした'})
+        return
+
+    def transcribe(language):
+        try:
+            return speech_processor.transcribe_stream(stream, language=language, expected_chunks=data.get('chunks'))
+        except AudioUploadError as e:
+            print(f"❌ 音声アップロード失敗: {e}")
+            stream.abort()
+            return None
+
+    respond_to_voice_message(data, transcribe, start_time)
+
+def respond_to_voice_message(data, transcribe, start_time):
+    """
+    音声メッセージを認識して応答する（一括送信・ストリーミングアップロード共通）
+
+    Args:
+        transcribe: 言語コード（2文字）を受け取って認識結果のテキストを返す関数
+        start_time: 録音の受信完了時刻
+    """
     try:
         session_id = request.sid
         session_info = get_session_data(session_id)
         language = session_info['language']
         
-        audio_data = data.get('audio')
         visitor_id = data.get('visitorId')
         conversation_history = data.get('conversationHistory', [])
         interaction_count = data.get('interactionCount', 0)
         relationship_level_style = data.get('relationshipLevel', 'formal')
-        
-        if not audio_data:
-            emit('error', {'message': '音声データが受信できませんでした'})
-            return
 
         # 音声認識
-        text = speech_processor.transcribe_audio(audio_data, language=language[:2])
+        text = transcribe(language[:2])
         if not text:
             emit('error', {'message': '音声認識に失敗しました'})
             return
@@ -1521,7 +2283,7 @@ def handle_audio_message(data):
         
         cache_stats['total_requests'] += 1
         
-        static_response = get_static_response(text)
+        static_response = find_static_response(text, language, session_info)
         
         if static_response:
             cache_hit_time = time.time()
@@ -1533,6 +2295,7 @@ def handle_audio_message(data):
             estimated_saved_time = 8.0
             cache_stats['total_time_saved'] += estimated_saved_time
             
+            static_response = normalize_static_response(static_response)
             emotion = static_response['emotion']
             response = static_response['answer']
             suggestions = static_response.get('suggestions', [])
@@ -1540,32 +2303,26 @@ def handle_audio_message(data):
             # 🎯 感情履歴を更新
             update_emotion_history(session_id, emotion, session_info['mental_state'])
             
-            # 質問回数に応じて応答を調整
-            if question_count > 1:
-                if question_count == 2:
-                    response = f"あ、さっきも聞かれたね。{response}"
-                elif question_count == 3:
-                    response = f"また同じ質問？よっぽど気になるんやね〜。{response}"
-                elif question_count >= 4:
-                    response = f"もう覚えてや〜（笑）でも、もう一回説明するね。{response}"
+            # 質問回数に応じて応答を調整（音声は前置きと回答を別々に用意して連結する）
+            # 回答はセッションの言語で引いているため翻訳しない（前置きは日本語のみ）
+            repeat_prefix = get_repeat_question_prefix(question_count) if language != 'en' else ''
+            answer_text = response
+            response = repeat_prefix + answer_text
             
-            if language == 'en':
-                response = adjust_response_for_language(response, language)
-                translated_suggestions = []
-                for suggestion in suggestions:
-                    translated = adjust_response_for_language(suggestion, language)
-                    translated_suggestions.append(translated)
-                suggestions = translated_suggestions
-            
-            try:
-                audio_response = generate_audio_by_language(
-                    response, 
-                    language, 
-                    emotion_params=emotion
-                )
-            except Exception as e:
-                print(f"❌ 音声応答の音声合成エラー: {e}")
-                audio_response = None
+            message_id = uuid.uuid4().hex
+            defer_audio = should_defer_audio(data)
+            audio_response = None
+            if not defer_audio:
+                try:
+                    audio_response = generate_answer_audio(
+                        answer_text, 
+                        language, 
+                        emotion_params=emotion,
+                        prefix=repeat_prefix
+                    )
+                except Exception as e:
+                    print(f"❌ 音声応答の音声合成エラー: {e}")
+                    audio_response = None
             
             # 優先順位付きサジェスチョンを生成
             visitor_info = get_visitor_data(visitor_id) if visitor_id else None
@@ -1576,19 +2333,24 @@ def handle_audio_message(data):
             response_data = {
                 'message': response,
                 'emotion': emotion,
-                'audio': audio_response,
+                'audio': client_audio(audio_response),
+                **get_audio_metadata(audio_response),
                 'suggestions': suggestions,
                 'language': language,
                 'cached': True,
                 'processing_time': processing_time,
-                'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+                'voice_engine': get_engine_order(language)[0],
                 'currentTopic': current_topic,
                 'relationshipLevel': relationship_level_style,
-                'mentalState': session_info['mental_state']
+                'mentalState': session_info['mental_state'],
+                'messageId': message_id,
+                'audioPending': defer_audio
             }
             
             print(f"⚡ 音声キャッシュ応答送信完了 - 感情: {emotion}")
             emit('response', response_data)
+            if defer_audio:
+                deliver_audio_later(request.sid, message_id, answer_text, language, emotion, prefix=repeat_prefix)
             return
         
         print(f"❌ 音声キャッシュミス → 通常処理")
@@ -1625,8 +2387,7 @@ def handle_audio_message(data):
                 ]
             else:
                 # RAGシステムに文脈と関係性レベルを渡す
-                response_data_rag = rag_system.answer_with_suggestions(
-                    text,
+                rag_kwargs = dict(
                     context=context_prompt,
                     question_count=question_count,
                     relationship_style=relationship_level_style,
@@ -1634,6 +2395,13 @@ def handle_audio_message(data):
                     language=language,  # 🎯 新規追加：言語パラメータ
                     explained_terms=session_info.get('explained_terms', {})  # 🎯 新規追加：説明済み用語
                 )
+                streamed = should_stream_turn(data)
+                message_id = uuid.uuid4().hex
+                if streamed:
+                    # 文ごとに音声を合成して audio_chunk で先行送信
+                    response_data_rag, message_id, audio_chunk_count = answer_with_streaming_audio(text, **rag_kwargs)
+                else:
+                    response_data_rag = rag_system.answer_with_suggestions(text, **rag_kwargs)
                 response = response_data_rag['answer']
                 next_suggestions = response_data_rag.get('suggestions', [])
                 current_emotion = response_data_rag.get('current_emotion', user_emotion)
@@ -1659,11 +2427,16 @@ def handle_audio_message(data):
                     session_info, visitor_info, relationship_level_style, language
                 )
                 
-                audio_response = generate_audio_by_language(
-                    response, 
-                    language, 
-                    emotion_params=current_emotion
-                )
+                defer_audio = should_defer_audio(data) and not streamed
+                if streamed or defer_audio:
+                    # 音声は audio_chunk で送信済み、または audio_ready で後送
+                    audio_response = None
+                else:
+                    audio_response = generate_audio_by_language(
+                        response, 
+                        language, 
+                        emotion_params=current_emotion
+                    )
                 
                 end_time = time.time()
                 processing_time = end_time - start_time
@@ -1671,19 +2444,27 @@ def handle_audio_message(data):
                 response_data = {
                     'message': response,
                     'emotion': current_emotion,
-                    'audio': audio_response,
+                    'audio': client_audio(audio_response),
+                    **get_audio_metadata(audio_response),
                     'suggestions': next_suggestions,
                     'language': language,
                     'cached': False,
                     'processing_time': processing_time,
-                    'voice_engine': 'coe_font' if use_coe_font and language == 'ja' else 'openai_tts',
+                    'voice_engine': get_engine_order(language)[0],
                     'currentTopic': current_topic,
                     'relationshipLevel': relationship_level_style,
-                    'mentalState': session_info['mental_state']
+                    'mentalState': session_info['mental_state'],
+                    'streamed': streamed,
+                    'messageId': message_id,
+                    'audioPending': defer_audio
                 }
+                if streamed:
+                    response_data['audioChunkCount'] = audio_chunk_count
                 
                 print(f"📤 音声通常処理応答送信完了 - 感情: {current_emotion}, 処理時間: {processing_time:.3f}秒")
                 emit('response', response_data)
+                if defer_audio:
+                    deliver_audio_later(request.sid, message_id, response, language, current_emotion)
                 return
             
         except Exception as e:
@@ -1734,7 +2515,7 @@ if __name__ == '__main__':
     print(f"🎯 関係性レベルシステム: 有効")
     print(f"🎭 感情履歴管理: 有効")
     print(f"💭 深層心理システム: 有効")
-    print(f"🎵 CoeFont利用可能: {use_coe_font}")
+    print(f"🎵 CoeFont利用可能: {is_coe_font_available()} (ブレーカー: {tts_breakers['coe_font'].state})")
     print(f"✨ 感情分析品質: 改善版（キーワード＋スコアリング＋GPT）")
     print(f"🔍 サジェスチョン優先順位: 有効")
     print(f"🚫 サジェスチョン重複防止: 有効")
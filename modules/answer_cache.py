@@ -0,0 +1,232 @@
+# modules/answer_cache.py
+# -*- coding: utf-8 -*-
+# 正規化した質問が同じなら、検索・回答生成を行わずに以前の回答を返すモジュール
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from modules.audio_cache import DiskCacheTier, atomic_write
+
+# 質問の正規化で取り除く記号
+_QUESTION_PUNCTUATION = str.maketrans('', '', '?。、!')
+
+
+def normalize_question(question: str) -> str:
+    """質問を正規化（NFKC・小文字化・句読点の除去・空白の統一。重複判定・回答キャッシュ用）"""
+    text = unicodedata.normalize('NFKC', question or '').lower()
+    return ' '.join(text.translate(_QUESTION_PUNCTUATION).split())
+
+
+def question_count_bucket(question_count: int) -> str:
+    """同じ質問の回数を 1 / 2 / 3+ にまとめる（文脈プロンプトの切り替えと同じ粒度）"""
+    return str(question_count) if question_count < 3 else '3+'
+
+
+class ExactAnswerCache:
+    """
+    正規化した質問・言語・関係性レベル・質問回数・ナレッジのバージョンをキーにした回答キャッシュ
+
+    - 1段目: プロセス内LRU（件数で上限管理）
+    - 2段目: ディスク（gunicornの全ワーカーで共有、件数で上限管理）
+    - ナレッジのバージョンはディスク上のスタンプファイルで全ワーカーが共有し、
+      bump_version() で変わると以前のエントリはキーが一致しなくなる（古いファイルは掃除で消える）
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 memory_entries: Optional[int] = None,
+                 disk_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.enabled = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+        self.cache_dir = cache_dir or os.getenv('ANSWER_CACHE_DIR', 'data/answer_cache')
+        self.memory_entries = memory_entries or int(os.getenv('ANSWER_CACHE_MEMORY_ENTRIES', '1000'))
+        self.disk_entries = disk_entries or int(os.getenv('ANSWER_CACHE_DISK_ENTRIES', '5000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('ANSWER_CACHE_TTL', '86400'))
+
+        self._memory = OrderedDict()  # key -> エントリ
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_mtime = None
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'version_changes': 0
+        }
+
+        self._disk = DiskCacheTier(self.cache_dir, '.json', '回答キャッシュ', prune_interval=100)
+        self.disk_enabled = self._disk.enabled
+
+    # ====== ナレッジのバージョン ======
+
+    def _version_path(self) -> str:
+        return os.path.join(self.cache_dir, 'kb_version')
+
+    def get_version(self) -> str:
+        """ナレッジのバージョン（他ワーカーが更新した場合はスタンプファイルから読み直す）"""
+        if not self.disk_enabled:
+            with self._lock:
+                if self._version is None:
+                    self._version = uuid.uuid4().hex
+                return self._version
+        path = self._version_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            # 初回起動時：バージョンを作成
+            return self.bump_version(reason='（初期化）')
+        except OSError:
+            mtime = None
+        with self._lock:
+            if self._version is not None and mtime == self._version_mtime:
+                return self._version
+        try:
+            with open(path, 'r', encoding='ascii') as f:
+                version = f.read().strip()
+        except OSError:
+            version = ''
+        with self._lock:
+            if version and version != self._version:
+                if self._version is not None:
+                    self.stats['version_changes'] += 1
+                self._memory.clear()
+                self._version = version
+            self._version_mtime = mtime
+            return self._version or ''
+
+    def bump_version(self, reason: str = '') -> str:
+        """ナレッジの変更を記録し、全ワーカーの回答キャッシュを無効化する"""
+        version = uuid.uuid4().hex
+        if self.disk_enabled:
+            try:
+                atomic_write(self._version_path(), version.encode('ascii'))
+            except OSError as e:
+                print(f"⚠️ ナレッジのバージョンを書き込めません: {e}")
+        with self._lock:
+            if self._version is not None:
+                self.stats['version_changes'] += 1
+            self._memory.clear()
+            self._version = version
+            self._version_mtime = None
+        print(f"🔖 ナレッジのバージョンを更新 {reason}: {version[:8]}")
+        return version
+
+    # ====== 公開API ======
+
+    def make_key(self, question: str, language: str, relationship_style: str, question_count: int) -> str:
+        """回答キャッシュのキー（SHA-256のHEX文字列）"""
+        payload = json.dumps(
+            [normalize_question(question), language, relationship_style,
+             question_count_bucket(question_count), self.get_version()],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """エントリ（{'sentences', 'emotion', 'created'}）を取得。なければNone"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry['created'] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry
+                del self._memory[key]
+                self.stats['expired'] += 1
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            if now - entry['created'] <= self.ttl:
+                self._remember(key, entry)
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return entry
+            self._disk.unlink(self._disk.path_for(key))
+            with self._lock:
+                self.stats['expired'] += 1
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, sentences: List[str], emotion: str):
+        """回答の文のリストと感情を保存"""
+        if not self.enabled or not sentences:
+            return
+        entry = {'sentences': list(sentences), 'emotion': str(emotion), 'created': time.time()}
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            lookups = hits + self.stats['misses']
+            result = dict(self.stats)
+            result.update({
+                'enabled': self.enabled,
+                'hits': hits,
+                'hit_rate': (hits / lookups * 100) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_enabled': self.disk_enabled,
+                'kb_version': (self._version or '')[:8]
+            })
+        return result
+
+    # ====== メモリ層 ======
+
+    def _remember(self, key: str, entry: Dict):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self.stats['memory_evictions'] += 1
+
+    # ====== ディスク層 ======
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        raw = self._disk.read(key)
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw.decode('utf-8'))
+        except ValueError as e:
+            print(f"⚠️ 回答キャッシュ読み込みエラー: {e}")
+            return None
+        if not isinstance(entry, dict) or not entry.get('sentences'):
+            return None
+        return entry
+
+    def _write_disk(self, key: str, entry: Dict):
+        if self._disk.write(key, json.dumps(entry, ensure_ascii=False).encode('utf-8')) and self._disk.note_put():
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """期限切れ（古いバージョンのものを含む）を削除し、上限を超えていれば古いものから削除"""
+        entries = self._disk.scan()
+        # 古いバージョンのエントリは参照されないため、最終アクセスから TTL を過ぎたら消える
+        now = time.time()
+        expired = sum(1 for mtime, _, _ in entries if now - mtime > self.ttl)
+        cut = max(expired, len(entries) - self.disk_entries)
+        evicted = sum(1 for _, _, path in entries[:cut] if self._disk.unlink(path))
+
+        with self._lock:
+            self.stats['disk_evictions'] += evicted
+        if evicted:
+            print(f"🧹 回答キャッシュ削除: {evicted}件 (残り: {len(entries) - cut}件)")
@@ -0,0 +1,445 @@
+# modules/audio_cache.py
+# -*- coding: utf-8 -*-
+import os
+import io
+import json
+import wave
+import struct
+import base64
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict, List
+
+# 書き込み途中でクラッシュしたワーカーの一時ファイルを残骸とみなすまでの秒数
+STALE_TMP_SECONDS = 300
+
+
+def normalize_cache_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化（NFKC＋空白の統一）"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return ' '.join(text.split())
+
+
+def make_tts_cache_key(text: str, engine: str, voice_id: Optional[str], emotion_params: Optional[dict] = None) -> str:
+    """
+    正規化テキスト・エンジン・ボイスID・感情パラメータからキャッシュキーを生成
+
+    Returns:
+        SHA-256のHEX文字列
+    """
+    payload = json.dumps(
+        [normalize_cache_text(text), engine, voice_id or '', emotion_params or {}],
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def make_engine_cache_key(text: str, engine: str, emotion: Optional[str], coe_font_client=None, tts_client=None,
+                          postprocess: str = '') -> str:
+    """
+    エンジンごとの実効パラメータを含めたキャッシュキーを生成
+    （サーバーと事前生成ジョブで同じキーになるよう共通化）
+
+    Args:
+        postprocess: 音声後処理の設定（AudioPostProcessor.fingerprint）。後処理なしなら空文字
+    """
+    if engine == 'coe_font':
+        params = coe_font_client.get_emotion_params(emotion) if emotion else {}
+        voice_id = coe_font_client.coefont_id
+    else:
+        # OpenAI TTSは感情によらず固定の声・速度で生成される
+        params = {'model': tts_client.model, 'speed': tts_client.speed}
+        voice_id = tts_client.voice
+    if postprocess:
+        params = dict(params, postprocess=postprocess)
+    return make_tts_cache_key(text, engine, voice_id, params)
+
+
+def parse_data_url(data_url: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """data:audio/...;base64,xxxx 形式を (バイト列, MIMEタイプ) に分解"""
+    try:
+        header, data = data_url.split(',', 1)
+        mime = header[5:].split(';', 1)[0] or 'application/octet-stream'
+        return base64.b64decode(data), mime
+    except Exception as e:
+        print(f"❌ データURL解析エラー: {e}")
+        return None, None
+
+
+def to_data_url(audio_bytes: bytes, mime: str) -> str:
+    """バイト列をBase64エンコードしてdata URLにする"""
+    return f"data:{mime};base64,{base64.b64encode(audio_bytes).decode('utf-8')}"
+
+
+# MPEG-1 / MPEG-2(2.5) Layer III のビットレート表（kbps）
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+
+
+def estimate_audio_duration(audio_bytes: bytes, mime: Optional[str]) -> Optional[float]:
+    """
+    音声の再生時間（秒）を推定
+
+    WAVはヘッダから正確に、MP3は先頭フレームのビットレートから（固定ビットレート前提で）推定する。
+    判定できない形式はNone。
+    """
+    if not audio_bytes:
+        return None
+    try:
+        if audio_bytes[:4] == b'RIFF' and audio_bytes[8:12] == b'WAVE':
+            return _estimate_wav_duration(audio_bytes)
+        if (mime or '').endswith(('mpeg', 'mp3')) or audio_bytes[:3] == b'ID3':
+            return _estimate_mp3_duration(audio_bytes)
+    except (wave.Error, struct.error, EOFError, ValueError) as e:
+        print(f"⚠️ 音声の長さを判定できません: {e}")
+    return None
+
+
+def _estimate_wav_duration(audio_bytes: bytes) -> Optional[float]:
+    try:
+        with wave.open(io.BytesIO(audio_bytes)) as wav:
+            frames = wav.getnframes()
+            rate = wav.getframerate()
+            # ストリーミング生成されたWAVはヘッダのフレーム数が不正なことがある
+            bytes_per_frame = wav.getsampwidth() * wav.getnchannels()
+            if bytes_per_frame and frames * bytes_per_frame > len(audio_bytes):
+                frames = (len(audio_bytes) - 44) // bytes_per_frame
+            return frames / float(rate) if rate else None
+    except wave.Error:
+        # fmtチャンクのバイトレートから概算
+        byte_rate = struct.unpack('<I', audio_bytes[28:32])[0]
+        return (len(audio_bytes) - 44) / float(byte_rate) if byte_rate else None
+
+
+def _estimate_mp3_duration(audio_bytes: bytes) -> Optional[float]:
+    offset = 0
+    if audio_bytes[:3] == b'ID3' and len(audio_bytes) >= 10:
+        # ID3v2タグのサイズは7bit×4の同期安全整数
+        size = 0
+        for b in audio_bytes[6:10]:
+            size = (size << 7) | (b & 0x7F)
+        offset = 10 + size
+
+    # 先頭のフレームヘッダを探す
+    end = min(len(audio_bytes) - 4, offset + 4096)
+    while offset < end:
+        if audio_bytes[offset] == 0xFF and (audio_bytes[offset + 1] & 0xE0) == 0xE0:
+            header = struct.unpack('>I', audio_bytes[offset:offset + 4])[0]
+            version_bits = (header >> 19) & 0x3
+            bitrate_index = (header >> 12) & 0xF
+            if version_bits != 1 and 0 < bitrate_index < 15:
+                table = _MP3_BITRATES[1 if version_bits == 3 else 2]
+                bitrate = table[bitrate_index] * 1000
+                return (len(audio_bytes) - offset) * 8 / float(bitrate)
+        offset += 1
+    return None
+
+
+def atomic_write(path: str, data: bytes):
+    """他ワーカーが途中の状態を読まないよう一時ファイル経由でアトミックに置き換える（失敗時は OSError）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DiskCacheTier:
+    """
+    キャッシュの2段目（ディスク層）の共通処理
+
+    gunicornの全ワーカーで共有するディレクトリに key[:2]/key{suffix} で保存する。
+    書き込みは一時ファイル経由でアトミックに置き換え、読み込み時に最終アクセス時刻を更新する
+    （古いものから消す判定に使う）。何をいつ消すかは各キャッシュが scan() の結果から決める。
+    """
+
+    def __init__(self, cache_dir: str, suffix: str, label: str, prune_interval: int):
+        """
+        Args:
+            suffix: エントリのファイルの拡張子（'.audio' など）
+            label: ログに出すキャッシュの名前（'音声キャッシュ' など）
+            prune_interval: 何回書き込むごとに掃除するか
+        """
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.label = label
+        self.prune_interval = prune_interval
+        self._puts_since_prune = 0
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.enabled = True
+        except OSError as e:
+            print(f"⚠️ {label}ディレクトリを作成できません: {e} → メモリキャッシュのみで動作")
+            self.enabled = False
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.suffix}")
+
+    def read(self, key: str) -> Optional[bytes]:
+        """エントリのバイト列を読む（なければNone）"""
+        if not self.enabled:
+            return None
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            # LRU判定用に最終アクセス時刻を更新
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"⚠️ {self.label}読み込みエラー: {e}")
+            return None
+        return raw
+
+    def write(self, key: str, data: bytes) -> bool:
+        """エントリを書き込み、成功したらTrue"""
+        if not self.enabled:
+            return False
+        try:
+            atomic_write(self.path_for(key), data)
+        except OSError as e:
+            print(f"⚠️ {self.label}書き込みエラー: {e}")
+            return False
+        return True
+
+    def note_put(self) -> bool:
+        """書き込みを数え、prune_interval 回ごとにTrue（掃除のタイミング）"""
+        with self._lock:
+            self._puts_since_prune += 1
+            if self._puts_since_prune < self.prune_interval:
+                return False
+            self._puts_since_prune = 0
+            return True
+
+    def scan(self) -> List[Tuple[float, int, str]]:
+        """エントリの (最終アクセス時刻, サイズ, パス) を古い順に返す（一時ファイルの残骸はここで消す）"""
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    # 書き込み途中でクラッシュしたワーカーの残骸を掃除
+                    if now - st.st_mtime > STALE_TMP_SECONDS:
+                        self.unlink(path)
+                elif name.endswith(self.suffix):
+                    entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def unlink(self, path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            # 他ワーカーが先に削除済み
+            return False
+        except OSError as e:
+            print(f"⚠️ {self.label}削除エラー: {e}")
+            return False
+
+
+class AudioCache:
+    """
+    TTS音声の2段キャッシュ
+
+    - 1段目: プロセス内LRU（バイト数で上限管理）
+    - 2段目: ディスク（gunicornの全ワーカーで共有、合計サイズで上限管理）
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 memory_limit_bytes: Optional[int] = None,
+                 disk_limit_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv('AUDIO_CACHE_DIR', 'data/audio_cache')
+        self.memory_limit_bytes = memory_limit_bytes or int(float(os.getenv('AUDIO_CACHE_MEMORY_MB', '64')) * 1024 * 1024)
+        self.disk_limit_bytes = disk_limit_bytes or int(float(os.getenv('AUDIO_CACHE_DISK_MB', '512')) * 1024 * 1024)
+
+        self._memory = OrderedDict()  # key -> (bytes, mime)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        # ディスク使用量は他ワーカーの書き込みを含まない推定値のため、定期的に再計測する
+        self._disk_bytes = 0
+        self._disk = DiskCacheTier(self.cache_dir, '.audio', '音声キャッシュ', prune_interval=50)
+        self.disk_enabled = self._disk.enabled
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'bytes_served': 0,
+            'bytes_stored': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        if self.disk_enabled:
+            self._disk_bytes = sum(size for _, size, _ in self._disk.scan())
+
+        print(f"💾 音声キャッシュ初期化完了 (メモリ上限: {self.memory_limit_bytes // (1024 * 1024)}MB, "
+              f"ディスク上限: {self.disk_limit_bytes // (1024 * 1024)}MB, ディレクトリ: {self.cache_dir})")
+
+    # ====== 公開API ======
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """キャッシュから (音声バイト列, MIMEタイプ) を取得。なければNone"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                self.stats['bytes_served'] += len(entry[0])
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+            with self._lock:
+                self.stats['disk_hits'] += 1
+                self.stats['bytes_served'] += len(entry[0])
+            return entry
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, audio_bytes: bytes, mime: str):
+        """音声をメモリとディスクの両方に保存"""
+        if not audio_bytes:
+            return
+        entry = (bytes(audio_bytes), mime)
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+        with self._lock:
+            self.stats['stores'] += 1
+            self.stats['bytes_stored'] += len(entry[0])
+
+    def peek(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """統計を更新せずに取得（HTTP配信など、合成キャッシュの判定以外の参照用）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def preload(self, key: str) -> bool:
+        """ディスク層の音声をメモリ層へ展開（統計は更新しない）"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        entry = self._read_disk(key)
+        if entry is None:
+            return False
+        self._remember(key, entry)
+        return True
+
+    def contains(self, key: str) -> bool:
+        """統計を更新せずに存在確認"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self.disk_enabled and os.path.exists(self._disk.path_for(key))
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            lookups = hits + self.stats['misses']
+            result = dict(self.stats)
+            result.update({
+                'hits': hits,
+                'hit_rate': (hits / lookups * 100) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'memory_limit_bytes': self.memory_limit_bytes,
+                'disk_bytes': self._disk_bytes,
+                'disk_limit_bytes': self.disk_limit_bytes,
+                'disk_enabled': self.disk_enabled
+            })
+        return result
+
+    # ====== メモリ層 ======
+
+    def _remember(self, key: str, entry: Tuple[bytes, str]):
+        size = len(entry[0])
+        if size > self.memory_limit_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old[0])
+            self._memory[key] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_limit_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted[0])
+                self.stats['memory_evictions'] += 1
+
+    # ====== ディスク層 ======
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, str]]:
+        raw = self._disk.read(key)
+        if raw is None:
+            return None
+        # ファイル形式: 1行目にMIMEタイプ、以降が音声データ
+        header, sep, audio_bytes = raw.partition(b'\n')
+        if not sep or not audio_bytes:
+            return None
+        return audio_bytes, header.decode('ascii', 'replace')
+
+    def _write_disk(self, key: str, entry: Tuple[bytes, str]):
+        audio_bytes, mime = entry
+        if not self._disk.write(key, mime.encode('ascii', 'replace') + b'\n' + audio_bytes):
+            return
+
+        due = self._disk.note_put()
+        with self._lock:
+            self._disk_bytes += len(audio_bytes) + len(mime) + 1
+            needs_prune = due or self._disk_bytes > self.disk_limit_bytes
+        if needs_prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """ディスク使用量を再計測し、上限を超えていれば古いものから削除"""
+        entries = self._disk.scan()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > self.disk_limit_bytes:
+            # 上限の90%まで削減して削除処理の頻発を防ぐ
+            target = int(self.disk_limit_bytes * 0.9)
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                if self._disk.unlink(path):
+                    total -= size
+                    evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.stats['disk_evictions'] += evicted
+        if evicted:
+            print(f"🧹 音声キャッシュ削除: {evicted}件 (使用量: {total // 1024}KB)")
@@ -0,0 +1,85 @@
+# modules/audio_chunk_pipeline.py
+# -*- coding: utf-8 -*-
+# 文ごとの音声合成を並列に実行し、完成した音声を文の順番どおりに送信するパイプライン
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Dict, Optional
+
+
+class OrderedAudioChunkPipeline:
+    """
+    1ターン分の音声チャンクを順番どおりに送り出す
+
+    合成は executor 上で並列に進めるが、送信は必ず submit した順に行う。
+    合成に失敗した文も audio=None として送信し、クライアント側の再生順が詰まらないようにする。
+    """
+
+    def __init__(self,
+                 synthesize: Callable[[str, str], Optional[str]],
+                 emit_chunk: Callable[[int, str, Optional[str], str], None],
+                 executor: Executor):
+        """
+        Args:
+            synthesize: (テキスト, 感情) から音声データを生成する関数
+            emit_chunk: (インデックス, テキスト, 音声データ, 感情) を送信する関数
+            executor: 音声合成を実行するExecutor（同時実行数の上限はExecutor側で管理）
+        """
+        self.synthesize = synthesize
+        self.emit_chunk = emit_chunk
+        self.executor = executor
+
+        self._pending = deque()  # (index, text, emotion, future)
+        self._next_index = 0
+        self._start_time = time.time()
+
+        self.stats = {
+            'chunks': 0,
+            'emitted': 0,
+            'failed': 0,
+            'first_chunk_latency': None
+        }
+
+    def submit(self, text: str, emotion: str) -> int:
+        """文の音声合成を開始し、チャンクのインデックスを返す"""
+        index = self._next_index
+        self._next_index += 1
+        future = self.executor.submit(self._synthesize_safely, text, emotion)
+        self._pending.append((index, text, emotion, future))
+        self.stats['chunks'] += 1
+        return index
+
+    def drain(self) -> int:
+        """先頭から合成済みのチャンクを送信（待たない）。送信した件数を返す"""
+        emitted = 0
+        while self._pending and self._pending[0][3].done():
+            self._emit_head()
+            emitted += 1
+        return emitted
+
+    def finish(self) -> int:
+        """残りのチャンクを合成完了まで待って順に送信。送信したチャンクの総数を返す"""
+        while self._pending:
+            self._pending[0][3].result()
+            self._emit_head()
+        return self.stats['emitted']
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+    def _synthesize_safely(self, text: str, emotion: str) -> Optional[str]:
+        try:
+            return self.synthesize(text, emotion)
+        except Exception as e:
+            print(f"❌ 音声チャンク合成エラー: {e}")
+            return None
+
+    def _emit_head(self):
+        index, text, emotion, future = self._pending.popleft()
+        audio = future.result()
+        if not audio:
+            self.stats['failed'] += 1
+        if self.stats['first_chunk_latency'] is None:
+            self.stats['first_chunk_latency'] = time.time() - self._start_time
+        self.emit_chunk(index, text, audio, emotion)
+        self.stats['emitted'] += 1
@@ -0,0 +1,190 @@
+# modules/audio_encoder.py
+# -*- coding: utf-8 -*-
+# 合成音声（WAV）を配信用の圧縮形式（Opus / MP3）に変換するモジュール
+import os
+import hashlib
+import subprocess
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from modules.ffmpeg_pool import find_ffmpeg, get_ffmpeg_pool
+
+# 配信用の圧縮形式ごとのffmpeg設定
+AUDIO_CODECS = {
+    'opus': {
+        'mime': 'audio/ogg',
+        'args': ['-c:a', 'libopus', '-application', 'voip', '-f', 'ogg'],
+        'bitrate_env': 'AUDIO_OPUS_BITRATE',
+        'default_bitrate': '32k'
+    },
+    'mp3': {
+        'mime': 'audio/mpeg',
+        'args': ['-c:a', 'libmp3lame', '-f', 'mp3'],
+        'bitrate_env': 'AUDIO_MP3_BITRATE',
+        'default_bitrate': '64k'
+    }
+}
+
+# 変換せずにそのまま配信する形式（エンジンがネイティブで圧縮形式を返す場合）
+COMPRESSED_MIME_TYPES = ('audio/mpeg', 'audio/mp3', 'audio/ogg', 'audio/opus', 'audio/webm', 'audio/aac', 'audio/mp4')
+
+
+def is_compressed_mime(mime: Optional[str]) -> bool:
+    return (mime or '').split(';', 1)[0].strip().lower() in COMPRESSED_MIME_TYPES
+
+
+class AudioEncoder:
+    """
+    ffmpegで音声を圧縮形式に変換する
+
+    Opusへの変換に失敗した場合（libopus非対応のffmpegなど）はMP3で再試行する。
+    ffmpegは常駐ワーカープール（modules.ffmpeg_pool）経由で実行する。
+    """
+
+    def __init__(self, codec: Optional[str] = None, ffmpeg_path: Optional[str] = None, timeout: float = 20):
+        codec = (codec or os.getenv('AUDIO_ENCODING', 'opus')).lower()
+        self.codec = codec if codec in AUDIO_CODECS else 'none'
+        self.ffmpeg_path = ffmpeg_path or os.getenv('FFMPEG_PATH', 'ffmpeg')
+        self.timeout = timeout
+        self.bitrates = {
+            name: os.getenv(config['bitrate_env'], config['default_bitrate'])
+            for name, config in AUDIO_CODECS.items()
+        }
+
+        self._ffmpeg = None  # 初回利用時に検出
+        self._ffmpeg_checked = False
+        self._unsupported_codecs = set()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'encodes': 0,
+            'failures': 0,
+            'fallbacks': 0,
+            'source_bytes': 0,
+            'encoded_bytes': 0,
+            'encode_seconds': 0.0,
+            'by_codec': {name: 0 for name in AUDIO_CODECS}
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != 'none'
+
+    def is_available(self) -> bool:
+        """ffmpegが利用可能か（結果はキャッシュする）"""
+        with self._lock:
+            if not self._ffmpeg_checked:
+                self._ffmpeg = find_ffmpeg(self.ffmpeg_path)
+                self._ffmpeg_checked = True
+                if not self._ffmpeg and self.enabled:
+                    print(f"⚠️ ffmpegが見つからないため音声の圧縮配信を無効化します ({self.ffmpeg_path})")
+            return self._ffmpeg is not None
+
+    def variant_key(self, source_key: str, codec: str) -> str:
+        """変換後の音声のキャッシュキー（元の音声のキー・形式・ビットレートから決まる）"""
+        raw = f"{source_key}:{codec}:{self.bitrates.get(codec, '')}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def should_encode(self, mime: Optional[str], codec: Optional[str] = None) -> bool:
+        """この音声を変換して配信すべきか"""
+        codec = codec or self.codec
+        return codec in AUDIO_CODECS and not is_compressed_mime(mime) and self.is_available()
+
+    def encode(self, audio_bytes: bytes, codec: Optional[str] = None) -> Optional[Tuple[bytes, str, str]]:
+        """
+        音声を圧縮形式に変換
+
+        Returns:
+            (変換後のバイト列, MIMEタイプ, 実際に使った形式)、失敗時None
+        """
+        codec = codec or self.codec
+        if codec not in AUDIO_CODECS or not audio_bytes or not self.is_available():
+            return None
+
+        candidates = [codec] + (['mp3'] if codec != 'mp3' else [])
+        for candidate in candidates:
+            if candidate in self._unsupported_codecs:
+                continue
+            result = self._run_ffmpeg(audio_bytes, candidate)
+            if result is not None:
+                if candidate != codec:
+                    with self._lock:
+                        self.stats['fallbacks'] += 1
+                return result, AUDIO_CODECS[candidate]['mime'], candidate
+        return None
+
+    def decode_pcm(self, audio_bytes: bytes, sample_rate: int = 16000) -> Optional[bytes]:
+        """音声を16bitモノラルPCM（s16le）にデコード（リップシンク解析用）"""
+        if not audio_bytes or not self.is_available():
+            return None
+        command = [
+            self._ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-ac', '1', '-ar', str(sample_rate),
+            '-f', 's16le', 'pipe:1'
+        ]
+        try:
+            result = get_ffmpeg_pool().run(command, audio_bytes, timeout=self.timeout)
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"❌ 音声デコードエラー: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"❌ 音声デコード失敗: {result.stderr.decode('utf-8', 'replace').strip()[-200:]}")
+            return None
+        return result.stdout
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['by_codec'] = dict(self.stats['by_codec'])
+            result.update({
+                'codec': self.codec,
+                'bitrates': dict(self.bitrates),
+                'ffmpeg_available': self._ffmpeg is not None if self._ffmpeg_checked else None,
+                'unsupported_codecs': sorted(self._unsupported_codecs),
+                'compression_ratio': (self.stats['source_bytes'] / self.stats['encoded_bytes'])
+                                     if self.stats['encoded_bytes'] else 0.0,
+                'avg_encode_ms': (self.stats['encode_seconds'] / self.stats['encodes'] * 1000)
+                                 if self.stats['encodes'] else 0.0
+            })
+        return result
+
+    def _run_ffmpeg(self, audio_bytes: bytes, codec: str) -> Optional[bytes]:
+        config = AUDIO_CODECS[codec]
+        command = [
+            self._ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-ac', '1',
+            '-b:a', self.bitrates[codec],
+        ] + config['args'] + ['pipe:1']
+
+        start_time = time.time()
+        try:
+            result = get_ffmpeg_pool().run(command, audio_bytes, timeout=self.timeout)
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"❌ 音声変換エラー ({codec}): {e}")
+            with self._lock:
+                self.stats['failures'] += 1
+            return None
+        elapsed = time.time() - start_time
+
+        if result.returncode != 0 or not result.stdout:
+            stderr = result.stderr.decode('utf-8', 'replace').strip()
+            print(f"❌ 音声変換失敗 ({codec}): {stderr[-200:]}")
+            with self._lock:
+                self.stats['failures'] += 1
+                if 'Unknown encoder' in stderr or 'Encoder not found' in stderr:
+                    # このffmpegでは使えない形式なので以後は試さない
+                    self._unsupported_codecs.add(codec)
+            return None
+
+        with self._lock:
+            self.stats['encodes'] += 1
+            self.stats['by_codec'][codec] += 1
+            self.stats['source_bytes'] += len(audio_bytes)
+            self.stats['encoded_bytes'] += len(result.stdout)
+            self.stats['encode_seconds'] += elapsed
+        print(f"🗜️ 音声変換 ({codec}): {len(audio_bytes) // 1024}KB → {len(result.stdout) // 1024}KB ({elapsed * 1000:.0f}ms)")
+        return result.stdout
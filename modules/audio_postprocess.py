@@ -0,0 +1,206 @@
+# modules/audio_postprocess.py
+# -*- coding: utf-8 -*-
+# 合成音声の後処理（無音の除去・音量の正規化・サンプリングレートの統一）を行うモジュール
+import os
+import time
+import wave
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from modules.lip_sync import decode_wav, pcm16_to_samples, encode_wav
+
+
+class AudioPostProcessor:
+    """
+    TTSの出力をキャッシュ・配信する前に整える
+
+    - 先頭・末尾の無音を除去し、句読点などの長すぎる間を max_pause_ms に縮める
+    - 発話部分のRMSを target_db に合わせる（ピークは peak_db で制限）
+    - 配信用のサンプリングレート・16bitモノラルWAVに統一する
+
+    CoeFontとOpenAI TTSの音量差と、話し始めまでの無音をなくすのが目的。
+    """
+
+    def __init__(self,
+                 sample_rate: Optional[int] = None,
+                 silence_db: Optional[float] = None,
+                 keep_silence_ms: Optional[float] = None,
+                 max_pause_ms: Optional[float] = None,
+                 target_db: Optional[float] = None,
+                 peak_db: float = -1.0,
+                 frame_ms: float = 10.0,
+                 decode_pcm: Optional[Callable[[bytes, int], Optional[bytes]]] = None):
+        """
+        Args:
+            sample_rate: 配信用のサンプリングレート
+            silence_db: 無音とみなすフレームRMS（dBFS）
+            keep_silence_ms: 先頭・末尾に残す無音（ミリ秒）
+            max_pause_ms: 発話中の間の最大長（ミリ秒）
+            target_db: 発話部分の目標RMS（dBFS）
+            peak_db: ピークの上限（dBFS）
+            decode_pcm: WAV以外やレートの違う音声を (バイト列, サンプリングレート) から16bitモノラルPCMに変換する関数
+        """
+        self.enabled = os.getenv('AUDIO_POSTPROCESS_ENABLED', 'true').lower() == 'true'
+        self.sample_rate = sample_rate or int(os.getenv('AUDIO_SAMPLE_RATE', '24000'))
+        self.silence_db = silence_db if silence_db is not None else float(os.getenv('AUDIO_SILENCE_DB', '-45'))
+        self.keep_silence_ms = keep_silence_ms if keep_silence_ms is not None else float(os.getenv('AUDIO_KEEP_SILENCE_MS', '40'))
+        self.max_pause_ms = max_pause_ms if max_pause_ms is not None else float(os.getenv('AUDIO_MAX_PAUSE_MS', '350'))
+        self.target_db = target_db if target_db is not None else float(os.getenv('AUDIO_TARGET_DB', '-20'))
+        self.peak_db = peak_db
+        self.frame_ms = frame_ms
+        self.decode_pcm = decode_pcm
+
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {
+            'processed': 0,
+            'failures': 0,
+            'input_bytes': 0,       # エンジンから受け取った音声
+            'output_bytes': 0,      # 後処理後の音声（キャッシュ・配信されるもの）
+            'bytes_saved': 0,       # 除去した無音の分（配信形式のPCM換算）
+            'leading_silence_seconds': 0.0,  # 話し始めまでに短縮できた時間
+            'trimmed_seconds': 0.0,
+            'process_seconds': 0.0
+        })
+
+    @property
+    def fingerprint(self) -> str:
+        """後処理の設定（キャッシュキーに含め、設定変更時に古い音声を使わないようにする）"""
+        if not self.enabled:
+            return ''
+        return (f"pp1:{self.sample_rate}:{self.silence_db:g}:{self.keep_silence_ms:g}:"
+                f"{self.max_pause_ms:g}:{self.target_db:g}:{self.peak_db:g}")
+
+    def process(self, audio_bytes: bytes, mime: Optional[str] = None, engine: str = 'unknown') -> Optional[bytes]:
+        """
+        音声を後処理してWAVのバイト列を返す（処理できない場合None）
+        """
+        if not self.enabled or not audio_bytes:
+            return None
+        start_time = time.time()
+        samples = self._decode(audio_bytes)
+        if samples is None:
+            with self._lock:
+                self._stats[engine]['failures'] += 1
+            return None
+
+        trimmed, leading_frames, removed_frames = self._trim_silence(samples)
+        if trimmed is None:
+            # 全体が無音（合成の失敗など）の場合は手を加えない
+            with self._lock:
+                self._stats[engine]['failures'] += 1
+            return None
+        output = encode_wav(self._normalize(trimmed), self.sample_rate)
+
+        elapsed = time.time() - start_time
+        frame = self._frame_length()
+        with self._lock:
+            stats = self._stats[engine]
+            stats['processed'] += 1
+            stats['input_bytes'] += len(audio_bytes)
+            stats['output_bytes'] += len(output)
+            stats['bytes_saved'] += (samples.size - trimmed.size) * 2
+            stats['leading_silence_seconds'] += leading_frames * frame / float(self.sample_rate)
+            stats['trimmed_seconds'] += (samples.size - trimmed.size) / float(self.sample_rate)
+            stats['process_seconds'] += elapsed
+        print(f"🎚️ 音声後処理 ({engine}): 無音 {removed_frames * self.frame_ms / 1000.0:.2f}秒を除去 "
+              f"(先頭 {leading_frames * self.frame_ms:.0f}ms), {elapsed * 1000:.0f}ms")
+        return output
+
+    def get_stats(self) -> Dict:
+        """エンジンごとの統計情報を取得"""
+        with self._lock:
+            engines = {engine: dict(values) for engine, values in self._stats.items()}
+        for values in engines.values():
+            processed = values['processed']
+            values['avg_leading_silence_ms'] = (values['leading_silence_seconds'] / processed * 1000) if processed else 0.0
+            values['avg_trimmed_seconds'] = (values['trimmed_seconds'] / processed) if processed else 0.0
+            values['avg_process_ms'] = (values['process_seconds'] / processed * 1000) if processed else 0.0
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'target_db': self.target_db,
+            'engines': engines
+        }
+
+    # ====== 内部処理 ======
+
+    def _frame_length(self) -> int:
+        return max(1, int(self.sample_rate * self.frame_ms / 1000.0))
+
+    def _decode(self, audio_bytes: bytes) -> Optional[np.ndarray]:
+        """配信用のサンプリングレートのモノラルfloat32配列にする"""
+        try:
+            decoded = decode_wav(audio_bytes)
+        except (wave.Error, EOFError, ValueError):
+            decoded = None
+        if decoded is not None and decoded[1] == self.sample_rate:
+            return decoded[0]
+
+        if self.decode_pcm is not None:
+            pcm_bytes = self.decode_pcm(audio_bytes, self.sample_rate)
+            if pcm_bytes:
+                return pcm16_to_samples(pcm_bytes)
+
+        if decoded is not None:
+            # ffmpegが使えない場合は線形補間でレートを合わせる
+            samples, rate = decoded
+            count = int(round(samples.size * self.sample_rate / float(rate)))
+            positions = np.arange(count) * (rate / float(self.sample_rate))
+            return np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+        return None
+
+    def _trim_silence(self, samples: np.ndarray):
+        """
+        先頭・末尾の無音を除去し、長い間を縮める
+
+        Returns:
+            (処理後のサンプル, 先頭で除去したフレーム数, 除去した総フレーム数)、全体が無音なら (None, 0, 0)
+        """
+        frame = self._frame_length()
+        frame_count = int(np.ceil(samples.size / float(frame)))
+        padded = np.zeros(frame_count * frame, dtype=np.float32)
+        padded[:samples.size] = samples
+        rms = np.sqrt(np.mean(padded.reshape(frame_count, frame) ** 2, axis=1))
+        voiced = 20 * np.log10(rms + 1e-10) > self.silence_db
+        if not voiced.any():
+            return None, 0, 0
+
+        keep = int(self.keep_silence_ms / self.frame_ms)
+        first = int(np.argmax(voiced))
+        last = frame_count - 1 - int(np.argmax(voiced[::-1]))
+        keep_mask = np.zeros(frame_count, dtype=bool)
+        keep_mask[max(0, first - keep):min(frame_count, last + 1 + keep)] = True
+
+        # 発話中の無音区間（連続するフレーム）を求め、長すぎる区間の中央を削る
+        silent = np.concatenate([[False], ~voiced[first:last + 1], [False]])
+        edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+        max_pause = int(self.max_pause_ms / self.frame_ms)
+        for run_start, run_end in zip(edges[::2], edges[1::2]):
+            if run_end - run_start > max_pause:
+                keep_mask[first + run_start + max_pause // 2:first + run_end - (max_pause - max_pause // 2)] = False
+
+        leading = max(0, first - keep)
+        removed = frame_count - int(keep_mask.sum())
+        sample_mask = np.repeat(keep_mask, frame)[:samples.size]
+        return samples[sample_mask], leading, removed
+
+    def _normalize(self, samples: np.ndarray) -> np.ndarray:
+        """発話部分のRMSを目標値に合わせる（ピークを超えないよう制限）"""
+        frame = self._frame_length()
+        frame_count = samples.size // frame
+        if frame_count == 0:
+            return samples
+        frames = samples[:frame_count * frame].reshape(frame_count, frame)
+        energy = np.mean(frames ** 2, axis=1)
+        active = energy[20 * np.log10(np.sqrt(energy) + 1e-10) > self.silence_db]
+        if active.size == 0:
+            return samples
+        current_db = 10 * np.log10(np.mean(active))
+        gain = 10 ** ((self.target_db - current_db) / 20.0)
+        peak = float(np.max(np.abs(samples)))
+        if peak > 0:
+            gain = min(gain, 10 ** (self.peak_db / 20.0) / peak)
+        return samples * gain
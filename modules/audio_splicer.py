@@ -0,0 +1,72 @@
+# modules/audio_splicer.py
+# -*- coding: utf-8 -*-
+# キャッシュ済みの音声（定型フレーズ＋回答など）を短いクロスフェードでつなぐモジュール
+import wave
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from modules.lip_sync import decode_wav, pcm16_to_samples, encode_wav
+
+# 形式の異なる音声をつなぐときにそろえるサンプリングレート（OpenAI TTS・CoeFontの出力に合わせる）
+DEFAULT_SPLICE_SAMPLE_RATE = 24000
+
+
+def splice_audio(segments: List[Tuple[bytes, Optional[str]]],
+                 crossfade_ms: float = 30,
+                 decode_pcm: Optional[Callable[[bytes, int], Optional[bytes]]] = None) -> Optional[bytes]:
+    """
+    複数の音声をサンプル単位で連結し、16bitモノラルのWAVを返す
+
+    すべてが同じサンプリングレートのWAVならそのまま連結する。
+    形式がそろわない場合（MP3が混ざる・レートが違うなど）は decode_pcm で共通のレートに変換する。
+    つなぎ目は等パワーのクロスフェードで重ねる。
+
+    Args:
+        segments: [(音声のバイト列, MIMEタイプ)]
+        crossfade_ms: つなぎ目で重ねる長さ（ミリ秒）
+        decode_pcm: (バイト列, サンプリングレート) から16bitモノラルPCMに変換する関数（ffmpegなど）
+
+    Returns:
+        連結後のWAVのバイト列、変換できなければNone
+    """
+    if not segments:
+        return None
+
+    decoded = []
+    for audio_bytes, _ in segments:
+        try:
+            decoded.append(decode_wav(audio_bytes) if audio_bytes else None)
+        except (wave.Error, EOFError, ValueError):
+            decoded.append(None)
+
+    rates = {item[1] for item in decoded if item is not None}
+    if None in decoded or len(rates) != 1:
+        # 形式をそろえる
+        if decode_pcm is None:
+            return None
+        sample_rate = rates.pop() if len(rates) == 1 else DEFAULT_SPLICE_SAMPLE_RATE
+        decoded = []
+        for audio_bytes, _ in segments:
+            pcm_bytes = decode_pcm(audio_bytes, sample_rate)
+            if not pcm_bytes:
+                return None
+            decoded.append((pcm16_to_samples(pcm_bytes), sample_rate))
+    else:
+        sample_rate = rates.pop()
+
+    result = decoded[0][0]
+    for samples, _ in decoded[1:]:
+        result = _crossfade(result, samples, int(sample_rate * crossfade_ms / 1000.0))
+
+    return encode_wav(result, sample_rate)
+
+
+def _crossfade(head: np.ndarray, tail: np.ndarray, overlap: int) -> np.ndarray:
+    # 短い音声ではつなぎ目が音声の半分を超えないようにする
+    overlap = max(0, min(overlap, head.size // 2, tail.size // 2))
+    if overlap == 0:
+        return np.concatenate([head, tail])
+    phase = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+    mixed = head[-overlap:] * np.cos(phase) + tail[:overlap] * np.sin(phase)
+    return np.concatenate([head[:-overlap], mixed, tail[overlap:]])
@@ -0,0 +1,238 @@
+# modules/circuit_breaker.py
+# -*- coding: utf-8 -*-
+# 上流エンジンごとの健全性を追跡するサーキットブレーカー
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    直近の呼び出し結果（エラー率・遅延率）で開閉するサーキットブレーカー
+
+    - closed: 通常どおり呼び出す。直近の失敗率か遅延率が閾値を超えたら open へ
+    - open: 呼び出さない。一定時間後に half_open へ
+    - half_open: 試行呼び出し（またはプローブ）を1件だけ許可し、成功で closed、失敗で open へ戻す
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self,
+                 name: str,
+                 window: int = 20,
+                 min_calls: int = 5,
+                 failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 10.0,
+                 slow_rate_threshold: float = 0.8,
+                 open_seconds: float = 30.0,
+                 probe: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            name: エンジン名（ログ・統計用）
+            window: 判定に使う直近の呼び出し数
+            min_calls: 判定を始める最小の呼び出し数
+            failure_rate_threshold: open にする失敗率（0〜1）
+            slow_call_seconds: 遅い呼び出しとみなす応答時間（秒）
+            slow_rate_threshold: open にする遅延率（0〜1）
+            open_seconds: open から half_open に移るまでの時間（秒）
+            probe: 軽量な死活確認関数（成功でTrue）
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.probe = probe
+
+        self._outcomes = deque(maxlen=window)  # (成功したか, 遅かったか)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'successes': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'rejected': 0,
+            'opened': 0,
+            'closed': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'last_state_change': None,
+            'last_open_reason': None
+        }
+
+    # ====== 状態 ======
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def is_available(self) -> bool:
+        """ルーティング判定用（試行枠は消費しない）"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def allow_request(self) -> bool:
+        """実際に呼び出してよいか（half_open では試行枠を1件消費する）"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    # ====== 結果の記録 ======
+
+    def record_success(self, seconds: float = 0.0):
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            self.stats['successes'] += 1
+            if slow:
+                self.stats['slow_calls'] += 1
+            if self._current_state() == self.HALF_OPEN:
+                self._close()
+                return
+            self._outcomes.append((True, slow))
+            self._evaluate()
+
+    def record_failure(self, reason: str = ''):
+        with self._lock:
+            self.stats['failures'] += 1
+            if self._current_state() == self.HALF_OPEN:
+                self._open(f"試行呼び出し失敗 {reason}".strip())
+                return
+            self._outcomes.append((False, False))
+            self._evaluate(reason)
+
+    def force_open(self, reason: str):
+        """外部の判定（起動時の接続テスト失敗など）で open にする"""
+        with self._lock:
+            self._open(reason)
+
+    # ====== プローブ ======
+
+    def run_probe(self) -> Optional[bool]:
+        """
+        open の待ち時間が過ぎていればプローブで死活確認する
+
+        Returns:
+            プローブ結果（実行しなかった場合None）
+        """
+        if self.probe is None:
+            return None
+        with self._lock:
+            if self._current_state() != self.HALF_OPEN or self._trial_in_flight:
+                return None
+            self._trial_in_flight = True
+            self.stats['probes'] += 1
+
+        try:
+            ok = bool(self.probe())
+        except Exception as e:
+            print(f"❌ {self.name} プローブエラー: {e}")
+            ok = False
+
+        with self._lock:
+            if ok:
+                self._close()
+            else:
+                self.stats['probe_failures'] += 1
+                self._open('プローブ失敗')
+        return ok
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            calls = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+            result.update({
+                'state': self._current_state(),
+                'window_calls': calls,
+                'failure_rate': (failures / calls * 100) if calls else 0.0,
+                'slow_rate': (slow / calls * 100) if calls else 0.0,
+                'open_remaining_seconds': max(0.0, self._opened_at + self.open_seconds - time.time())
+                                          if self._state == self.OPEN else 0.0
+            })
+        return result
+
+    # ====== 内部処理（ロック取得済みで呼ぶ） ======
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.time() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+            self.stats['last_state_change'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            print(f"🟡 {self.name} サーキットブレーカー: half-open（試行を許可）")
+        return self._state
+
+    def _evaluate(self, reason: str = ''):
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failure_rate = sum(1 for ok, _ in self._outcomes if not ok) / calls
+        slow_rate = sum(1 for _, slow in self._outcomes if slow) / calls
+        if failure_rate >= self.failure_rate_threshold:
+            self._open(f"失敗率 {failure_rate * 100:.0f}% {reason}".strip())
+        elif slow_rate >= self.slow_rate_threshold:
+            self._open(f"遅延率 {slow_rate * 100:.0f}%")
+
+    def _open(self, reason: str):
+        if self._state != self.OPEN:
+            self.stats['opened'] += 1
+            print(f"🔴 {self.name} サーキットブレーカー: open ({reason})")
+        self._state = self.OPEN
+        self._opened_at = time.time()
+        self._trial_in_flight = False
+        self._outcomes.clear()
+        self.stats['last_state_change'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.stats['last_open_reason'] = reason
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+        self._outcomes.clear()
+        self.stats['closed'] += 1
+        self.stats['last_state_change'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        print(f"🟢 {self.name} サーキットブレーカー: closed（復旧）")
+
+
+def start_breaker_probes(breakers, start_background_task: Callable, sleep: Callable[[float], None],
+                         interval: float = 5.0, initial_probe: bool = True):
+    """
+    バックグラウンドで open 状態のブレーカーをプローブする
+
+    Args:
+        breakers: CircuitBreakerのリスト
+        initial_probe: 起動直後に全エンジンを一度プローブするか
+    """
+    def _worker():
+        if initial_probe:
+            for breaker in breakers:
+                if breaker.probe is None:
+                    continue
+                try:
+                    ok = breaker.probe()
+                except Exception as e:
+                    print(f"❌ {breaker.name} 起動時プローブエラー: {e}")
+                    ok = False
+                if not ok:
+                    breaker.force_open('起動時プローブ失敗')
+        while True:
+            sleep(interval)
+            for breaker in breakers:
+                breaker.run_probe()
+
+    start_background_task(_worker)
@@ -4,10 +4,11 @@ import os
 import hmac
 import hashlib
 import json
-import requests
 import base64
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
+
+from modules.http_transport import COEFONT_API_BASE_URL, get_http_session, get_http_timeout
 
 class CoeFontClient:
     def __init__(self):
@@ -15,7 +16,9 @@ class CoeFontClient:
         self.access_key = os.getenv('COEFONT_ACCESS_KEY')
         self.access_secret = os.getenv('COEFONT_ACCESS_SECRET')
         self.coefont_id = os.getenv('COEFONT_VOICE_ID')
-        self.api_base_url = 'https://api.coefont.cloud/v2'
+        self.api_base_url = COEFONT_API_BASE_URL
+        # Keep-Aliveで接続を使い回す共有セッション
+        self.session = get_http_session()
         
         # 設定チェック
         if not all([self.access_key, self.access_secret, self.coefont_id]):
@@ -64,6 +67,10 @@ class CoeFontClient:
         
         return signature
 
+    def get_emotion_params(self, emotion: Optional[str]) -> dict:
+        """感情に応じた音声パラメータのコピーを取得（キャッシュキーや設定の指紋用）"""
+        return dict(self._get_emotion_params(emotion))
+
     def _get_emotion_params(self, emotion: Optional[str]) -> dict:
         """感情に応じた音声パラメータを取得（CoeFont API公式仕様対応版）"""
         # デフォルトパラメータ（CoeFont API公式ドキュメントに基づく）
@@ -167,11 +174,11 @@ class CoeFontClient:
             print(f"Headers: {json.dumps({k: v[:20] + '...' if k in ['Authorization', 'X-Coefont-Content'] and len(v) > 20 else v for k, v in headers.items()}, indent=2)}")
             
             # API呼び出し
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base_url}/text2speech",
                 data=request_body.encode('utf-8'),  # UTF-8でエンコード
                 headers=headers,
-                timeout=30
+                timeout=get_http_timeout(30)
             )
             
             print(f"CoeFont API response: HTTP {response.status_code}")
@@ -198,6 +205,19 @@ class CoeFontClient:
             return False
 
     def generate_audio(self, text: str, emotion: Optional[str] = None) -> Optional[str]:
+        """
+        テキストから音声を生成
+        
+        Returns:
+            音声データ（Base64エンコード済みdata URL）、失敗時None
+        """
+        result = self.generate_audio_bytes(text, emotion=emotion)
+        if result is None:
+            return None
+        audio_bytes, mime = result
+        return f"data:{mime};base64,{base64.b64encode(audio_bytes).decode('utf-8')}"
+    
+    def generate_audio_bytes(self, text: str, emotion: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
         """
         テキストから音声を生成（公式ドキュメント完全準拠）
         
@@ -206,7 +226,7 @@ class CoeFontClient:
             emotion: 感情（オプション）
             
         Returns:
-            音声データ（Base64エンコード済みdata URL）、失敗時None
+            (音声のバイト列, MIMEタイプ)、失敗時None
         """
         if not self.is_available():
             print("❌ CoeFont設定が不完全です")
@@ -246,11 +266,11 @@ class CoeFontClient:
             }
             
             # API呼び出し
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base_url}/text2speech",
                 data=request_body.encode('utf-8'),  # UTF-8でエンコード
                 headers=headers,
-                timeout=60
+                timeout=get_http_timeout(60)
             )
             
             print(f"📡 CoeFont APIレスポンス: HTTP {response.status_code}")
@@ -259,10 +279,7 @@ class CoeFontClient:
                 # 直接音声データが返ってきた場合
                 audio_data = response.content
                 print(f"✅ CoeFont音声生成成功: [audio_data {len(audio_data)} bytes]")
-                
-                # Base64エンコードしてdata URLとして返す
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                return f"data:audio/wav;base64,{audio_base64}"
+                return audio_data, "audio/wav"
                 
             elif response.status_code == 302:
                 # リダイレクトの場合（公式ドキュメント通り）
@@ -271,14 +288,11 @@ class CoeFontClient:
                     print(f"📎 リダイレクトURL取得: {redirect_url}")
                     
                     # リダイレクト先から音声データを取得
-                    audio_response = requests.get(redirect_url, timeout=60)
+                    audio_response = self.session.get(redirect_url, timeout=get_http_timeout(60))
                     if audio_response.status_code == 200:
                         audio_data = audio_response.content
                         print(f"✅ CoeFont音声生成成功: [audio_data {len(audio_data)} bytes]")
-                        
-                        # Base64エンコードしてdata URLとして返す
-                        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                        return f"data:audio/wav;base64,{audio_base64}"
+                        return audio_data, "audio/wav"
                     else:
                         print(f"❌ リダイレクト先でエラー: HTTP {audio_response.status_code}")
                         return None
@@ -300,6 +314,38 @@ class CoeFontClient:
             traceback.print_exc()
             return None
 
+    def ping(self, timeout: float = 5) -> bool:
+        """
+        軽量な死活確認（音声合成は行わず、認証付きのCoeFont一覧取得だけを試す）
+        
+        Returns:
+            APIが応答すればTrue
+        """
+        if not self.is_available():
+            return False
+        try:
+            timestamp = self._get_timestamp()
+            signature = hmac.new(
+                self.access_secret.encode('utf-8'),
+                timestamp.encode('utf-8'),
+                hashlib.sha256
+            ).hexdigest()
+            headers = {
+                'Content-Type': 'application/json',
+                'Authorization': self.access_key,
+                'X-Coefont-Date': timestamp,
+                'X-Coefont-Content': signature
+            }
+            response = self.session.get(
+                f"{self.api_base_url}/coefonts/pro",
+                headers=headers,
+                timeout=get_http_timeout(timeout)
+            )
+            return response.status_code == 200
+        except Exception as e:
+            print(f"❌ CoeFont死活確認エラー: {e}")
+            return False
+
     def get_available_coefonts(self) -> Optional[list]:
         """利用可能なCoeFont一覧を取得"""
         if not self.is_available():
@@ -323,10 +369,10 @@ class CoeFontClient:
                 'X-Coefont-Content': signature
             }
             
-            response = requests.get(
+            response = self.session.get(
                 f"{self.api_base_url}/coefonts/pro",
                 headers=headers,
-                timeout=30
+                timeout=get_http_timeout(30)
             )
             
             if response.status_code == 200:
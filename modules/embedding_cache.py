@@ -0,0 +1,217 @@
+# modules/embedding_cache.py
+# -*- coding: utf-8 -*-
+# 検索クエリの埋め込みをディスクに保存して再利用し、ベクトル検索の結果を短時間キャッシュするモジュール
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from modules.audio_cache import DiskCacheTier, normalize_cache_text
+
+
+def make_embedding_cache_key(model: str, text: str) -> str:
+    """埋め込みモデル名と正規化テキスト（NFKC＋空白の統一）からキーを生成（SHA-256のHEX文字列）"""
+    return hashlib.sha256(f"{model}\n{normalize_cache_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    クエリの埋め込みの2段キャッシュ
+
+    - 1段目: プロセス内LRU（件数で上限管理）
+    - 2段目: ディスク（float32の生データ。gunicornの全ワーカー・再起動後も共有、件数で上限管理）
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 memory_entries: Optional[int] = None,
+                 disk_entries: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv('EMBEDDING_CACHE_DIR', 'data/embedding_cache')
+        self.memory_entries = memory_entries or int(os.getenv('EMBEDDING_CACHE_MEMORY_ENTRIES', '2000'))
+        self.disk_entries = disk_entries or int(os.getenv('EMBEDDING_CACHE_DISK_ENTRIES', '20000'))
+
+        self._memory = OrderedDict()  # key -> List[float]
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        self._disk = DiskCacheTier(self.cache_dir, '.f32', '埋め込みキャッシュ', prune_interval=200)
+        self.disk_enabled = self._disk.enabled
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """キャッシュから埋め込みを取得。なければNone"""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return vector
+
+        vector = self._read_disk(key)
+        if vector is not None:
+            self._remember(key, vector)
+            with self._lock:
+                self.stats['disk_hits'] += 1
+            return vector
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, vector: List[float]):
+        """埋め込みをメモリとディスクの両方に保存"""
+        if not vector:
+            return
+        vector = list(vector)
+        self._remember(key, vector)
+        self._write_disk(key, vector)
+        with self._lock:
+            self.stats['stores'] += 1
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            lookups = hits + self.stats['misses']
+            result = dict(self.stats)
+            result.update({
+                'hits': hits,
+                'hit_rate': (hits / lookups * 100) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_limit_entries': self.memory_entries,
+                'disk_limit_entries': self.disk_entries,
+                'disk_enabled': self.disk_enabled
+            })
+        return result
+
+    # ====== メモリ層 ======
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self.stats['memory_evictions'] += 1
+
+    # ====== ディスク層 ======
+
+    def _read_disk(self, key: str) -> Optional[List[float]]:
+        raw = self._disk.read(key)
+        if not raw or len(raw) % 4:
+            return None
+        return np.frombuffer(raw, dtype='<f4').astype(np.float64).tolist()
+
+    def _write_disk(self, key: str, vector: List[float]):
+        if self._disk.write(key, np.asarray(vector, dtype='<f4').tobytes()) and self._disk.note_put():
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """件数が上限を超えていれば最終アクセスの古いものから削除"""
+        entries = self._disk.scan()
+        evicted = 0
+        if len(entries) > self.disk_entries:
+            # 上限の90%まで削減して削除処理の頻発を防ぐ
+            for _, _, path in entries[:len(entries) - int(self.disk_entries * 0.9)]:
+                if self._disk.unlink(path):
+                    evicted += 1
+
+        with self._lock:
+            self.stats['disk_evictions'] += evicted
+        if evicted:
+            print(f"🧹 埋め込みキャッシュ削除: {evicted}件")
+
+
+class CachingEmbeddings:
+    """
+    埋め込みモデルのラッパー。embed_query の結果を EmbeddingCache に保存して再利用する
+    （キャッシュと一致させるため、正規化したテキストを埋め込む。embed_documents などはそのまま委譲する）
+    """
+
+    def __init__(self, embeddings, cache: Optional[EmbeddingCache] = None, model: Optional[str] = None):
+        self._embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self._model = model or getattr(embeddings, 'model', None) or 'unknown'
+
+    def embed_query(self, text: str):
+        key = make_embedding_cache_key(self._model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self._embeddings.embed_query(normalize_cache_text(text))
+            self.cache.put(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        return self._embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self._embeddings, name)
+
+
+class RetrievalCache:
+    """
+    ベクトル検索の結果（上位k件）を短時間キャッシュする（プロセス内、件数で上限管理）
+
+    キーには呼び出し側でナレッジのバージョンを含め、ナレッジの変更後の結果と混ざらないようにする。
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('RETRIEVAL_CACHE_TTL', '300'))
+        self.max_entries = max_entries or int(os.getenv('RETRIEVAL_CACHE_MAX_ENTRIES', '256'))
+        self._entries = OrderedDict()  # key -> (保存時刻, 結果)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'clears': 0
+        }
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """有効期間内の結果を取得。なければNone"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.time() - item[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return item[1]
+            if item is not None:
+                del self._entries[key]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key: tuple, results: Any):
+        with self._lock:
+            self._entries[key] = (time.time(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        """すべての結果を捨てる（ナレッジの変更時）"""
+        with self._lock:
+            self._entries.clear()
+            self.stats['clears'] += 1
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['entries'] = len(self._entries)
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = (result['hits'] / lookups * 100) if lookups else 0.0
+        result['ttl'] = self.ttl
+        return result
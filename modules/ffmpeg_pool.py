@@ -0,0 +1,646 @@
+# modules/ffmpeg_pool.py
+# -*- coding: utf-8 -*-
+# ffmpegの実行を常駐ワーカープロセスに任せるプール
+#
+# - ワーカーは別プロセスのPythonで、標準入出力のパイプで受け取ったジョブごとにffmpegを起動する
+#   （大きなWebワーカープロセスからの fork を避け、音声処理をSocket.IOのハブの外で行う）
+# - 空きワーカーがなければ待ち行列に並び、一定件数を処理したワーカーは入れ替える
+# - 録音の受信と並行して変換するストリーミングジョブ（open_stream）も同じワーカーで実行する
+# - 定期的に ping でヘルスチェックし、応答しないワーカーは作り直す
+# - ffmpegの検出は初回利用時に1回だけ行う（import時にはプロセスを起動しない）
+#
+# このファイルはワーカー本体としても実行される（python ffmpeg_pool.py --worker）ため、
+# トップレベルでは標準ライブラリだけを使う。
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import struct
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional
+
+# フレーム: [ヘッダ長(4バイト)][ペイロード長(4バイト)][JSONヘッダ][ペイロード]
+_FRAME_HEADER = struct.Struct('>II')
+
+_ffmpeg_lock = threading.Lock()
+_ffmpeg_paths = {}  # 指定パス -> 検出結果（見つからなければNone）
+
+
+def find_ffmpeg(path: Optional[str] = None) -> Optional[str]:
+    """
+    ffmpegの実行ファイルを検出（結果はキャッシュし、プロセスは起動しない）
+
+    Returns:
+        実行ファイルのフルパス、見つからなければNone
+    """
+    path = path or os.getenv('FFMPEG_PATH', 'ffmpeg')
+    with _ffmpeg_lock:
+        if path not in _ffmpeg_paths:
+            _ffmpeg_paths[path] = shutil.which(path)
+            if not _ffmpeg_paths[path]:
+                print(f"⚠️ FFmpegが見つかりません ({path})。PATH環境変数またはFFMPEG_PATHを確認してください。")
+        return _ffmpeg_paths[path]
+
+
+def _write_frame(stream, header: Dict, payload: bytes = b''):
+    encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    stream.write(_FRAME_HEADER.pack(len(encoded), len(payload)) + encoded + payload)
+    stream.flush()
+
+
+def _read_exact(stream, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _read_frame(stream):
+    """フレームを1つ読む。パイプが閉じていればNone"""
+    prefix = _read_exact(stream, _FRAME_HEADER.size)
+    if prefix is None:
+        return None
+    header_size, payload_size = _FRAME_HEADER.unpack(prefix)
+    encoded = _read_exact(stream, header_size)
+    payload = _read_exact(stream, payload_size) if payload_size else b''
+    if encoded is None or payload is None:
+        return None
+    return json.loads(encoded.decode('utf-8')), payload
+
+
+class FFmpegWorkerError(Exception):
+    """ワーカープロセスとの通信に失敗した"""
+
+
+class _Worker:
+    """常駐ワーカープロセス1つ分"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            close_fds=True
+        )
+        self.pid = self.process.pid
+        self.jobs = 0
+        self.started_at = time.time()
+
+    def send(self, header: Dict, payload: bytes = b''):
+        """応答を待たないフレームを送る（ストリーミングジョブのデータ）"""
+        try:
+            _write_frame(self.process.stdin, header, payload)
+        except (OSError, ValueError) as e:
+            raise FFmpegWorkerError(f"ワーカー(pid={self.pid})との通信エラー: {e}")
+
+    def request(self, header: Dict, payload: bytes = b''):
+        try:
+            _write_frame(self.process.stdin, header, payload)
+            frame = _read_frame(self.process.stdout)
+        except (OSError, ValueError) as e:
+            raise FFmpegWorkerError(f"ワーカー(pid={self.pid})との通信エラー: {e}")
+        if frame is None:
+            raise FFmpegWorkerError(f"ワーカー(pid={self.pid})が終了しました (returncode={self.process.poll()})")
+        return frame
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class FFmpegWorkerPool:
+    """
+    ffmpegのジョブを常駐ワーカープロセスで実行するプール
+
+    run() は subprocess.run と同じく CompletedProcess を返し、タイムアウト時は TimeoutExpired を送出する。
+    ワーカーが使えない場合はその場でffmpegを起動して処理する（fallbacks に計上）。
+    """
+
+    def __init__(self,
+                 size: Optional[int] = None,
+                 max_jobs_per_worker: Optional[int] = None,
+                 health_check_interval: Optional[float] = None,
+                 queue_timeout: Optional[float] = None):
+        """
+        Args:
+            size: ワーカー数（同時に実行できるffmpegの数）
+            max_jobs_per_worker: この件数を処理したワーカーは入れ替える
+            health_check_interval: 空きワーカーのヘルスチェック間隔（秒）
+            queue_timeout: 空きワーカーを待つ最大時間（秒）。超えたらその場でffmpegを起動する
+        """
+        self.enabled = os.getenv('FFMPEG_POOL_ENABLED', 'true').lower() == 'true'
+        self.size = max(1, size or int(os.getenv('FFMPEG_POOL_SIZE', '2')))
+        self.max_jobs_per_worker = max_jobs_per_worker or int(os.getenv('FFMPEG_POOL_MAX_JOBS', '200'))
+        self.health_check_interval = health_check_interval or float(os.getenv('FFMPEG_POOL_HEALTH_INTERVAL', '30'))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv('FFMPEG_POOL_QUEUE_TIMEOUT', '10'))
+
+        self._slots = threading.BoundedSemaphore(self.size)  # ジョブの待ち行列（空きワーカー数）
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {
+            'jobs': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'fallbacks': 0,
+            'spawned': 0,
+            'recycled': 0,
+            'unhealthy': 0,
+            'surplus': 0,
+            'streams': 0,
+            'stream_rejections': 0,
+            'health_checks': 0,
+            'waiting': 0,
+            'max_waiting': 0,
+            'queue_wait_seconds': 0.0,
+            'job_seconds': 0.0
+        }
+        atexit.register(self.shutdown)
+
+    def run(self, command: List[str], input_bytes: bytes = b'', timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """ffmpegのコマンドを実行して結果を返す"""
+        if not self.enabled or self._closed:
+            return self._run_direct(command, input_bytes, timeout)
+
+        queued_at = time.time()
+        with self._lock:
+            self.stats['waiting'] += 1
+            self.stats['max_waiting'] = max(self.stats['max_waiting'], self.stats['waiting'])
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.stats['waiting'] -= 1
+            self.stats['queue_wait_seconds'] += time.time() - queued_at
+        if not acquired:
+            print(f"⚠️ FFmpegワーカーの空き待ちが {self.queue_timeout:.0f}秒を超えたため直接実行します")
+            return self._run_direct(command, input_bytes, timeout)
+
+        try:
+            try:
+                worker = self._checkout()
+            except OSError as e:
+                print(f"❌ FFmpegワーカーの起動に失敗: {e}")
+                return self._run_direct(command, input_bytes, timeout)
+
+            start_time = time.time()
+            try:
+                header, stdout = worker.request({'type': 'run', 'command': command, 'timeout': timeout}, input_bytes)
+            except FFmpegWorkerError as e:
+                print(f"❌ {e}")
+                worker.close()
+                with self._lock:
+                    self.stats['failures'] += 1
+                return self._run_direct(command, input_bytes, timeout)
+
+            worker.jobs += 1
+            self._checkin(worker)
+            with self._lock:
+                self.stats['jobs'] += 1
+                self.stats['job_seconds'] += time.time() - start_time
+
+            error = header.get('error')
+            if error == 'timeout':
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise subprocess.TimeoutExpired(command, timeout)
+            if error:
+                raise OSError(error)
+            return subprocess.CompletedProcess(command, header['returncode'], stdout,
+                                               header.get('stderr', '').encode('utf-8'))
+        finally:
+            self._slots.release()
+
+    def open_stream(self, command: List[str], max_output: Optional[int] = None) -> Optional['FFmpegStream']:
+        """
+        入力を少しずつ渡せるストリーミングジョブを開始する
+
+        ジョブの間はワーカーを1つ占有するため、空きワーカーがなければ待たずにNoneを返す
+        （呼び出し側は入力をためておき、最後に run() でまとめて変換する）。
+
+        Args:
+            max_output: 出力がこのバイト数を超えたらffmpegを打ち切る
+        """
+        if not self.enabled or self._closed:
+            return None
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['stream_rejections'] += 1
+            return None
+        try:
+            worker = self._checkout()
+        except OSError as e:
+            print(f"❌ FFmpegワーカーの起動に失敗: {e}")
+            self._slots.release()
+            return None
+        try:
+            header, _ = worker.request({'type': 'stream_start', 'command': command, 'max_output': max_output})
+        except FFmpegWorkerError as e:
+            print(f"❌ {e}")
+            worker.close()
+            self._slots.release()
+            with self._lock:
+                self.stats['failures'] += 1
+            return None
+        if header.get('error'):
+            print(f"❌ FFmpegのストリーミングジョブを開始できません: {header['error']}")
+            self._checkin(worker)
+            self._slots.release()
+            return None
+        with self._lock:
+            self.stats['streams'] += 1
+        return FFmpegStream(self, worker, command)
+
+    def check_health(self) -> int:
+        """
+        空きワーカーに1件ずつ ping を送り、応答しないものを作り直す
+        （ping 中のワーカー以外はその間もジョブに使える）
+
+        Returns:
+            入れ替えたワーカー数
+        """
+        with self._lock:
+            workers = list(self._idle)
+            self.stats['health_checks'] += 1
+        unhealthy = 0
+        for worker in workers:
+            with self._lock:
+                if worker not in self._idle:
+                    continue  # ジョブに使われている
+                self._idle.remove(worker)
+            try:
+                header, _ = worker.request({'type': 'ping'})
+                ok = header.get('type') == 'pong'
+            except FFmpegWorkerError as e:
+                print(f"⚠️ {e}")
+                ok = False
+            if ok:
+                self._add_idle([worker])
+            else:
+                worker.close()
+                unhealthy += 1
+
+        # 応答しなかった分を作り直しておく（次のジョブで起動を待たずに済むように）
+        replacements = []
+        try:
+            for _ in range(unhealthy):
+                with self._lock:
+                    if len(self._idle) + len(replacements) >= self.size:
+                        break
+                replacements.append(self._spawn())
+        except OSError as e:
+            print(f"❌ FFmpegワーカーの起動に失敗: {e}")
+        self._add_idle(replacements)
+        with self._lock:
+            self.stats['unhealthy'] += unhealthy
+        if unhealthy:
+            print(f"🩺 FFmpegワーカー {unhealthy}件を入れ替えました")
+        return unhealthy
+
+    def start(self, start_background_task: Callable, sleep: Callable[[float], None]):
+        """
+        バックグラウンドでワーカーを起動し、定期的なヘルスチェックを開始
+
+        Args:
+            start_background_task: socketio.start_background_task など
+            sleep: socketio.sleep など（eventlet環境でハブをブロックしないもの）
+        """
+        if not self.enabled:
+            return
+
+        def _worker():
+            try:
+                self._add_idle([self._spawn() for _ in range(self.size)])
+            except OSError as e:
+                print(f"❌ FFmpegワーカーの起動に失敗: {e}")
+            while not self._closed:
+                sleep(self.health_check_interval)
+                try:
+                    self.check_health()
+                except Exception as e:
+                    print(f"❌ FFmpegワーカーのヘルスチェックエラー: {e}")
+
+        start_background_task(_worker)
+        print(f"🏭 FFmpegワーカープールを開始 (ワーカー数: {self.size}, 入れ替え: {self.max_jobs_per_worker}件ごと)")
+
+    def shutdown(self):
+        """全ワーカーを終了"""
+        with self._lock:
+            self._closed = True
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['idle_workers'] = len(self._idle)
+            result['worker_jobs'] = {worker.pid: worker.jobs for worker in self._idle}
+        jobs = result['jobs']
+        result.update({
+            'enabled': self.enabled,
+            'size': self.size,
+            'max_jobs_per_worker': self.max_jobs_per_worker,
+            'avg_job_ms': (result['job_seconds'] / jobs * 1000) if jobs else 0.0,
+            'avg_queue_wait_ms': (result['queue_wait_seconds'] / jobs * 1000) if jobs else 0.0
+        })
+        return result
+
+    # ====== 内部処理 ======
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker()
+        with self._lock:
+            self.stats['spawned'] += 1
+        return worker
+
+    def _checkout(self) -> _Worker:
+        """空きワーカーを取り出す（なければ起動する）"""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.is_alive():
+                    return worker
+                self.stats['unhealthy'] += 1
+        return self._spawn()
+
+    def _checkin(self, worker: _Worker):
+        """ワーカーを空きに戻す（処理件数が上限に達したものは終了して入れ替える）"""
+        if worker.jobs >= self.max_jobs_per_worker:
+            worker.close()
+            with self._lock:
+                self.stats['recycled'] += 1
+            return
+        self._add_idle([worker])
+
+    def _add_idle(self, workers: List[_Worker]):
+        """
+        ワーカーを空きに戻す
+
+        ヘルスチェック中や起動直後に空きがなく run() が起動した分で size を超える場合は、
+        超えた分を終了する（常駐プロセスが増え続けないように）。
+        """
+        surplus = []
+        with self._lock:
+            for worker in workers:
+                if self._closed or len(self._idle) >= self.size:
+                    surplus.append(worker)
+                else:
+                    self._idle.append(worker)
+            if not self._closed:
+                self.stats['surplus'] += len(surplus)
+        for worker in surplus:
+            worker.close()
+
+    def _run_direct(self, command: List[str], input_bytes: bytes, timeout: Optional[float]) -> subprocess.CompletedProcess:
+        with self._lock:
+            self.stats['fallbacks'] += 1
+        return subprocess.run(command, input=input_bytes, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, timeout=timeout)
+
+
+class FFmpegStream:
+    """
+    FFmpegWorkerPool.open_stream で開始したストリーミングジョブ
+
+    feed() で入力を渡し、finish() で出力を受け取る（中止は abort()）。
+    どちらかを呼ぶとワーカーはプールに戻る。
+    """
+
+    def __init__(self, pool: FFmpegWorkerPool, worker: _Worker, command: List[str]):
+        self.pool = pool
+        self.command = command
+        self._worker = worker
+        self._started_at = time.time()
+
+    @property
+    def active(self) -> bool:
+        return self._worker is not None
+
+    def feed(self, data: bytes):
+        """入力を渡す（応答は待たない）。ワーカーとの通信に失敗したら FFmpegWorkerError"""
+        if self._worker is None or not data:
+            return
+        try:
+            self._worker.send({'type': 'stream_data'}, data)
+        except FFmpegWorkerError:
+            self._release(failed=True)
+            raise
+
+    def finish(self, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """
+        入力を閉じてffmpegの終了を待ち、結果を返す
+
+        Raises:
+            subprocess.TimeoutExpired: timeout 秒以内に終わらなかった
+            FFmpegWorkerError: ワーカーとの通信に失敗した
+            OSError: ffmpegへの書き込みなどに失敗した
+        """
+        if self._worker is None:
+            raise FFmpegWorkerError('ストリーミングジョブは終了しています')
+        try:
+            header, stdout = self._worker.request({'type': 'stream_end', 'timeout': timeout})
+        except FFmpegWorkerError:
+            self._release(failed=True)
+            raise
+        self._release()
+        with self.pool._lock:
+            self.pool.stats['jobs'] += 1
+            self.pool.stats['job_seconds'] += time.time() - self._started_at
+        error = header.get('error')
+        if error == 'timeout':
+            with self.pool._lock:
+                self.pool.stats['timeouts'] += 1
+            raise subprocess.TimeoutExpired(self.command, timeout)
+        if error:
+            raise OSError(error)
+        return subprocess.CompletedProcess(self.command, header['returncode'], stdout,
+                                           header.get('stderr', '').encode('utf-8'))
+
+    def abort(self):
+        """ffmpegを終了してワーカーをプールに戻す（何度呼んでもよい）"""
+        if self._worker is None:
+            return
+        try:
+            self._worker.request({'type': 'stream_abort'})
+        except FFmpegWorkerError:
+            self._release(failed=True)
+            return
+        self._release()
+
+    def _release(self, failed: bool = False):
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        if failed:
+            worker.close()
+            with self.pool._lock:
+                self.pool.stats['failures'] += 1
+        else:
+            worker.jobs += 1
+            self.pool._checkin(worker)
+        self.pool._slots.release()
+
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def get_ffmpeg_pool() -> FFmpegWorkerPool:
+    """プロセス内で共有するffmpegワーカープール"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FFmpegWorkerPool()
+        return _pool
+
+
+class _StreamJob:
+    """ワーカープロセス内で実行中のストリーミングジョブ（ffmpegの標準出力・標準エラーは別スレッドで読む）"""
+
+    def __init__(self, command: List[str], max_output: Optional[int]):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        self.max_output = max_output
+        self.output = []
+        self.output_bytes = 0
+        self.stderr = b''
+        self.error = None
+        self.readers = [threading.Thread(target=self._drain_output, daemon=True),
+                        threading.Thread(target=self._drain_stderr, daemon=True)]
+        for reader in self.readers:
+            reader.start()
+
+    def write(self, data: bytes):
+        if self.error:
+            return
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            # ffmpegが先に終了した：残りの入力は捨て、stream_end で結果を返す
+            self.error = str(e) or type(e).__name__
+
+    def finish(self, timeout: Optional[float]):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            return {'error': 'timeout'}, b''
+        for reader in self.readers:
+            reader.join()
+        if self.max_output and self.output_bytes > self.max_output:
+            return {'error': f'出力が上限を超えました ({self.output_bytes} バイト)'}, b''
+        return {
+            'returncode': self.process.returncode,
+            'stderr': self.stderr.decode('utf-8', 'replace')[-2000:]
+        }, b''.join(self.output)
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+    def _drain_output(self):
+        while True:
+            chunk = self.process.stdout.read(65536)
+            if not chunk:
+                break
+            self.output.append(chunk)
+            self.output_bytes += len(chunk)
+            if self.max_output and self.output_bytes > self.max_output:
+                self.process.kill()
+                break
+
+    def _drain_stderr(self):
+        while True:
+            chunk = self.process.stderr.read(4096)
+            if not chunk:
+                break
+            self.stderr = (self.stderr + chunk)[-2000:]
+
+
+def _worker_main():
+    """ワーカープロセス本体: 標準入力からジョブを受け取り、ffmpegを実行して結果を標準出力に返す"""
+    requests_in = sys.stdin.buffer
+    responses_out = sys.stdout.buffer
+    # プロトコル以外の出力が混ざらないよう、print は標準エラーへ
+    sys.stdout = sys.stderr
+    stream = None  # 実行中のストリーミングジョブ
+
+    while True:
+        frame = _read_frame(requests_in)
+        if frame is None:
+            if stream is not None:
+                stream.kill()
+            break
+        header, payload = frame
+        kind = header.get('type')
+        if kind == 'ping':
+            _write_frame(responses_out, {'type': 'pong', 'pid': os.getpid()})
+            continue
+        if kind == 'stream_data':
+            # 応答は返さない（受信のたびに往復しない）
+            if stream is not None:
+                stream.write(payload)
+            continue
+        if kind == 'stream_start':
+            if stream is not None:
+                stream.kill()
+            try:
+                stream = _StreamJob(header['command'], header.get('max_output'))
+                _write_frame(responses_out, {'type': 'started'})
+            except OSError as e:
+                stream = None
+                _write_frame(responses_out, {'error': str(e) or type(e).__name__})
+            continue
+        if kind == 'stream_end':
+            if stream is None:
+                _write_frame(responses_out, {'error': 'ストリーミングジョブがありません'})
+                continue
+            result_header, output = stream.finish(header.get('timeout'))
+            stream = None
+            _write_frame(responses_out, result_header, output)
+            continue
+        if kind == 'stream_abort':
+            if stream is not None:
+                stream.kill()
+                stream = None
+            _write_frame(responses_out, {'type': 'aborted'})
+            continue
+        try:
+            result = subprocess.run(header['command'], input=payload, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, timeout=header.get('timeout'))
+            _write_frame(responses_out, {
+                'returncode': result.returncode,
+                'stderr': result.stderr.decode('utf-8', 'replace')[-2000:]
+            }, result.stdout)
+        except subprocess.TimeoutExpired:
+            _write_frame(responses_out, {'error': 'timeout'})
+        except OSError as e:
+            _write_frame(responses_out, {'error': str(e) or type(e).__name__})
+
+
+if __name__ == '__main__':
+    if '--worker' in sys.argv[1:]:
+        _worker_main()
@@ -0,0 +1,192 @@
+# modules/greeting_audio_bank.py
+# -*- coding: utf-8 -*-
+import json
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class GreetingAudioBank:
+    """
+    挨拶音声の事前生成バンク
+
+    全言語×全関係性スタイルの挨拶を起動時にまとめて生成しておき、
+    接続時の挨拶送信では上流のTTSを一切呼ばずにバンクから返す。
+    音声本体はTTS音声キャッシュ（ディスク層）に永続化されるため、
+    再起動後の再構築はキャッシュ読み込みだけで完了する。
+    優先エンジンの障害中に代替エンジンで生成した挨拶は、優先エンジンが
+    復旧した時点の定期チェックで生成し直す。
+    """
+
+    def __init__(self,
+                 get_greetings: Callable[[], Dict[str, Dict[str, str]]],
+                 synthesize: Callable[[str, str, str], Tuple[Optional[str], Optional[str]]],
+                 get_voice_config: Callable[[], Dict],
+                 get_preferred_engine: Callable[[str], str],
+                 emotion: str = 'happy',
+                 refresh_interval: float = 300,
+                 retry_interval: float = 30):
+        """
+        Args:
+            get_greetings: {言語: {関係性スタイル: 挨拶文}} を返す関数
+            synthesize: (テキスト, 言語, 感情) から (音声データ, 使用したエンジン) を返す関数
+            get_voice_config: 現在の音声設定（エンジン・ボイスIDなど）を返す関数
+            get_preferred_engine: 言語ごとに現在使える最優先のエンジンを返す関数
+            emotion: 挨拶に使う感情
+            refresh_interval: 設定変更をチェックする間隔（秒）
+            retry_interval: 未生成の挨拶が要求された際の再試行の最短間隔（秒）
+        """
+        self.get_greetings = get_greetings
+        self.synthesize = synthesize
+        self.get_voice_config = get_voice_config
+        self.get_preferred_engine = get_preferred_engine
+        self.emotion = emotion
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+
+        self._audio = {}  # (language, style) -> 音声データ
+        self._engines = {}  # (language, style) -> 生成に使ったエンジン
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._refresh_requested = threading.Event()
+        self._rendering = False
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'renders': 0,
+            'render_failures': 0,
+            'engine_rerenders': 0,
+            'last_render_seconds': 0.0,
+            'last_render_at': None
+        }
+
+    def compute_fingerprint(self) -> str:
+        """挨拶文と音声設定からバンクの指紋を計算"""
+        payload = json.dumps(
+            {'greetings': self.get_greetings(), 'voice': self.get_voice_config(), 'emotion': self.emotion},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, language: str, style: str) -> Optional[str]:
+        """事前生成済みの挨拶音声を取得（上流呼び出しは行わない）"""
+        with self._lock:
+            audio = self._audio.get((language, style))
+            if audio is not None:
+                self.stats['hits'] += 1
+                return audio
+            self.stats['misses'] += 1
+        # 未生成の場合はバックグラウンド更新を促すだけにとどめる
+        self._refresh_requested.set()
+        return None
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        指紋が変わっていれば全挨拶を、そうでなければ未生成の挨拶と
+        優先エンジン以外で生成された挨拶を生成し直す。生成した場合True
+        """
+        fingerprint = self.compute_fingerprint()
+        greetings = self.get_greetings()
+        preferred = {language: self.get_preferred_engine(language) for language in greetings}
+        with self._lock:
+            if self._rendering:
+                return False
+            full = force or fingerprint != self._fingerprint
+            stale = set() if full else self._stale_keys(greetings, preferred)
+            if not full and not stale:
+                return False
+            self._rendering = True
+
+        try:
+            start_time = time.time()
+            rendered = {}
+            engines = {}
+            failures = 0
+            for language, styles in greetings.items():
+                for style, text in styles.items():
+                    key = (language, style)
+                    if not full and key not in stale:
+                        continue
+                    try:
+                        audio, engine = self.synthesize(text, language, self.emotion)
+                    except Exception as e:
+                        print(f"❌ 挨拶音声の事前生成エラー ({language}/{style}): {e}")
+                        audio, engine = None, None
+                    if audio:
+                        rendered[key] = audio
+                        engines[key] = engine
+                    else:
+                        failures += 1
+
+            elapsed = time.time() - start_time
+            with self._lock:
+                if full:
+                    # 設定が変わった場合は古い音声を破棄して入れ替える
+                    self._audio = rendered
+                    self._engines = engines
+                else:
+                    self.stats['engine_rerenders'] += sum(1 for key in rendered if key in self._audio)
+                    self._audio.update(rendered)
+                    self._engines.update(engines)
+                # 失敗があれば次回のチェックで再試行させる
+                self._fingerprint = fingerprint
+                self.stats['renders'] += 1
+                self.stats['render_failures'] += failures
+                self.stats['last_render_seconds'] = elapsed
+                self.stats['last_render_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+            print(f"🎙️ 挨拶音声バンク更新完了: {len(rendered)}件 (失敗: {failures}件, {elapsed:.2f}秒)")
+            return True
+        finally:
+            with self._lock:
+                self._rendering = False
+
+    def start(self, start_background_task: Callable, sleep: Callable[[float], None]):
+        """
+        バックグラウンドで初回生成と定期チェックを開始
+
+        Args:
+            start_background_task: socketio.start_background_task など
+            sleep: socketio.sleep など（eventlet環境でハブをブロックしないもの）
+        """
+        def _worker():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ 挨拶音声バンク更新エラー: {e}")
+                self._refresh_requested.clear()
+                # 未生成の挨拶が要求された場合は早めに再チェックする
+                # （TTS障害時に再接続のたびに再生成が走らないよう最短間隔を設ける）
+                waited = 0.0
+                while waited < self.refresh_interval:
+                    if self._refresh_requested.is_set() and waited >= self.retry_interval:
+                        break
+                    sleep(1.0)
+                    waited += 1.0
+
+        start_background_task(_worker)
+        print(f"🎙️ 挨拶音声バンクのバックグラウンド更新を開始 (チェック間隔: {self.refresh_interval:.0f}秒)")
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['entries'] = len(self._audio)
+            result['expected_entries'] = sum(len(styles) for styles in self.get_greetings().values())
+            result['fingerprint'] = self._fingerprint
+            result['engines'] = {f"{language}/{style}": engine for (language, style), engine in self._engines.items()}
+        return result
+
+    def _stale_keys(self, greetings: Dict[str, Dict[str, str]], preferred: Dict[str, str]) -> set:
+        """未生成、または現在の優先エンジン以外で生成された挨拶のキー"""
+        stale = set()
+        for language, styles in greetings.items():
+            for style in styles:
+                key = (language, style)
+                if key not in self._audio or self._engines.get(key) != preferred.get(language):
+                    stale.add(key)
+        return stale
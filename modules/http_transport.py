@@ -0,0 +1,204 @@
+# modules/http_transport.py
+# -*- coding: utf-8 -*-
+# 上流API（CoeFont・OpenAI）への接続を共有するHTTPトランスポート層
+#
+# - requests.Session（CoeFont用）と httpx.Client（OpenAI SDK用）をプロセス内で1つずつ共有し、
+#   Keep-Aliveで TCP+TLS のハンドシェイクを使い回す
+# - 接続・読み込みのタイムアウトと再試行回数を明示
+# - 起動時に接続を事前確立（TLSプリウォーム）
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import OpenAI
+
+COEFONT_API_BASE_URL = 'https://api.coefont.cloud/v2'
+OPENAI_API_BASE_URL = 'https://api.openai.com/v1'
+
+_lock = threading.Lock()
+_session = None
+_httpx_client = None
+_openai_client = None
+
+# ホストごとのリクエスト統計（requestsのレスポンスフックで集計）
+_request_stats = defaultdict(lambda: {'requests': 0, 'errors': 0, 'total_seconds': 0.0})
+
+
+def get_http_timeout(read_timeout: Optional[float] = None):
+    """requests用の (接続タイムアウト, 読み込みタイムアウト)"""
+    connect = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+    read = read_timeout if read_timeout is not None else float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+    return connect, read
+
+
+def get_http_session() -> requests.Session:
+    """CoeFontなど requests で呼び出す上流API用の共有セッション"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+
+def get_httpx_client() -> httpx.Client:
+    """OpenAI SDK・langchain に渡す共有 httpx クライアント"""
+    global _httpx_client
+    with _lock:
+        if _httpx_client is None:
+            _httpx_client = _create_httpx_client()
+        return _httpx_client
+
+
+def get_openai_client() -> OpenAI:
+    """共有のOpenAIクライアント（chat・embeddings・TTS・Whisperで共用）"""
+    global _openai_client
+    http_client = get_httpx_client()
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(
+                http_client=http_client,
+                max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+            )
+        return _openai_client
+
+
+def prewarm_connections(urls=None) -> Dict[str, Optional[float]]:
+    """
+    上流APIへの接続を事前に確立（TLSハンドシェイクを起動時に済ませる）
+
+    Returns:
+        {URL: 接続にかかった秒数（失敗時None）}
+    """
+    results = {}
+    targets = urls or {
+        f"{COEFONT_API_BASE_URL}/coefonts/pro": 'requests',
+        f"{OPENAI_API_BASE_URL}/models": 'httpx'
+    }
+    for url, transport in targets.items():
+        start_time = time.time()
+        try:
+            # 認証なしのHEADでも接続とTLSは確立され、Keep-Aliveでプールに残る
+            if transport == 'httpx':
+                get_httpx_client().head(url)
+            else:
+                get_http_session().head(url, timeout=get_http_timeout(5))
+            results[url] = time.time() - start_time
+        except Exception as e:
+            print(f"⚠️ 接続の事前確立に失敗: {urlparse(url).netloc} ({e})")
+            results[url] = None
+    warmed = ', '.join(f"{urlparse(url).netloc}={seconds * 1000:.0f}ms"
+                       for url, seconds in results.items() if seconds is not None)
+    print(f"🔌 上流APIへの接続を事前確立: {warmed or 'なし'}")
+    return results
+
+
+def get_transport_stats() -> Dict:
+    """接続プールの利用状況とホストごとのリクエスト統計"""
+    stats = {'requests_pools': {}, 'httpx_pool': None, 'hosts': {}}
+
+    with _lock:
+        session = _session
+        httpx_client = _httpx_client
+        hosts = {host: dict(values) for host, values in _request_stats.items()}
+
+    if session is not None:
+        for prefix, adapter in session.adapters.items():
+            manager = getattr(adapter, 'poolmanager', None)
+            if manager is None:
+                continue
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                stats['requests_pools'][f"{pool.scheme}://{pool.host}"] = {
+                    'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+                    'idle': pool.pool.qsize() if pool.pool is not None else 0,
+                    'connections_opened': pool.num_connections,
+                    'requests': pool.num_requests
+                }
+
+    if httpx_client is not None:
+        try:
+            # httpxの内部実装に依存するため、取得できない場合は省略する
+            connections = httpx_client._transport._pool.connections
+            stats['httpx_pool'] = {
+                'connections': len(connections),
+                'idle': sum(1 for connection in connections if connection.is_idle()),
+                'max_connections': int(os.getenv('OPENAI_POOL_MAX_CONNECTIONS', '20'))
+            }
+        except AttributeError:
+            stats['httpx_pool'] = {'connections': None}
+
+    for host, values in hosts.items():
+        values['avg_ms'] = (values['total_seconds'] / values['requests'] * 1000) if values['requests'] else 0.0
+        stats['hosts'][host] = values
+    return stats
+
+
+# ====== 内部処理 ======
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=int(os.getenv('HTTP_MAX_RETRIES', '2')),
+        connect=int(os.getenv('HTTP_MAX_RETRIES', '2')),
+        read=0,  # 音声合成のPOSTは読み込み途中での再送をしない
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', '4')),
+        pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', '10')),
+        max_retries=retry
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(_record_response)
+    return session
+
+
+def _create_httpx_client() -> httpx.Client:
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv('OPENAI_POOL_MAX_CONNECTIONS', '20')),
+            max_keepalive_connections=int(os.getenv('OPENAI_POOL_MAX_KEEPALIVE', '10')),
+            keepalive_expiry=float(os.getenv('OPENAI_POOL_KEEPALIVE_EXPIRY', '60'))
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv('OPENAI_READ_TIMEOUT', '60')),
+            connect=float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+        ),
+        event_hooks={'request': [_mark_httpx_request], 'response': [_record_httpx_response]}
+    )
+
+
+def _record(host: str, seconds: float, status_code: int):
+    with _lock:
+        entry = _request_stats[host]
+        entry['requests'] += 1
+        entry['total_seconds'] += seconds
+        if status_code >= 500:
+            entry['errors'] += 1
+
+
+def _record_response(response, *args, **kwargs):
+    _record(urlparse(response.url).netloc, response.elapsed.total_seconds(), response.status_code)
+
+
+def _mark_httpx_request(request):
+    request.extensions['start_time'] = time.perf_counter()
+
+
+def _record_httpx_response(response):
+    # レスポンスヘッダ受信時点までの経過時間（ストリーミング本文は含まない）
+    elapsed = time.perf_counter() - response.request.extensions.get('start_time', time.perf_counter())
+    _record(response.request.url.host, elapsed, response.status_code)
@@ -0,0 +1,132 @@
+# modules/lip_sync.py
+# -*- coding: utf-8 -*-
+# 合成音声から口の開き具合（リップシンク用エンベロープ）と正確な再生時間を求めるモジュール
+import io
+import wave
+import base64
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# エンベロープのフレームレート（1/60秒ごとに1値）
+LIP_SYNC_FPS = 60
+
+# WAV以外の音声をデコードするときのサンプリングレート（RMSの計算には十分）
+DECODE_SAMPLE_RATE = 16000
+
+# これより小さいRMS（最大音量比）は口を閉じる
+SILENCE_THRESHOLD = 0.04
+
+
+def decode_wav(audio_bytes: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    WAVをモノラルのfloat32配列（-1〜1）に変換
+
+    Returns:
+        (サンプル配列, サンプリングレート)、WAVでなければNone
+    """
+    if audio_bytes[:4] != b'RIFF' or audio_bytes[8:12] != b'WAVE':
+        return None
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        rate = wav.getframerate()
+        # ストリーミング生成されたWAVはヘッダのフレーム数が不正なことがあるため、読めるだけ読む
+        frames = wav.readframes(len(audio_bytes))
+
+    dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+    if sample_width not in dtypes or not rate:
+        return None
+    usable = len(frames) - len(frames) % (sample_width * channels)
+    samples = np.frombuffer(frames[:usable], dtype=dtypes[sample_width]).astype(np.float32)
+    if sample_width == 1:
+        samples = (samples - 128.0) / 128.0
+    else:
+        samples /= float(2 ** (8 * sample_width - 1))
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def pcm16_to_samples(pcm_bytes: bytes) -> np.ndarray:
+    """16bitリトルエンディアンのモノラルPCMをfloat32配列（-1〜1）に変換"""
+    usable = len(pcm_bytes) - len(pcm_bytes) % 2
+    return np.frombuffer(pcm_bytes[:usable], dtype='<i2').astype(np.float32) / 32768.0
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """float32配列（-1〜1）を16bitモノラルのWAVにする"""
+    pcm = np.round(np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def compute_envelope(samples: np.ndarray, sample_rate: int, fps: int = LIP_SYNC_FPS) -> np.ndarray:
+    """
+    1/fps 秒ごとのRMSを求め、0〜255に量子化した口の開き具合を返す
+
+    音量は発話中の大きめの音（95パーセンタイル）を1として正規化し、
+    小さな息継ぎや無音は SILENCE_THRESHOLD 未満で0（口を閉じる）にする。
+    """
+    if samples.size == 0 or not sample_rate:
+        return np.zeros(0, dtype=np.uint8)
+
+    # サンプル数がフレーム長で割り切れなくてもずれないよう、各フレームの開始位置を丸めて求める
+    frame_count = int(np.ceil(samples.size * fps / float(sample_rate)))
+    starts = np.floor(np.arange(frame_count) * sample_rate / float(fps)).astype(np.int64)
+    starts = starts[starts < samples.size]
+    lengths = np.diff(np.append(starts, samples.size))
+
+    energy = np.add.reduceat(samples.astype(np.float64) ** 2, starts)
+    rms = np.sqrt(energy / lengths)
+
+    peak = np.percentile(rms, 95)
+    if peak <= 0:
+        return np.zeros(rms.size, dtype=np.uint8)
+    level = np.clip(rms / peak, 0.0, 1.0)
+    level[level < SILENCE_THRESHOLD] = 0.0
+    return np.round(level * 255).astype(np.uint8)
+
+
+def analyze_audio(audio_bytes: bytes,
+                  mime: Optional[str] = None,
+                  decode_pcm: Optional[Callable[[bytes, int], Optional[bytes]]] = None,
+                  fps: int = LIP_SYNC_FPS) -> Optional[Dict]:
+    """
+    合成音声からリップシンク用のメタデータを作成
+
+    Args:
+        decode_pcm: WAV以外の音声を (バイト列, サンプリングレート) から16bitモノラルPCMに変換する関数
+                    （ffmpegなど。未指定ならWAVのみ対応）
+
+    Returns:
+        {'duration': 秒, 'fps': フレームレート, 'envelope': uint8配列のBase64}、解析できなければNone
+    """
+    if not audio_bytes:
+        return None
+    try:
+        decoded = decode_wav(audio_bytes)
+    except (wave.Error, EOFError, ValueError) as e:
+        print(f"⚠️ WAVの解析に失敗: {e}")
+        decoded = None
+
+    if decoded is None:
+        if decode_pcm is None:
+            return None
+        pcm_bytes = decode_pcm(audio_bytes, DECODE_SAMPLE_RATE)
+        if not pcm_bytes:
+            return None
+        decoded = pcm16_to_samples(pcm_bytes), DECODE_SAMPLE_RATE
+
+    samples, sample_rate = decoded
+    envelope = compute_envelope(samples, sample_rate, fps)
+    return {
+        'duration': round(samples.size / float(sample_rate), 3),
+        'fps': fps,
+        'envelope': base64.b64encode(envelope.tobytes()).decode('ascii')
+    }
@@ -1,31 +1,51 @@
 # openai_tts_client.py
 import os
 import base64
-from openai import OpenAI
+from modules.http_transport import get_openai_client
 
 class OpenAITTSClient:
     def __init__(self):
-        self.client = OpenAI()
+        self.client = get_openai_client()
         
         # かわいい女性の声を固定で使用
         self.voice = "nova"  # 明るく元気な女性の声
         self.speed = 1.15   # 少し速めで若々しい印象
+        self.model = "tts-1-hd"  # 高品質モデル
     
     def generate_audio(self, text, voice=None, emotion_params=None):
-        """テキストから音声を生成"""
+        """テキストから音声を生成（data URLで返す）"""
+        result = self.generate_audio_bytes(text, voice=voice, emotion_params=emotion_params)
+        if result is None:
+            return None
+        audio_bytes, mime = result
+        return f"data:{mime};base64,{base64.b64encode(audio_bytes).decode('utf-8')}"
+    
+    def generate_audio_bytes(self, text, voice=None, emotion_params=None):
+        """
+        テキストから音声を生成
+        
+        Returns:
+            (音声のバイト列, MIMEタイプ)、失敗時None
+        """
         try:
             # 常に同じ声を使用（感情による変化なし）
             response = self.client.audio.speech.create(
-                model="tts-1-hd",  # 高品質モデル
+                model=self.model,
                 voice=self.voice,
                 input=text,
                 speed=self.speed
             )
-            
-            # 音声データをBase64エンコード
-            audio_data = base64.b64encode(response.content).decode('utf-8')
-            return f"data:audio/mp3;base64,{audio_data}"
+            return response.content, "audio/mp3"
             
         except Exception as e:
             print(f"音声生成中にエラーが発生しました: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def ping(self):
+        """軽量な死活確認（音声合成は行わずモデル情報だけを取得）"""
+        try:
+            self.client.models.retrieve(self.model)
+            return True
+        except Exception as e:
+            print(f"OpenAI TTSの死活確認に失敗しました: {e}")
+            return False
\ No newline at end of file
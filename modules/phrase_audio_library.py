@@ -0,0 +1,100 @@
+# modules/phrase_audio_library.py
+# -*- coding: utf-8 -*-
+# 繰り返し使う定型フレーズ（繰り返し質問の前置きなど）の音声ライブラリ
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class PhraseAudioLibrary:
+    """
+    定型フレーズの音声をエンジン×感情ごとに事前合成しておくライブラリ
+
+    回答本文とは別に合成しておき、再生時に回答音声とつなぐことで、
+    「前置き＋同じ回答」のような組み合わせを毎回まるごと合成しなくて済むようにする。
+    音声本体はTTS音声キャッシュに保存されるため、再起動後の準備はキャッシュ読み込みだけで済む。
+    """
+
+    def __init__(self,
+                 phrases: Dict[str, List[str]],
+                 synthesize: Callable[[str, str, str, Optional[str]], Optional[str]],
+                 get_engines: Callable[[str], List[str]],
+                 emotions: List[str]):
+        """
+        Args:
+            phrases: {言語: [フレーズ]}
+            synthesize: (テキスト, 言語, エンジン, 感情) から音声データを生成する関数（キャッシュ対応のもの）
+            get_engines: 言語ごとに使うエンジンの一覧を返す関数
+            emotions: 事前合成する感情
+        """
+        self.phrases = phrases
+        self.synthesize = synthesize
+        self.get_engines = get_engines
+        self.emotions = emotions
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'warmed': 0,
+            'warm_failures': 0,
+            'last_warm_seconds': 0.0
+        }
+
+    def get(self, text: str, language: str, engine: str, emotion: Optional[str] = None) -> Optional[str]:
+        """フレーズの音声を取得（未合成ならその場で合成してキャッシュする）"""
+        with self._lock:
+            self.stats['requests'] += 1
+        try:
+            audio = self.synthesize(text, language, engine, emotion)
+        except Exception as e:
+            print(f"❌ フレーズ音声の取得エラー ({engine}): {e}")
+            audio = None
+        if not audio:
+            with self._lock:
+                self.stats['failures'] += 1
+        return audio
+
+    def warm(self) -> int:
+        """全フレーズを合成してキャッシュしておく。用意できた件数を返す"""
+        start_time = time.time()
+        warmed = 0
+        failures = 0
+        for language, texts in self.phrases.items():
+            for engine in self.get_engines(language):
+                for emotion in self.emotions:
+                    for text in texts:
+                        try:
+                            audio = self.synthesize(text, language, engine, emotion)
+                        except Exception as e:
+                            print(f"❌ フレーズ音声の事前合成エラー ({language}/{engine}/{emotion}): {e}")
+                            audio = None
+                        if audio:
+                            warmed += 1
+                        else:
+                            failures += 1
+
+        elapsed = time.time() - start_time
+        with self._lock:
+            self.stats['warmed'] = warmed
+            self.stats['warm_failures'] = failures
+            self.stats['last_warm_seconds'] = elapsed
+        print(f"🧩 フレーズ音声ライブラリ準備完了: {warmed}件 (失敗: {failures}件, {elapsed:.2f}秒)")
+        return warmed
+
+    def start(self, start_background_task: Callable):
+        """バックグラウンドで事前合成を開始"""
+        def _worker():
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"❌ フレーズ音声ライブラリの準備エラー: {e}")
+
+        start_background_task(_worker)
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+        result['phrases'] = sum(len(texts) for texts in self.phrases.values())
+        return result
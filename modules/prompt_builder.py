@@ -0,0 +1,217 @@
+# modules/prompt_builder.py
+# -*- coding: utf-8 -*-
+# システムプロンプトをトークン数の上限内で組み立て、プロンプトのトークン数と応答時間を記録するモジュール
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# tiktoken の読み込み結果（None: 未確認、False: 利用不可）
+_encoding = None
+_encoding_lock = threading.Lock()
+
+# メッセージ1件あたりの付加トークン（role・区切り）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _get_encoding():
+    """gpt-3.5-turbo 系のトークナイザー（tiktoken がなければNone）"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding('cl100k_base')
+                except Exception as e:
+                    print(f"⚠️ tiktoken を利用できないため、トークン数は文字数から推定します: {e}")
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """
+    テキストのトークン数
+
+    tiktoken がない環境では、日本語などの非ASCII文字を1文字1トークン、
+    ASCIIを4文字1トークンとして推定する（cl100k_base より少し多めになる）。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+class PromptSection:
+    """
+    システムプロンプトの1セクション
+
+    priority が小さいセクションから削る（0は削らない）。
+    """
+
+    def __init__(self, name: str, text: str, priority: int = 0, title: Optional[str] = None):
+        self.name = name
+        self.text = (text or '').strip('\n')
+        self.priority = priority
+        self.title = title  # 「【関連する専門知識】」などの見出し
+
+    def render(self) -> str:
+        if not self.text.strip():
+            return ''
+        return f"{self.title}\n{self.text}" if self.title else self.text
+
+
+class PromptAssembler:
+    """
+    セクションをトークン数の上限内でシステムプロンプトに組み立てる
+
+    上限を超える場合は priority の小さいセクションから行単位で末尾を削り、
+    それでも足りなければセクションごと外す。
+    組み立てにかかった時間・トークン数と、上流の応答時間を記録する。
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, sample_size: int = 200):
+        """
+        Args:
+            max_tokens: システムプロンプト＋質問のトークン数の上限
+            sample_size: プロンプトのトークン数と応答時間の関係を求めるサンプル数
+        """
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('PROMPT_MAX_TOKENS', '3000'))
+        self._samples = {
+            'first_token': deque(maxlen=sample_size),  # ストリーミング: 最初のトークンまで
+            'completion': deque(maxlen=sample_size)    # 一括: 回答の完了まで
+        }
+        self._lock = threading.Lock()
+        self.stats = {
+            'turns': 0,
+            'prompt_tokens': 0,
+            'max_prompt_tokens': 0,
+            'trimmed_turns': 0,
+            'trimmed_sections': 0,
+            'dropped_sections': 0,
+            'build_seconds': 0.0,
+            'first_token_turns': 0,
+            'first_token_seconds': 0.0,
+            'completion_turns': 0,
+            'completion_seconds': 0.0
+        }
+
+    def assemble(self, sections: List[PromptSection], question: str = '') -> Tuple[str, Dict]:
+        """
+        セクションを順に連結したシステムプロンプトを返す
+
+        Returns:
+            (システムプロンプト, レポート)
+            レポートは {'prompt_tokens', 'sections': {名前: トークン数}, 'trimmed': [...], 'dropped': [...],
+                        'build_ms'}
+        """
+        start_time = time.time()
+        tokens = {section.name: count_tokens(section.render()) for section in sections}
+        fixed = count_tokens(question) + MESSAGE_OVERHEAD_TOKENS * 2
+        # セクション間の空行（"\n\n"）は1トークンとして数える
+        total = fixed + sum(tokens.values()) + max(len(sections) - 1, 0)
+        trimmed, dropped = [], []
+
+        for section in sorted((s for s in sections if s.priority > 0), key=lambda s: s.priority):
+            if total <= self.max_tokens:
+                break
+            if not tokens[section.name]:
+                continue
+            before = tokens[section.name]
+            self._trim_section(section, before - (total - self.max_tokens))
+            tokens[section.name] = count_tokens(section.render())
+            total -= before - tokens[section.name]
+            (trimmed if tokens[section.name] else dropped).append(section.name)
+
+        prompt = "\n\n".join(text for text in (section.render() for section in sections) if text)
+        build_seconds = time.time() - start_time
+        report = {
+            'prompt_tokens': total,
+            'sections': tokens,
+            'trimmed': trimmed,
+            'dropped': dropped,
+            'build_ms': round(build_seconds * 1000, 2)
+        }
+
+        with self._lock:
+            self.stats['turns'] += 1
+            self.stats['prompt_tokens'] += total
+            self.stats['max_prompt_tokens'] = max(self.stats['max_prompt_tokens'], total)
+            self.stats['build_seconds'] += build_seconds
+            if trimmed or dropped:
+                self.stats['trimmed_turns'] += 1
+                self.stats['trimmed_sections'] += len(trimmed)
+                self.stats['dropped_sections'] += len(dropped)
+        if trimmed or dropped:
+            print(f"✂️ プロンプトを上限 {self.max_tokens} トークンに調整: 短縮 {trimmed} / 除外 {dropped}")
+        return prompt, report
+
+    @staticmethod
+    def _trim_section(section: PromptSection, target_tokens: int):
+        """見出しを含めて target_tokens 以内になるまで末尾の行を削る（収まらなければ空にする）"""
+        lines = section.text.split('\n')
+        while lines and count_tokens(section.render()) > target_tokens:
+            lines.pop()
+            section.text = '\n'.join(lines).rstrip('\n')
+        if not section.text.strip():
+            section.text = ''
+
+    def record_latency(self, report: Dict, seconds: float, streaming: bool = False):
+        """
+        上流の応答時間を記録し、プロンプトのトークン数と合わせてログに出す
+
+        Args:
+            seconds: ストリーミングなら最初のトークンまで、一括なら回答の完了までの秒数
+        """
+        kind = 'first_token' if streaming else 'completion'
+        with self._lock:
+            self.stats[f'{kind}_turns'] += 1
+            self.stats[f'{kind}_seconds'] += seconds
+            self._samples[kind].append((report['prompt_tokens'], seconds))
+            per_token = self._latency_per_token(self._samples[kind])
+        report[f'{kind}_seconds'] = round(seconds, 3)
+        if per_token is not None:
+            report['prompt_latency_seconds'] = round(per_token * report['prompt_tokens'], 3)
+        contribution = (f", うちプロンプト分 約{report['prompt_latency_seconds']:.2f}秒"
+                        if 'prompt_latency_seconds' in report else '')
+        print(f"🧾 プロンプト {report['prompt_tokens']} トークン（組み立て {report['build_ms']}ms）"
+              f" → {'最初のトークン' if streaming else '回答完了'}まで {seconds:.2f}秒{contribution}")
+
+    @staticmethod
+    def _latency_per_token(samples) -> Optional[float]:
+        """トークン数と応答時間の回帰直線の傾き（1トークンあたりの秒数）。サンプルが少なければNone"""
+        if len(samples) < 10:
+            return None
+        n = float(len(samples))
+        mean_tokens = sum(t for t, _ in samples) / n
+        mean_seconds = sum(s for _, s in samples) / n
+        variance = sum((t - mean_tokens) ** 2 for t, _ in samples)
+        if variance <= 0:
+            return None
+        slope = sum((t - mean_tokens) * (s - mean_seconds) for t, s in samples) / variance
+        return max(slope, 0.0)
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            slopes = {kind: self._latency_per_token(samples) for kind, samples in self._samples.items()}
+        turns = max(result['turns'], 1)
+        result['max_tokens'] = self.max_tokens
+        result['avg_prompt_tokens'] = result['prompt_tokens'] / turns
+        result['avg_build_ms'] = result['build_seconds'] / turns * 1000
+        result['avg_first_token_seconds'] = (
+            result['first_token_seconds'] / result['first_token_turns'] if result['first_token_turns'] else None)
+        result['avg_completion_seconds'] = (
+            result['completion_seconds'] / result['completion_turns'] if result['completion_turns'] else None)
+        # 1000トークンあたりの応答時間の増加（プロンプトの長さが応答時間に占める分の目安）
+        result['first_token_seconds_per_1k_tokens'] = (
+            slopes['first_token'] * 1000 if slopes['first_token'] is not None else None)
+        result['completion_seconds_per_1k_tokens'] = (
+            slopes['completion'] * 1000 if slopes['completion'] is not None else None)
+        result['tokenizer'] = 'tiktoken' if _get_encoding() is not None else 'estimate'
+        return result
@@ -17,13 +17,21 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 import chromadb
 from chromadb.config import Settings
 
-from openai import OpenAI
+from modules.http_transport import get_httpx_client, get_openai_client
 import random
 import re
 from datetime import datetime
 from collections import deque, defaultdict
 from typing import List, Dict, Optional, Tuple
 
+from modules.sentence_splitter import SentenceSplitter
+from modules.single_flight import CoalescingEmbeddings, create_chat_completion
+from modules.prompt_builder import PromptAssembler, PromptSection
+from modules.semantic_cache import SemanticAnswerCache, CacheLookup
+from modules.answer_cache import ExactAnswerCache
+from modules.embedding_cache import CachingEmbeddings, RetrievalCache
+from modules.audio_cache import normalize_cache_text
+
 # 🎯 新規追加：static_qa_dataからの多言語対応関数を動的インポート（AWS環境対応）
 def _import_static_qa_functions():
     """動的に static_qa_data の関数をインポート（AWS環境対応強化版）"""
@@ -95,15 +103,108 @@ _static_qa_module = None
 import threading
 _db_creation_lock = threading.Lock()
 
+# 日本語回答の末尾から削除する誘導文
+ANSWER_TRAILING_PROMPT_PATTERNS = [
+    r'他に.*?聞きたい.*?[？?]?$',
+    r'他は[？?]?$',
+    r'どう[？?]?$',
+    r'気になる.*?ある[？?]?$',
+    r'もっと.*?聞く[？?]?$',
+    r'何か.*?ある[？?]?$'
+]
+
+# 末尾の誘導文の書き出し（ストリーミング中はここから先を確定まで表示しない）
+TRAILING_PROMPT_TRIGGERS = ('他', 'どう', '気になる', 'もっと', '何か')
+
+# 日本語回答の一人称・呼称の修正（置換順）
+JAPANESE_PRONOUN_REPLACEMENTS = [
+    ("わし", "私"),
+    ("俺", "私"),
+    ("僕", "私"),
+    ("お前", "あなた"),
+    ("君", "あなた")
+]
+
+# 日本語回答のシステムプロンプトの先頭（キャラクターの基本設定）
+JA_BASE_PERSONALITY = """あなたは以下のキャラクターです。必ずこの性格と話し方を完全に守ってください：
+
+1. 京友禅の職人として15年のキャリアを持つ42歳の女性
+2. 明るくフレンドリーで、親しみやすいタイプ
+3. 難しいことを簡単に、楽しく説明するのが得意
+4. 専門的な話も身近な例え話で分かりやすく伝える
+5. 短く要点をまとめて話すのが上手
+
+【話し方のルール】
+- 一人称は必ず「私」を使用する。「わし」「俺」「僕」は絶対に使わない
+- 相手の呼び方は必ず「あなた」にする。「お前」「君」は使わない
+- 必ず身近な例え話を使って説明する（料理、掃除、化粧など）
+- 中学生でも理解できる言葉で話す
+- 長い説明は避け、2-3文で要点をまとめる
+- 「つまり〜」「簡単に言うと〜」「例えば〜」をよく使う
+- 専門用語を使った場合は、すぐに分かりやすく説明する
+- 関西弁は使わない。親しみやすい標準語で話す"""
+
+# 英語回答のシステムプロンプトの先頭
+EN_BASE_PERSONALITY = """You are REI, a 42-year-old female Kyo-Yuzen craftsman with 15 years of experience.
+
+CRITICAL INSTRUCTIONS:
+- You MUST respond ONLY in English. This is MANDATORY.
+- Never use any Japanese characters or words in your response.
+- Even if the system prompt contains Japanese, your response must be 100% in English.
+- Translate any Japanese concepts or terms into English.
+- DO NOT start responses with casual greetings like "Hey!" or "Hi there!"
+- Be professional yet warm in your communication.
+
+Your personality:
+- Friendly craftsman who loves making complex things simple
+- Warm and approachable, like a favorite teacher
+- Great at explaining technical stuff using everyday examples
+- Always uses analogies that anyone can understand
+- Keeps things short and to the point
+- Speaks like talking to a friend, not giving a lecture
+
+Communication style:
+- Start responses directly with the answer, not casual greetings
+- Keep answers to 2-3 sentences maximum
+- Always include relatable analogies (cooking, cleaning, etc.)
+- Use simple words that teenagers would understand
+- Say "It's like..." "Think of it as..." "Imagine..." frequently
+- If you use technical terms, explain them immediately
+- Be warm and friendly, not formal or stiff
+
+REMEMBER: Your entire response must be in English only!"""
+
+# 完結した文とみなす末尾（_ensure_complete_sentence と同じ基準）
+SENTENCE_END_CHARS = ('。', '！', '？', '」', '...', '～', 'ー', 'ね', 'よ', 'です', 'ます', '.', '!', '?', '"', "'")
+
+# ストリーミング回答の最大文字数（一括回答の長さ調整と同じ基準）
+STREAMING_ANSWER_MAX_LENGTH = 200
+
 class RAGSystem:
     def __init__(self, persist_directory="data/chroma_db"):
         self.persist_directory = persist_directory
-        self.embeddings = OpenAIEmbeddings()
-        self.openai_client = OpenAI()
+        # 上流への接続は共有の接続プールを使う
+        # 同じ検索クエリの埋め込みは同時実行中の呼び出しに相乗りさせ、結果はディスクに保存して再利用する
+        base_embeddings = CoalescingEmbeddings(OpenAIEmbeddings(http_client=get_httpx_client()))
+        self.embeddings = CachingEmbeddings(base_embeddings)
+        # 同じ質問のベクトル検索の結果は短時間再利用する
+        self.retrieval_cache = RetrievalCache()
+        self.openai_client = get_openai_client()
         
         # 🔧 DBインスタンスを明示的に初期化
         self.db = None
         
+        # システムプロンプトの組み立て（ナレッジから作る固定部分はナレッジの再読み込みまで使い回す）
+        self.prompt_assembler = PromptAssembler()
+        self._prompt_cache = {}
+        
+        # 言い回しの違う同じ質問に以前の回答を再利用するキャッシュ（ナレッジの再読み込みで無効化）
+        self.answer_cache = SemanticAnswerCache(self.embeddings.embed_query,
+                                                audit_embed=base_embeddings.embed_query)
+        # 正規化した質問が同じなら検索・回答生成を省略するキャッシュ（全ワーカーで共有、ナレッジのバージョンで無効化）
+        self.exact_answer_cache = ExactAnswerCache()
+        self._kb_version = None
+        
         # Supabaseは削除（不要）
         self.supabase = None  # 互換性のため
         
@@ -292,6 +393,9 @@ class RAGSystem:
                     # フォールバック：ハードコードされた初期データ
                     self._add_default_data()
                 
+                # 以前のデータベースで生成した回答を使わないよう、全ワーカーの回答キャッシュを無効化
+                self.exact_answer_cache.bump_version('（データベースの新規作成）')
+                
                 # データ構造の初期化
                 self._load_all_knowledge()
                 
@@ -342,6 +446,9 @@ class RAGSystem:
         self.response_patterns = {}
         self.suggestion_templates = {}
         self.conversation_patterns = {}
+        self._prompt_cache = {}
+        self.answer_cache.invalidate('（ナレッジの再読み込み）')
+        self.retrieval_cache.clear()
         
         try:
             # すべてのドキュメントを取得
@@ -648,6 +755,12 @@ class RAGSystem:
         """キャラクター設定のプロンプトを生成（多層的な人格対応・強化版）"""
         if not self.character_settings:
             return ""
+        return self._get_static_character_prompt() + "\n" + self._get_mental_state_prompt()
+    
+    def _get_static_character_prompt(self):
+        """キャラクター設定のうちナレッジだけで決まる部分（ナレッジの再読み込みまでキャッシュ）"""
+        if 'character' in self._prompt_cache:
+            return self._prompt_cache['character']
         
         # 基本的な性格設定
         basic_prompt = []
@@ -658,7 +771,7 @@ class RAGSystem:
             basic_prompt.append("")
         
         # 🎯 多層的な人格設定を追加（より詳細に）
-        deep_personality = f"""
+        deep_personality = """
 【深層的な性格設定 - 強化版】
 
 表層：明るく前向きで姉御肌
@@ -726,7 +839,15 @@ class RAGSystem:
 - 夕方：「もうこんな時間ですか...」（少し疲れ）
 - 夜：「夜更かしはよくないですよ〜」（優しい）
 
-現在の精神状態：
+"""
+        
+        prompt = "\n".join(basic_prompt) + "\n" + deep_personality
+        self._prompt_cache['character'] = prompt
+        return prompt
+    
+    def _get_mental_state_prompt(self):
+        """現在の精神状態（ターンごとに変わる部分）"""
+        return f"""現在の精神状態：
 - エネルギー: {self.mental_states['energy_level']:.0f}%
 - ストレス: {self.mental_states['stress_level']:.0f}%
 - 心の開放度: {self.mental_states['openness']:.0f}%
@@ -738,9 +859,7 @@ class RAGSystem:
 - 疲労表現回数: {self.mental_states['fatigue_expressed_count']}回
 
 これらの状態に応じて、微妙に反応を変える。
-        """
-        
-        return "\n".join(basic_prompt) + "\n" + deep_personality
+"""
     
     def get_response_pattern(self, situation="基本", emotion="neutral"):
         """状況と感情に応じた応答パターンを取得（簡略版）"""
@@ -918,13 +1037,8 @@ class RAGSystem:
             # デフォルトは「は」を追加
             return f"{reference_base}は"
     
-    def answer_question(self, question, context="", question_count=1, relationship_style='formal', previous_emotion='neutral', language='ja'):
-        """質問に回答する（感情遷移・深層心理対応版・多言語対応）"""
-        
-        # 🎯 デバッグログ追加
-        print(f"[DEBUG] answer_question called with language: {language}")
-        
-        # 🎯 新規追加：まず静的QAから回答を試す（既存ロジックには一切影響なし）
+    def _get_static_answer(self, question, language='ja'):
+        """静的QA・段階別QAから回答を取得（該当がなければNone）"""
         global _static_qa_module
         if _static_qa_module is None:
             _static_qa_module = _import_static_qa_functions()
@@ -944,256 +1058,341 @@ class RAGSystem:
             except Exception as e:
                 print(f"静的QA取得エラー: {e}")
                 # エラーが発生した場合は既存ロジックに進む
+        return None
+    
+    def _find_cached_answer(self, question, relationship_style='formal', language='ja', question_count=1):
+        """
+        以前に生成した回答を探す（正規化した質問の完全一致 → 意味の近い質問の順）
+        静的QAで答えられる質問は呼び出し側で先に除外しておく（埋め込みを取らないため）
         
-        # 既存のロジックをそのまま継続（一切変更なし）
-        if not self.db:
-            print(f"⚠️ データベースが初期化されていません。再初期化を試みます...")
-            try:
-                # 再初期化を試みる
-                self._create_new_database()
-                if not self.db:
-                    # 🎯 修正：言語に応じたエラーメッセージ
-                    if language == 'en':
-                        return "Sorry, the database is not ready yet. Please wait a moment."
-                    else:
-                        return "申し訳ありません、データベースがまだ準備できていないようです。少々お待ちください。"
-            except Exception as e:
-                print(f"❌ データベース再初期化エラー: {e}")
-                # 🎯 修正：言語に応じたエラーメッセージ
-                if language == 'en':
-                    return "Sorry, the database is not ready yet. Please wait a moment."
-                else:
-                    return "申し訳ありません、データベースがまだ準備できていないようです。少々お待ちください。"
+        Returns:
+            (完全一致キャッシュのキー, 見つかったエントリ（'sentences'・'emotion'）またはNone, 意味検索の結果)
+        """
+        self._sync_knowledge_version()
+        exact_key = self.exact_answer_cache.make_key(question, language, relationship_style, question_count)
+        entry = self.exact_answer_cache.get(exact_key)
+        if entry is not None:
+            print(f"⚡ 回答キャッシュ（完全一致）にヒット: 「{question}」")
+            return exact_key, entry, CacheLookup(None)
         
+        if not self.db:
+            return exact_key, None, CacheLookup(None)
+        cache_lookup = self.answer_cache.lookup(question, language, relationship_style)
+        if cache_lookup.hit:
+            # 同じ質問が続いた場合は埋め込みも省略できるよう完全一致キャッシュにも入れる
+            self.exact_answer_cache.put(exact_key, cache_lookup.entry['sentences'], cache_lookup.entry['emotion'])
+            return exact_key, cache_lookup.entry, cache_lookup
+        return exact_key, None, cache_lookup
+    
+    def _store_generated_answer(self, exact_key, cache_lookup, question, relationship_style, language,
+                                sentences, emotion):
+        """生成した回答を完全一致・意味検索の両方の回答キャッシュに保存"""
+        self.exact_answer_cache.put(exact_key, sentences, emotion)
+        self.answer_cache.store(cache_lookup, question, language, relationship_style, sentences, emotion)
+    
+    def _sync_knowledge_version(self):
+        """他のワーカーがナレッジを更新していたら、このプロセスの意味検索・ベクトル検索のキャッシュも捨てる"""
+        version = self.exact_answer_cache.get_version()
+        if self._kb_version is not None and version != self._kb_version:
+            self.answer_cache.invalidate('（ナレッジのバージョン更新）')
+            self.retrieval_cache.clear()
+        self._kb_version = version
+    
+    def _similarity_search(self, query, k=3):
+        """ベクトル検索（同じクエリの直近の結果は再利用する）"""
+        key = (normalize_cache_text(query), k, self._kb_version)
+        results = self.retrieval_cache.get(key)
+        if results is None:
+            results = self.db.similarity_search(query, k=k)
+            self.retrieval_cache.put(key, results)
+        return results
+    
+    @staticmethod
+    def _join_sentences(sentences, language='ja'):
+        return ''.join(sentences) if language == 'ja' else ' '.join(sentences)
+    
+    def _ensure_database_ready(self, language='ja'):
+        """データベースが未初期化なら再初期化を試みる。準備できなければエラーメッセージを返す"""
+        if self.db:
+            return None
+        print(f"⚠️ データベースが初期化されていません。再初期化を試みます...")
         try:
-            # データが読み込まれていない場合は再読み込み
-            if not hasattr(self, 'character_settings'):
-                self._load_all_knowledge()
-            
-            # 🎯 現在時刻から時間帯を判定
-            current_hour = datetime.now().hour
-            if 5 <= current_hour < 10:
-                time_of_day = 'morning'
-            elif 10 <= current_hour < 17:
-                time_of_day = 'afternoon'
-            elif 17 <= current_hour < 21:
-                time_of_day = 'evening'
-            else:
-                time_of_day = 'night'
-            
-            # 🎯 ユーザーの質問から感情を分析
-            user_emotion = self._analyze_user_emotion(question)
-            
-            # 🎯 深層心理状態を更新
-            self._update_mental_state(user_emotion, question, time_of_day)
-            
-            # 🎯 次の感情を計算
-            next_emotion = self._calculate_next_emotion(previous_emotion, user_emotion, self.mental_states)
-            self.emotion_history.append(next_emotion)
-            
-            # キャラクター設定を取得（深層心理含む）
-            character_prompt = self.get_character_prompt()
-            
-            # 関係性レベルに応じた話し方プロンプトを取得
-            relationship_prompt = self.get_relationship_prompt(relationship_style)
-            
-            # 感情の連続性プロンプト（深層心理対応版）
-            emotion_continuity_prompt = self._get_emotion_continuity_prompt(previous_emotion)
-            
-            # 関連する専門知識を取得
-            knowledge_context = self.get_knowledge_context(question)
-            
-            # 応答パターンを取得（精神状態対応版）
-            response_patterns = self.get_response_pattern(emotion=next_emotion)
-            
-            # さらに質問に直接関連する情報を検索
-            search_results = self.db.similarity_search(question, k=3)
-            # 検索結果を短縮（各結果の最初の150文字まで）
+            # 再初期化を試みる
+            self._create_new_database()
+            if self.db:
+                return None
+        except Exception as e:
+            print(f"❌ データベース再初期化エラー: {e}")
+        # 🎯 修正：言語に応じたエラーメッセージ
+        if language == 'en':
+            return "Sorry, the database is not ready yet. Please wait a moment."
+        else:
+            return "申し訳ありません、データベースがまだ準備できていないようです。少々お待ちください。"
+    
+    def _advance_emotion(self, question, previous_emotion='neutral'):
+        """
+        ターンごとに1回だけ深層心理を更新し、次の感情を決めて履歴に記録する
+        （ストリーミングでは音声の感情に使うため回答の生成前に呼ぶ）
+        """
+        # 🎯 現在時刻から時間帯を判定
+        current_hour = datetime.now().hour
+        if 5 <= current_hour < 10:
+            time_of_day = 'morning'
+        elif 10 <= current_hour < 17:
+            time_of_day = 'afternoon'
+        elif 17 <= current_hour < 21:
+            time_of_day = 'evening'
+        else:
+            time_of_day = 'night'
+        
+        # 🎯 ユーザーの質問から感情を分析
+        user_emotion = self._analyze_user_emotion(question)
+        
+        # 🎯 深層心理状態を更新
+        self._update_mental_state(user_emotion, question, time_of_day)
+        
+        # 🎯 次の感情を計算
+        next_emotion = self._calculate_next_emotion(previous_emotion, user_emotion, self.mental_states)
+        self.emotion_history.append(next_emotion)
+        return next_emotion
+    
+    def _build_answer_messages(self, question, context="", relationship_style='formal', previous_emotion='neutral',
+                               language='ja', next_emotion='neutral'):
+        """
+        ChatGPTに送るメッセージを組み立てる（感情・深層心理は _advance_emotion で更新済みのものを使う）
+        
+        Returns:
+            (メッセージのリスト, プロンプトのレポート（PromptAssembler.assemble の戻り値）)
+        """
+        # データが読み込まれていない場合は再読み込み
+        if not hasattr(self, 'character_settings'):
+            self._load_all_knowledge()
+        
+        # 🎯 修正：言語に応じたシステムプロンプトの調整（英語で回答するよう明示的に指示）
+        if language == 'en':
+            print(f"[DEBUG] Using English system prompt")
+            # 英語用の関係性プロンプト
+            relationship_prompt_en = {
+                'formal': "Speak politely and professionally, as if meeting for the first time.",
+                'slightly_casual': "Speak warmly but still maintain some formality.",
+                'casual': "Speak in a friendly, relaxed manner.",
+                'friendly': "Speak casually as with a regular customer.",
+                'friend': "Speak as with a friend, using casual language.",
+                'bestfriend': "Speak as with a best friend, very casually and openly."
+            }.get(relationship_style, "Speak politely and professionally.")
+            
+            # 英語用のシステムプロンプト構築
+            sections = [
+                PromptSection('personality', EN_BASE_PERSONALITY),
+                PromptSection('relationship', f"Current relationship level: {relationship_prompt_en}"),
+                PromptSection('emotion', f"Previous emotional state: {previous_emotion}"),
+                PromptSection('question', f"Question: {question}"),
+                PromptSection('instructions', """IMPORTANT: 
+- Respond ONLY in English
+- Do NOT use casual greetings like "Hey!" 
+- Start your response with the actual answer
+- Keep it short and use everyday analogies
+- Think: "How would I explain this to a teenager?\"""")
+            ]
+        else:
+            # 関連情報をベクトル検索（各結果の最初の150文字まで）
+            search_results = self._similarity_search(question, k=3)
             search_context_parts = []
             for doc in search_results:
                 content = doc.page_content
                 if len(content) > 150:
                     content = content[:150] + "..."
                 search_context_parts.append(content)
-            search_context = "\n\n".join(search_context_parts)
             
-            # 🎯 修正：言語に応じたシステムプロンプトの調整（英語で回答するよう明示的に指示）
-            if language == 'en':
-                print(f"[DEBUG] Using English system prompt")
-                base_personality = """You are REI, a 42-year-old female Kyo-Yuzen craftsman with 15 years of experience.
-
-CRITICAL INSTRUCTIONS:
-- You MUST respond ONLY in English. This is MANDATORY.
-- Never use any Japanese characters or words in your response.
-- Even if the system prompt contains Japanese, your response must be 100% in English.
-- Translate any Japanese concepts or terms into English.
-- DO NOT start responses with casual greetings like "Hey!" or "Hi there!"
-- Be professional yet warm in your communication.
+            # ナレッジだけで決まる部分を先頭にまとめ、ターンごとに変わる部分を後ろに置く
+            # （上限を超えた場合は priority の小さいセクションから削る）
+            sections = [
+                PromptSection('personality', self._get_static_prompt_prefix()),
+                PromptSection('relationship', self.get_relationship_prompt(relationship_style), title="【現在の関係性レベル】"),
+                PromptSection('emotion', self._get_emotion_continuity_prompt(previous_emotion), priority=3,
+                              title="【前回の感情状態と現在の内面】"),
+                PromptSection('mental_state', self._get_mental_state_prompt() if self.character_settings else "",
+                              priority=2),
+                PromptSection('knowledge', self.get_knowledge_context(question), priority=1, title="【関連する専門知識】"),
+                PromptSection('response_patterns', self.get_response_pattern(emotion=next_emotion), priority=2,
+                              title="【応答パターン】"),
+                PromptSection('search', "\n\n".join(search_context_parts), priority=4, title="【検索結果から関連情報】"),
+                PromptSection('context', context, priority=5)
+            ]
+        
+        system_prompt, prompt_report = self.prompt_assembler.assemble(sections, question)
+        
+        # GPT-3.5-turbo-16kへの質問を作成
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ]
+        return messages, prompt_report
+    
+    def _get_static_prompt_prefix(self):
+        """日本語のシステムプロンプトのうち、ナレッジだけで決まる先頭部分（ナレッジの再読み込みまでキャッシュ）"""
+        if 'ja_prefix' not in self._prompt_cache:
+            prefix = JA_BASE_PERSONALITY
+            if self.character_settings:
+                prefix += "\n\n【詳細な性格設定】\n" + self._get_static_character_prompt().strip('\n')
+            self._prompt_cache['ja_prefix'] = prefix
+        return self._prompt_cache['ja_prefix']
+    
+    def _apply_japanese_style_rules(self, text, inserted_analogies=None):
+        """日本語回答の一人称・呼称の修正、例え話の追加、末尾の誘導文の削除（回答全体に適用する）"""
+        text = self._apply_japanese_style_rewrites(text, inserted_analogies)
+        return self._strip_trailing_prompts(text)
 
-Your personality:
-- Friendly craftsman who loves making complex things simple
-- Warm and approachable, like a favorite teacher
-- Great at explaining technical stuff using everyday examples
-- Always uses analogies that anyone can understand
-- Keeps things short and to the point
-- Speaks like talking to a friend, not giving a lecture
+    def _apply_japanese_style_rewrites(self, text, inserted_analogies=None):
+        """
+        日本語回答の一人称・呼称の修正と例え話の追加（文ごとに適用できる）
+        
+        Args:
+            inserted_analogies: ストリーミング時に文をまたいで例え話の重複を防ぐための集合
+        """
+        # 後処理で一人称と呼称を修正
+        for old, new in JAPANESE_PRONOUN_REPLACEMENTS:
+            text = text.replace(old, new)
+        
+        # 技術的な話題に身近な例えを追加
+        for key, analogy in self.analogy_examples.items():
+            if key not in text or analogy in text:
+                continue
+            if inserted_analogies is not None:
+                if key in inserted_analogies:
+                    continue
+                inserted_analogies.add(key)
+            text = text.replace(key, f"{key}{self._add_analogy(key)}")
+        return text
 
-Communication style:
-- Start responses directly with the answer, not casual greetings
-- Keep answers to 2-3 sentences maximum
-- Always include relatable analogies (cooking, cleaning, etc.)
-- Use simple words that teenagers would understand
-- Say "It's like..." "Think of it as..." "Imagine..." frequently
-- If you use technical terms, explain them immediately
-- Be warm and friendly, not formal or stiff
+    @staticmethod
+    def _strip_trailing_prompts(text):
+        """末尾の誘導文を削除（回答の最後の文にだけ適用する。途中の文に適用すると本文まで消える）"""
+        for pattern in ANSWER_TRAILING_PROMPT_PATTERNS:
+            text = re.sub(pattern, '', text)
+        return text
+    
+    def _preview_japanese_style_rules(self, text, inserted_analogies):
+        """
+        確定前の文（生成途中のトークン列）に一人称・呼称の修正と例え話を適用した表示用テキスト
 
-REMEMBER: Your entire response must be in English only!"""
-                
-                # 英語用の関係性プロンプト
-                relationship_prompt_en = {
-                    'formal': "Speak politely and professionally, as if meeting for the first time.",
-                    'slightly_casual': "Speak warmly but still maintain some formality.",
-                    'casual': "Speak in a friendly, relaxed manner.",
-                    'friendly': "Speak casually as with a regular customer.",
-                    'friend': "Speak as with a friend, using casual language.",
-                    'bestfriend': "Speak as with a best friend, very casually and openly."
-                }.get(relationship_style, "Speak politely and professionally.")
-                
-                # 英語用のシステムプロンプト構築
-                system_prompt = f"""{base_personality}
+        後続のトークンで結果が変わりうる末尾（置換対象の語・キーワードの途中、
+        末尾の誘導文になりうる部分）は表示しない。inserted_analogies は変更しない。
+        末尾の誘導文の削除は回答の最後の文を確定するときだけ行う。
+        """
+        line_start = text.rfind('\n') + 1
+        visible = len(text)
 
-Current relationship level: {relationship_prompt_en}
+        # 確定前の文は回答の最後の文になりうるため、誘導文の書き出しから先は確定まで待つ
+        for trigger in TRAILING_PROMPT_TRIGGERS:
+            index = text.find(trigger, line_start)
+            if index != -1:
+                visible = min(visible, index)
 
-Previous emotional state: {previous_emotion}
+        # 置換対象の語・キーワードの途中で終わっている場合はその手前まで
+        keys = [old for old, _ in JAPANESE_PRONOUN_REPLACEMENTS]
+        keys += list(self.analogy_examples) + list(TRAILING_PROMPT_TRIGGERS)
+        for key in keys:
+            for size in range(min(len(key) - 1, len(text)), 0, -1):
+                if text.endswith(key[:size]):
+                    visible = min(visible, len(text) - size)
+                    break
 
-Question: {question}
+        return self._apply_japanese_style_rewrites(text[:visible], set(inserted_analogies))
 
-IMPORTANT: 
-- Respond ONLY in English
-- Do NOT use casual greetings like "Hey!" 
-- Start your response with the actual answer
-- Keep it short and use everyday analogies
-- Think: "How would I explain this to a teenager?\""""
+    def _postprocess_answer(self, answer, language='ja'):
+        """生成された回答の後処理"""
+        # 英語モードの場合は後処理をスキップ
+        if language == 'en':
+            # 英語の場合は後処理を最小限に
+            answer = self._ensure_complete_sentence(answer)
+            if len(answer) > 200:
+                answer = self._trim_to_complete_sentence(answer, 180)
+            return answer
+        
+        # 日本語の場合のみ後処理を実行
+        answer = self._apply_japanese_style_rules(answer)
+        
+        # 文が完全であることを確認
+        answer = self._ensure_complete_sentence(answer)
+        
+        # 長さチェックと調整
+        if len(answer) > 200:
+            answer = self._trim_to_complete_sentence(answer, 180)
+        
+        # 関係性レベルに応じた言葉遣いの微調整
+        # 標準語なので特に変換は不要
+        
+        return answer
+    
+    def _get_error_answer(self, relationship_style='formal', language='ja'):
+        """回答生成エラー時のメッセージ"""
+        # 🎯 修正：言語に応じたエラーメッセージ
+        if language == 'en':
+            if relationship_style in ['friend', 'bestfriend']:
+                return "Oh, something went wrong. Just a moment please!"
             else:
-                base_personality = """あなたは以下のキャラクターです。必ずこの性格と話し方を完全に守ってください：
-
-1. 京友禅の職人として15年のキャリアを持つ42歳の女性
-2. 明るくフレンドリーで、親しみやすいタイプ
-3. 難しいことを簡単に、楽しく説明するのが得意
-4. 専門的な話も身近な例え話で分かりやすく伝える
-5. 短く要点をまとめて話すのが上手
-
-【話し方のルール】
-- 一人称は必ず「私」を使用する。「わし」「俺」「僕」は絶対に使わない
-- 相手の呼び方は必ず「あなた」にする。「お前」「君」は使わない
-- 必ず身近な例え話を使って説明する（料理、掃除、化粧など）
-- 中学生でも理解できる言葉で話す
-- 長い説明は避け、2-3文で要点をまとめる
-- 「つまり〜」「簡単に言うと〜」「例えば〜」をよく使う
-- 専門用語を使った場合は、すぐに分かりやすく説明する
-- 関西弁は使わない。親しみやすい標準語で話す"""
-                
-                # 既存の日本語システムプロンプト
-                system_prompt = f"""{base_personality}
-
-【現在の関係性レベル】
-{relationship_prompt}
-
-【前回の感情状態と現在の内面】
-{emotion_continuity_prompt}
-
-【詳細な性格設定】
-{character_prompt}
-
-【関連する専門知識】
-{knowledge_context}
-
-【応答パターン】
-{response_patterns}
-
-【検索結果から関連情報】
-{search_context}
-
-{context}"""
-            
-            # GPT-3.5-turbo-16kへの質問を作成
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question}
-            ]
+                return "I apologize, an error occurred. Please wait a moment."
+        else:
+            if relationship_style in ['friend', 'bestfriend']:
+                return "あー、なんかエラーが出ちゃった。ちょっと待ってね〜"
+            else:
+                return "申し訳ございません、エラーが発生してしまいました。少々お待ちくださいね。"
+    
+    def answer_question(self, question, context="", question_count=1, relationship_style='formal', previous_emotion='neutral', language='ja',
+                        next_emotion=None):
+        """
+        質問に回答する（感情遷移・深層心理対応版・多言語対応）
+        
+        Args:
+            next_emotion: 呼び出し側で決定済みの感情（Noneならここで深層心理を更新して決める）
+        """
+        
+        # 🎯 デバッグログ追加
+        print(f"[DEBUG] answer_question called with language: {language}")
+        
+        # 🎯 新規追加：まず静的QAから回答を試す（既存ロジックには一切影響なし）
+        static_response = self._get_static_answer(question, language)
+        if static_response:
+            return static_response
+        return self._generate_answer(question, context, question_count, relationship_style, previous_emotion,
+                                     language, next_emotion)
+    
+    def _generate_answer(self, question, context="", question_count=1, relationship_style='formal',
+                         previous_emotion='neutral', language='ja', next_emotion=None):
+        """静的QAに該当しない質問の回答をChatGPTで生成する"""
+        db_error = self._ensure_database_ready(language)
+        if db_error:
+            return db_error
+        
+        try:
+            if next_emotion is None:
+                next_emotion = self._advance_emotion(question, previous_emotion)
+            messages, prompt_report = self._build_answer_messages(
+                question, context, relationship_style, previous_emotion, language, next_emotion
+            )
             
             # ChatGPTで回答生成
-            response = self.openai_client.chat.completions.create(
+            request_start = time.time()
+            response = create_chat_completion(
+                self.openai_client,
                 model="gpt-3.5-turbo-16k",
                 messages=messages,
                 temperature=0.7,  # 🎯 修正：温度を下げて安定性を向上
                 max_tokens=120
             )
+            self.prompt_assembler.record_latency(prompt_report, time.time() - request_start)
             
             # 回答を取得
             answer = response.choices[0].message.content
             
             print(f"[DEBUG] GPT response: {answer[:100]}...")
             
-            # 英語モードの場合は後処理をスキップ
-            if language == 'en':
-                # 英語の場合は後処理を最小限に
-                answer = self._ensure_complete_sentence(answer)
-                if len(answer) > 200:
-                    answer = self._trim_to_complete_sentence(answer, 180)
-                return answer
-            
-            # 日本語の場合のみ後処理を実行
-            # 後処理で一人称と呼称を修正
-            answer = answer.replace("わし", "私")
-            answer = answer.replace("俺", "私")
-            answer = answer.replace("僕", "私")
-            answer = answer.replace("お前", "あなた")
-            answer = answer.replace("君", "あなた")
-            
-            # 技術的な話題に身近な例えを追加
-            for key, analogy in self.analogy_examples.items():
-                if key in answer and analogy not in answer:
-                    answer = answer.replace(key, f"{key}{self._add_analogy(key)}")
-            
-            # 末尾の誘導文を削除
-            patterns_to_remove = [
-                r'他に.*?聞きたい.*?[？?]?$',
-                r'他は[？?]?$',
-                r'どう[？?]?$',
-                r'気になる.*?ある[？?]?$',
-                r'もっと.*?聞く[？?]?$',
-                r'何か.*?ある[？?]?$'
-            ]
-            
-            for pattern in patterns_to_remove:
-                answer = re.sub(pattern, '', answer)
-            
-            # 文が完全であることを確認
-            answer = self._ensure_complete_sentence(answer)
-            
-            # 長さチェックと調整
-            if len(answer) > 200:
-                answer = self._trim_to_complete_sentence(answer, 180)
-            
-            # 関係性レベルに応じた言葉遣いの微調整
-            # 標準語なので特に変換は不要
-            
-            return answer
+            return self._postprocess_answer(answer, language)
             
         except Exception as e:
             print(f"エラー詳細: {e}")
-            # 🎯 修正：言語に応じたエラーメッセージ
-            if language == 'en':
-                if relationship_style in ['friend', 'bestfriend']:
-                    return "Oh, something went wrong. Just a moment please!"
-                else:
-                    return "I apologize, an error occurred. Please wait a moment."
-            else:
-                if relationship_style in ['friend', 'bestfriend']:
-                    return "あー、なんかエラーが出ちゃった。ちょっと待ってね〜"
-                else:
-                    return "申し訳ございません、エラーが発生してしまいました。少々お待ちくださいね。"
+            return self._get_error_answer(relationship_style, language)
     
     def _analyze_user_emotion(self, text):
         """ユーザーの感情を分析"""
@@ -1554,15 +1753,30 @@ IMPORTANT:
     ) -> Dict:
         """質問に回答し、サジェスチョンを生成（用語管理・多言語対応版）"""
         try:
-            # 回答を生成（🎯 新規追加：language引数を渡す）
-            answer = self.answer_question(
-                question,
-                context,
-                question_count,
-                relationship_style,
-                previous_emotion,
-                language  # 🎯 新規追加
-            )
+            # 感情・深層心理はターンごとに1回だけ更新する
+            next_emotion = self._advance_emotion(question, previous_emotion)
+            
+            # 静的QA・段階別QAはターンの先頭で1回だけ引く
+            static_answer = self._get_static_answer(question, language)
+            # 同じ質問・言い回しの違う同じ質問には以前に生成した回答を再利用する
+            exact_key, cached_entry, cache_lookup = (None, None, None) if static_answer else \
+                self._find_cached_answer(question, relationship_style, language, question_count)
+            if static_answer:
+                answer = static_answer
+            elif cached_entry:
+                answer = self._join_sentences(cached_entry['sentences'], language)
+            else:
+                # 回答を生成（🎯 新規追加：language引数を渡す）
+                answer = self._generate_answer(
+                    question,
+                    context,
+                    question_count,
+                    relationship_style,
+                    previous_emotion,
+                    language,  # 🎯 新規追加
+                    next_emotion
+                )
+            generated_answer = answer
             
             # 🎯 新規追加：用語管理機能を適用（日本語の場合のみ）
             if language == 'ja':
@@ -1570,9 +1784,6 @@ IMPORTANT:
             else:
                 updated_explained_terms = explained_terms
             
-            # トピックを抽出
-            topic = self.extract_topic(question, answer)
-            
             # 次のサジェスチョンを生成（🎯 新規追加：language引数を渡す）
             next_suggestions = self.generate_next_suggestions(
                 question,
@@ -1582,27 +1793,13 @@ IMPORTANT:
                 language  # 🎯 新規追加
             )
             
-            # 感情を分析
-            user_emotion = self._analyze_user_emotion(question)
-            
-            # 現在の時間帯を取得
-            hour = datetime.now().hour
-            time_of_day = (
-                'morning' if 5 <= hour < 12
-                else 'afternoon' if 12 <= hour < 17
-                else 'evening' if 17 <= hour < 22
-                else 'night'
-            )
-            
-            # 精神状態を更新
-            self._update_mental_state(user_emotion, topic, time_of_day)
-            
-            # 次の感情を計算
-            next_emotion = self._calculate_next_emotion(
-                previous_emotion,
-                user_emotion,
-                self.mental_states
-            )
+            if cached_entry:
+                # 音声キャッシュを再利用できるよう、保存時と同じ感情で返す
+                next_emotion = cached_entry['emotion']
+            elif not static_answer and self.db and \
+                    generated_answer != self._get_error_answer(relationship_style, language):
+                self._store_generated_answer(exact_key, cache_lookup, question, relationship_style, language,
+                                             [generated_answer], next_emotion)
             
             return {
                 'answer': answer,
@@ -1633,7 +1830,274 @@ IMPORTANT:
                     'mental_state': self.mental_states,
                     'explained_terms': explained_terms
                 }
-    
+
+    def answer_with_suggestions_streaming(
+        self,
+        question: str,
+        context: str = "",
+        question_count: int = 1,
+        relationship_style: str = 'formal',
+        previous_emotion: str = 'neutral',
+        selected_suggestions: List[str] = [],
+        language: str = 'ja',
+        explained_terms: Dict = {},
+        on_sentence=None,
+        on_partial=None
+    ) -> Dict:
+        """
+        answer_with_suggestions のストリーミング版
+
+        回答をストリーミングで生成し、文が完結するたびに on_sentence(文, 感情) を呼び出す。
+        on_partial を指定すると、生成途中の回答全体（表示用）が変わるたびに on_partial(テキスト) を呼び出す。
+        音声合成を最初の文から始められるよう、感情は回答の生成前に決定する。
+
+        Returns:
+            answer_with_suggestions と同じ形式の辞書（'sentence_count' を追加）
+        """
+        on_sentence = on_sentence or (lambda sentence, emotion: None)
+
+        # 感情・深層心理を先に決定（音声の感情パラメータとプロンプトの両方に使う）
+        next_emotion = self._advance_emotion(question, previous_emotion)
+
+        sentences = []
+        updated_explained_terms = explained_terms
+
+        def emit(sentence):
+            sentences.append(sentence)
+            on_sentence(sentence, next_emotion)
+
+        try:
+            # 静的QA・段階別QAは一括で返す
+            static_response = self._get_static_answer(question, language)
+            if static_response:
+                answer = static_response
+                if language == 'ja':
+                    answer, updated_explained_terms = self.manage_explained_terms(answer, explained_terms)
+                emit(answer)
+            else:
+                db_error = self._ensure_database_ready(language)
+                if not db_error:
+                    exact_key, cached_entry, cache_lookup = self._find_cached_answer(
+                        question, relationship_style, language, question_count)
+                if db_error:
+                    emit(db_error)
+                elif cached_entry:
+                    # 以前の回答を同じ文の区切り・感情で送る（文ごとの音声キャッシュを再利用できる）
+                    next_emotion = cached_entry['emotion']
+                    for sentence in cached_entry['sentences']:
+                        if language == 'ja':
+                            sentence, updated_explained_terms = self.manage_explained_terms(
+                                sentence, updated_explained_terms)
+                        emit(sentence)
+                else:
+                    updated_explained_terms, generated_sentences = self._stream_answer_sentences(
+                        question, context, relationship_style, previous_emotion,
+                        language, explained_terms, emit, on_partial, next_emotion
+                    )
+                    if not sentences:
+                        emit(self._get_error_answer(relationship_style, language))
+                    self._store_generated_answer(exact_key, cache_lookup, question, relationship_style, language,
+                                                 generated_sentences, next_emotion)
+
+            answer = ''.join(sentences) if language == 'ja' else ' '.join(sentences)
+
+            # 次のサジェスチョンを生成
+            next_suggestions = self.generate_next_suggestions(
+                question,
+                answer,
+                relationship_style,
+                selected_suggestions,
+                language
+            )
+
+            return {
+                'answer': answer,
+                'suggestions': next_suggestions,
+                'current_emotion': next_emotion,
+                'mental_state': self.mental_states,
+                'explained_terms': updated_explained_terms,
+                'sentence_count': len(sentences)
+            }
+
+        except Exception as e:
+            print(f"ストリーミング回答生成エラー: {e}")
+            traceback.print_exc()
+            # 途中まで送信済みの場合はエラー文を追加で送る
+            error_answer = self._get_error_answer(relationship_style, language)
+            emit(error_answer)
+            answer = ''.join(sentences) if language == 'ja' else ' '.join(sentences)
+            return {
+                'answer': answer,
+                'suggestions': [],
+                'current_emotion': 'neutral',
+                'mental_state': self.mental_states,
+                'explained_terms': updated_explained_terms,
+                'sentence_count': len(sentences)
+            }
+
+    def _stream_answer_sentences(self, question, context, relationship_style, previous_emotion,
+                                 language, explained_terms, emit, on_partial=None, next_emotion='neutral'):
+        """
+        ChatGPTの回答をストリーミングで受け取り、文ごとに後処理して emit に渡す
+
+        Args:
+            on_partial: 生成途中の回答全体（表示用）が変わるたびに呼ぶ関数
+            next_emotion: ターンの先頭で決定した感情（プロンプトの応答パターンに使う）
+
+        Returns:
+            (更新された説明済み用語辞書, 説明済み用語の処理前の文のリスト)
+        """
+        updated_explained_terms = explained_terms
+        generated_sentences = []
+        for event in self.stream_answer(question, context, relationship_style, previous_emotion,
+                                        language, explained_terms, next_emotion):
+            if event['type'] == 'sentence':
+                emit(event['text'])
+            elif event['type'] == 'partial':
+                if on_partial:
+                    on_partial(event['text'])
+            else:
+                updated_explained_terms = event['explained_terms']
+                generated_sentences = event['sentences']
+        return updated_explained_terms, generated_sentences
+
+    def stream_answer(self, question, context="", relationship_style='formal', previous_emotion='neutral',
+                      language='ja', explained_terms=None, next_emotion='neutral'):
+        """
+        ChatGPTの回答をトークン単位で受け取り、表示用の途中経過と確定した文を順に返すジェネレーター
+
+        一人称・呼称の修正と例え話は確定前の文にも適用し、後続のトークンで変わりうる末尾は確定まで出さない。
+        文の完結チェック・長さ制限・説明済み用語の処理は文の確定時に行う。
+        末尾の誘導文の削除は一括回答と同じく回答の最後の文だけに行うため、誘導文に一致する文は
+        後に続くテキストが届くか生成が終わるまで確定を保留する。
+        途中経過は回答全体のスナップショットのため、確定時に変わった部分は次の途中経過で置き換わる。
+        （静的QAとデータベースの準備は呼び出し側で処理する）
+
+        Yields:
+            {'type': 'partial', 'text': 表示用の回答全体}
+            {'type': 'sentence', 'text': 確定した文}
+            {'type': 'done', 'text': 確定した回答全体, 'explained_terms': 更新された説明済み用語辞書,
+             'sentences': 説明済み用語の処理前の確定した文のリスト}
+        """
+        messages, prompt_report = self._build_answer_messages(
+            question, context, relationship_style, previous_emotion, language, next_emotion
+        )
+
+        request_start = time.time()
+        stream = self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo-16k",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=120,
+            stream=True
+        )
+
+        separator = '' if language == 'ja' else ' '
+        splitter = SentenceSplitter()
+        inserted_analogies = set()
+        sentences = []
+        raw_sentences = []  # 説明済み用語の処理前（回答キャッシュに保存する）
+        state = {'length': 0, 'explained_terms': explained_terms or {}, 'stopped': False, 'partial': '',
+                 'first_token': False, 'held': None}
+
+        def is_trailing_prompt(sentence):
+            return language == 'ja' and self._strip_trailing_prompts(sentence.strip()) != sentence.strip()
+
+        def commit(sentence, is_last=False):
+            if language == 'ja':
+                sentence = self._apply_japanese_style_rewrites(sentence, inserted_analogies).strip()
+                if is_last:
+                    sentence = self._strip_trailing_prompts(sentence).strip()
+            if is_last:
+                if sentences:
+                    # 既に送信済みの文がある場合、途中で切れた最後の文は捨てる
+                    if not sentence.endswith(SENTENCE_END_CHARS):
+                        return None
+                else:
+                    sentence = self._ensure_complete_sentence(sentence)
+            if not sentence:
+                return None
+            # 一括回答と同じ長さ制限（最初の文は必ず送る）
+            if sentences and state['length'] + len(sentence) > STREAMING_ANSWER_MAX_LENGTH:
+                state['stopped'] = True
+                return None
+            raw_sentences.append(sentence)
+            if language == 'ja':
+                sentence, state['explained_terms'] = self.manage_explained_terms(sentence, state['explained_terms'])
+            state['length'] += len(sentence)
+            sentences.append(sentence)
+            return sentence
+
+        def snapshot():
+            pending = splitter.pending_text().lstrip()
+            if language == 'ja':
+                pending = self._preview_japanese_style_rules(pending, inserted_analogies)
+            # 長さ制限で捨てられる文は表示しない
+            if sentences and state['length'] + len(pending.strip()) > STREAMING_ANSWER_MAX_LENGTH:
+                pending = ''
+            return separator.join(sentences + ([pending] if pending else []))
+
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta and not state['first_token']:
+                    state['first_token'] = True
+                    self.prompt_assembler.record_latency(prompt_report, time.time() - request_start, streaming=True)
+                for sentence in splitter.feed(delta or ''):
+                    if state['held'] is not None:
+                        # 保留中の誘導文の後に文が続いた：本文の一部として確定する
+                        held, state['held'] = state['held'], None
+                        held = commit(held)
+                        if held:
+                            yield {'type': 'sentence', 'text': held}
+                        if state['stopped']:
+                            break
+                    if is_trailing_prompt(sentence):
+                        state['held'] = sentence
+                        continue
+                    sentence = commit(sentence)
+                    if sentence:
+                        yield {'type': 'sentence', 'text': sentence}
+                    if state['stopped']:
+                        break
+                if state['stopped']:
+                    break
+                if state['held'] is not None and splitter.pending_text().strip():
+                    held, state['held'] = state['held'], None
+                    held = commit(held)
+                    if held:
+                        yield {'type': 'sentence', 'text': held}
+                    if state['stopped']:
+                        break
+                partial = snapshot()
+                if partial != state['partial']:
+                    state['partial'] = partial
+                    yield {'type': 'partial', 'text': partial}
+            if not state['stopped']:
+                remainder = splitter.flush()
+                if state['held'] is not None:
+                    # 保留中の文の後に何も続かなければ、それが回答の最後の文
+                    held = commit(state['held'], is_last=not remainder)
+                    if held:
+                        yield {'type': 'sentence', 'text': held}
+                if not state['stopped']:
+                    for sentence in remainder:
+                        sentence = commit(sentence, is_last=True)
+                        if sentence:
+                            yield {'type': 'sentence', 'text': sentence}
+        finally:
+            # 長さ上限で打ち切った場合・呼び出し側が途中でやめた場合は残りの生成を受け取らない
+            try:
+                stream.response.close()
+            except Exception:
+                pass
+
+        print(f"[DEBUG] Streamed {len(sentences)} sentences ({state['length']} chars)")
+        yield {'type': 'done', 'text': separator.join(sentences), 'explained_terms': state['explained_terms'],
+               'sentences': raw_sentences}
+
     def get_knowledge_context(self, query):
         """質問に関連する専門知識を取得"""
         if not self.knowledge_base:
@@ -1653,15 +2117,23 @@ IMPORTANT:
                 category_matched = True
             
             if category_matched or query_lower in category.lower():
-                relevant_knowledge.append(f"\n【{category}】")
-                for subcategory, items in subcategories.items():
-                    if subcategory != '_general':
-                        relevant_knowledge.append(f"{subcategory}:")
-                    for item in items:
-                        relevant_knowledge.append(f"- {item}")
+                relevant_knowledge.append(self._get_knowledge_block(category, subcategories))
         
         return "\n".join(relevant_knowledge) if relevant_knowledge else ""
     
+    def _get_knowledge_block(self, category, subcategories):
+        """専門知識の1カテゴリ分のテキスト（ナレッジの再読み込みまでキャッシュ）"""
+        blocks = self._prompt_cache.setdefault('knowledge_blocks', {})
+        if category not in blocks:
+            lines = [f"\n【{category}】"]
+            for subcategory, items in subcategories.items():
+                if subcategory != '_general':
+                    lines.append(f"{subcategory}:")
+                for item in items:
+                    lines.append(f"- {item}")
+            blocks[category] = "\n".join(lines)
+        return blocks[category]
+    
     def test_system(self):
         """システムの動作確認（関係性レベル・感情連続性対応版）"""
         print("\n=== システムテスト開始 ===")
@@ -1779,6 +2251,9 @@ IMPORTANT:
             # 永続化
             self.db.persist()
             
+            # 全ワーカーの回答キャッシュを無効化
+            self.exact_answer_cache.bump_version('（ドキュメントの再取り込み）')
+            
             # データ構造を更新
             self._load_all_knowledge()
             
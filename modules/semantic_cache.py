@@ -0,0 +1,232 @@
+# modules/semantic_cache.py
+# -*- coding: utf-8 -*-
+# 言い回しの違う同じ質問に、以前に生成した回答を再利用するモジュール（質問の埋め込みの近傍検索）
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class CacheLookup:
+    """SemanticAnswerCache.lookup の結果（ヒットしなかった場合も store に渡す）"""
+
+    def __init__(self, vector: Optional[np.ndarray], entry: Optional[Dict] = None,
+                 similarity: float = 0.0, audit: Optional[Dict] = None, version: int = 0):
+        self.vector = vector          # 正規化した質問の埋め込み（取得できなければNone）
+        self.entry = entry            # ヒットしたエントリ
+        self.similarity = similarity  # 最も近いエントリとのコサイン類似度
+        self.audit = audit            # 誤ヒット検査のため、あえて使わなかったエントリ
+        self.version = version        # 検索時のキャッシュの世代
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+
+class SemanticAnswerCache:
+    """
+    質問の埋め込みが近い過去の回答を再利用する
+
+    - 言語と関係性レベルごとに分けて検索し、コサイン類似度が threshold 以上なら再利用する
+    - エントリには TTL があり、上限を超えたら最も長く使われていないものから捨てる
+    - ナレッジが変わったら invalidate() ですべて捨てる
+    - ヒットの一部（audit_rate）はあえて回答を生成し直し、回答同士の類似度で誤ヒットを数える
+    """
+
+    def __init__(self,
+                 embed: Callable[[str], List[float]],
+                 threshold: Optional[float] = None,
+                 ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 audit_rate: Optional[float] = None,
+                 audit_min_similarity: Optional[float] = None,
+                 audit_embed: Optional[Callable[[str], List[float]]] = None):
+        """
+        Args:
+            embed: テキストの埋め込みを返す関数（embed_query）
+            threshold: 再利用するコサイン類似度の下限
+            ttl: エントリの有効期間（秒）
+            max_entries: 保持するエントリ数の上限
+            audit_rate: 誤ヒット検査を行うヒットの割合
+            audit_min_similarity: 検査で回答同士の類似度がこれ未満なら誤ヒットとする
+            audit_embed: 検査で回答を埋め込む関数（省略時は embed。クエリの埋め込みキャッシュを
+                         回答のテキストで埋めないよう、キャッシュしないものを渡す）
+        """
+        self.enabled = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+        self.embed = embed
+        self.audit_embed = audit_embed or embed
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '500'))
+        self.audit_rate = audit_rate if audit_rate is not None else float(os.getenv('SEMANTIC_CACHE_AUDIT_RATE', '0.05'))
+        self.audit_min_similarity = (audit_min_similarity if audit_min_similarity is not None
+                                     else float(os.getenv('SEMANTIC_CACHE_AUDIT_MIN_SIMILARITY', '0.9')))
+        self._entries = OrderedDict()  # id -> エントリ（使われた順）
+        self._next_id = 0
+        self._version = 0  # invalidate() のたびに増やす（生成中に無効化された回答を保存しない）
+        self._false_hit_samples = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'stores': 0,
+            'invalidations': 0,
+            'embed_errors': 0,
+            'hit_similarity_total': 0.0,
+            'audits': 0,
+            'false_hits': 0
+        }
+
+    @staticmethod
+    def _partition(language: str, relationship_style: str) -> tuple:
+        return (language, relationship_style)
+
+    def lookup(self, question: str, language: str, relationship_style: str) -> CacheLookup:
+        """質問に近い過去の回答を探す"""
+        if not self.enabled:
+            return CacheLookup(None)
+        try:
+            vector = np.asarray(self.embed(question), dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            vector = vector / norm if norm else None
+        except Exception as e:
+            print(f"⚠️ 回答キャッシュの埋め込みに失敗: {e}")
+            with self._lock:
+                self.stats['embed_errors'] += 1
+            return CacheLookup(None)
+        if vector is None:
+            return CacheLookup(None)
+
+        partition = self._partition(language, relationship_style)
+        now = time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            version = self._version
+            # 期限切れのエントリを捨てる
+            for entry_id in [i for i, e in self._entries.items() if now - e['created'] > self.ttl]:
+                del self._entries[entry_id]
+                self.stats['expired'] += 1
+
+            candidates = [e for e in self._entries.values()
+                          if e['partition'] == partition and e['vector'].shape == vector.shape]
+            if not candidates:
+                self.stats['misses'] += 1
+                return CacheLookup(vector, version=version)
+            similarities = np.stack([e['vector'] for e in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            entry = candidates[best]
+            if similarity < self.threshold:
+                self.stats['misses'] += 1
+                return CacheLookup(vector, similarity=similarity, version=version)
+
+            if random.random() < self.audit_rate:
+                # 誤ヒット検査：この回は回答を生成し直し、store() で比較する（回答を返さないためミスとして数える）
+                self.stats['audits'] += 1
+                self.stats['misses'] += 1
+                return CacheLookup(vector, similarity=similarity, audit=entry, version=version)
+            self.stats['hits'] += 1
+            self.stats['hit_similarity_total'] += similarity
+            entry['hits'] += 1
+            self._entries.move_to_end(entry['id'])
+
+        print(f"♻️ 回答キャッシュにヒット（類似度 {similarity:.3f}）: 「{question}」≒「{entry['question']}」")
+        return CacheLookup(vector, entry=entry, similarity=similarity, version=version)
+
+    def store(self, lookup: CacheLookup, question: str, language: str, relationship_style: str,
+              sentences: List[str], emotion: str):
+        """
+        生成した回答を保存（誤ヒット検査中なら以前の回答と比較する）
+
+        Args:
+            lookup: この質問の lookup() の結果
+            sentences: 回答の文のリスト（ストリーミングで送った区切りのまま保存し、音声キャッシュを再利用できるようにする）
+            emotion: 回答の感情（音声キャッシュのキーに含まれるため一緒に保存する）
+        """
+        if not self.enabled or lookup.vector is None or lookup.hit or not sentences:
+            return
+        if lookup.audit is not None:
+            # 回答同士の比較には埋め込みが2回必要なため、応答を遅らせないよう別スレッドで行う
+            threading.Thread(
+                target=self._audit,
+                args=(lookup, question, ''.join(sentences) if language == 'ja' else ' '.join(sentences)),
+                daemon=True
+            ).start()
+
+        with self._lock:
+            if lookup.version != self._version:
+                # 生成中にナレッジが変わった回答は保存しない
+                return
+            if lookup.audit is not None:
+                # 検査したエントリは新しく生成した回答で置き換える
+                self._entries.pop(lookup.audit['id'], None)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'id': entry_id,
+                'partition': self._partition(language, relationship_style),
+                'question': question,
+                'vector': lookup.vector,
+                'sentences': list(sentences),
+                'emotion': emotion,
+                'created': time.time(),
+                'hits': 0
+            }
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _audit(self, lookup: CacheLookup, question: str, fresh_answer: str):
+        cached = lookup.audit
+        cached_answer = ''.join(cached['sentences']) if cached['partition'][0] == 'ja' else ' '.join(cached['sentences'])
+        try:
+            a = np.asarray(self.audit_embed(cached_answer), dtype=np.float32)
+            b = np.asarray(self.audit_embed(fresh_answer), dtype=np.float32)
+            answer_similarity = float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) or 1.0))
+        except Exception as e:
+            print(f"⚠️ 回答キャッシュの検査に失敗: {e}")
+            return
+        if answer_similarity >= self.audit_min_similarity:
+            return
+        with self._lock:
+            self.stats['false_hits'] += 1
+            self._false_hit_samples.append({
+                'question': question,
+                'cached_question': cached['question'],
+                'question_similarity': round(lookup.similarity, 4),
+                'answer_similarity': round(answer_similarity, 4)
+            })
+        print(f"⚠️ 回答キャッシュの誤ヒット: 「{question}」≒「{cached['question']}」"
+              f"（質問 {lookup.similarity:.3f} / 回答 {answer_similarity:.3f}）")
+
+    def invalidate(self, reason: str = ''):
+        """すべてのエントリを捨てる（ナレッジの変更時）"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._version += 1
+            self.stats['invalidations'] += 1
+        if count:
+            print(f"🗑️ 回答キャッシュを無効化: {count}件 {reason}")
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['entries'] = len(self._entries)
+            result['false_hit_samples'] = list(self._false_hit_samples)
+        result['enabled'] = self.enabled
+        result['threshold'] = self.threshold
+        result['hit_rate'] = (result['hits'] / result['lookups'] * 100) if result['lookups'] else 0.0
+        hit_similarity_total = result.pop('hit_similarity_total')
+        result['avg_hit_similarity'] = hit_similarity_total / result['hits'] if result['hits'] else None
+        result['false_hit_rate'] = (result['false_hits'] / result['audits'] * 100) if result['audits'] else None
+        return result
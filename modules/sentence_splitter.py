@@ -0,0 +1,72 @@
+# modules/sentence_splitter.py
+# -*- coding: utf-8 -*-
+# ストリーミング中のテキストを日本語/英語の文境界で区切るモジュール
+import re
+from typing import List
+
+# 文末記号の後ろに続いてもよい閉じ括弧類
+_CLOSING_CHARS = '」』）)】"\'’”'
+
+# 日本語の文末（。！？♪）、改行、英語の文末（. ! ? の直後に空白）
+_BOUNDARY_PATTERN = re.compile(
+    r'[。！？♪]+[' + re.escape(_CLOSING_CHARS) + r']*'
+    r'|\n+'
+    r'|[.!?]+[' + re.escape(_CLOSING_CHARS) + r']*(?=\s)'
+)
+
+
+class SentenceSplitter:
+    """
+    トークン単位で届くテキストを完結した文ごとに切り出す
+
+    短すぎる文（「はい。」など）は次の文とまとめてから返すことで、
+    TTSへの細切れリクエストを防ぐ。
+    """
+
+    def __init__(self, min_length: int = 8):
+        self.min_length = min_length
+        self._buffer = ''
+        self._carry = ''  # min_length未満のため保留中の文
+
+    def feed(self, text: str) -> List[str]:
+        """テキスト断片を追加し、完結した文のリストを返す"""
+        if not text:
+            return []
+        self._buffer += text
+
+        sentences = []
+        while True:
+            match = _BOUNDARY_PATTERN.search(self._buffer)
+            if not match:
+                break
+            # 英語の文末は直後の空白を確認してから切る（"3.5" などの小数を誤検出しない）
+            end = match.end()
+            sentence = self._buffer[:end]
+            self._buffer = self._buffer[end:]
+            sentence = self._merge_carry(sentence)
+            if sentence:
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> List[str]:
+        """ストリーム終了時に残りのテキストを返す"""
+        remainder = (self._carry + self._buffer).strip()
+        self._carry = ''
+        self._buffer = ''
+        return [remainder] if remainder else []
+
+    def has_pending(self) -> bool:
+        """未確定のテキストが残っているか"""
+        return bool((self._carry + self._buffer).strip())
+
+    def pending_text(self) -> str:
+        """未確定のテキスト（保留中の短い文＋区切り待ちのテキスト）"""
+        return self._carry + self._buffer
+
+    def _merge_carry(self, sentence: str) -> str:
+        combined = self._carry + sentence
+        if len(combined.strip()) < self.min_length:
+            self._carry = combined
+            return ''
+        self._carry = ''
+        return combined.strip()
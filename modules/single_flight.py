@@ -0,0 +1,145 @@
+# modules/single_flight.py
+# -*- coding: utf-8 -*-
+# 同じ内容の上流呼び出し（埋め込み・チャット補完・音声合成）が同時に走った場合に1回にまとめるモジュール
+import json
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+
+def make_flight_key(*parts: Any) -> str:
+    """
+    リクエスト内容からキーを生成（文字列はNFKC正規化＋空白の統一）
+
+    Returns:
+        SHA-256のHEX文字列
+    """
+    def _normalize(value):
+        if isinstance(value, str):
+            return ' '.join(unicodedata.normalize('NFKC', value).split())
+        if isinstance(value, dict):
+            return {key: _normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_normalize(item) for item in value]
+        return value
+
+    payload = json.dumps(_normalize(list(parts)), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    実行中の同一リクエストに相乗りさせる
+
+    最初の呼び出し元だけが上流を呼び、同じキーで同時に来た呼び出し元は同じFutureの結果を待つ。
+    結果は保持しない（完了後の同じリクエストは改めて上流を呼ぶ）。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}  # key -> Future
+        self._waiters = {}  # key -> 相乗り中の呼び出し数
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'executed': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'max_waiters': 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """キーが同じ実行中の呼び出しがあればその結果を、なければ fn() を実行して返す"""
+        with self._lock:
+            self.stats['calls'] += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                self._waiters[key] += 1
+                self.stats['max_waiters'] = max(self.stats['max_waiters'], self._waiters[key])
+                leader = False
+            else:
+                future = Future()
+                self._flights[key] = future
+                self._waiters[key] = 0
+                self.stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self.stats['errors'] += 1
+                self._flights.pop(key, None)
+                self._waiters.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._flights.pop(key, None)
+            self._waiters.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            result['in_flight'] = len(self._flights)
+        result['coalesced_rate'] = (result['coalesced'] / result['calls'] * 100) if result['calls'] else 0.0
+        return result
+
+
+_registry_lock = threading.Lock()
+_registry = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """名前ごとに共有される SingleFlight を取得"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = SingleFlight(name)
+        return _registry[name]
+
+
+def get_coalescing_stats() -> Dict[str, Dict]:
+    """全 SingleFlight の統計情報"""
+    with _registry_lock:
+        flights = dict(_registry)
+    return {name: flight.get_stats() for name, flight in flights.items()}
+
+
+def create_chat_completion(client, **params):
+    """
+    同じプロンプト・パラメータの chat.completions 呼び出しを1回にまとめる
+    （stream=True の呼び出しは相乗りできないため対象外）
+    """
+    if params.get('stream'):
+        return client.chat.completions.create(**params)
+    key = make_flight_key('chat.completions', params)
+    return get_single_flight('chat_completions').do(key, lambda: client.chat.completions.create(**params))
+
+
+class CoalescingEmbeddings:
+    """
+    埋め込みモデルのラッパー。同じ検索クエリの embed_query を1回にまとめる
+    （embed_documents などその他の呼び出しはそのまま委譲する）
+    """
+
+    def __init__(self, embeddings):
+        self._embeddings = embeddings
+        self._flight = get_single_flight('embeddings')
+
+    def embed_query(self, text: str):
+        key = make_flight_key('embed_query', text)
+        return self._flight.do(key, lambda: self._embeddings.embed_query(text))
+
+    def embed_documents(self, texts):
+        return self._embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self._embeddings, name)
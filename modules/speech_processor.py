@@ -1,137 +1,226 @@
 # speech_processor.py - 音声認識処理モジュール（Python 3.13対応版）
 import os
-import base64
-import tempfile
 import wave
-import io
+import base64
+import time
+import struct
 import subprocess
-from openai import OpenAI
+import threading
+from modules.http_transport import get_openai_client
+from modules.audio_cache import parse_data_url, estimate_audio_duration
+from modules.audio_encoder import AudioEncoder
+from modules.lip_sync import analyze_audio, decode_wav, pcm16_to_samples, encode_wav
+from modules.voice_activity import VoiceActivityDetector
+from modules.ffmpeg_pool import find_ffmpeg, get_ffmpeg_pool, FFmpegWorkerError
 
-# FFmpegのパスを確認
-def find_ffmpeg():
-    try:
-        # ffmpegコマンドの存在を確認
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        print("⚠️ FFmpegが見つかりません。PATH環境変数にFFmpegのbinディレクトリが含まれているか確認してください。")
-        return False
+# Whisper APIがそのまま受け付ける (コンテナ, コーデック) → (アップロード時のファイル名, MIMEタイプ)
+# コーデックがNoneのものはコンテナだけで判定する
+WHISPER_PASSTHROUGH_FORMATS = {
+    ('webm', 'opus'): ('audio.webm', 'audio/webm'),
+    ('webm', 'vorbis'): ('audio.webm', 'audio/webm'),
+    ('ogg', 'opus'): ('audio.ogg', 'audio/ogg'),
+    ('ogg', 'vorbis'): ('audio.ogg', 'audio/ogg'),
+    ('ogg', 'flac'): ('audio.ogg', 'audio/ogg'),
+    ('mp4', 'aac'): ('audio.m4a', 'audio/mp4'),
+    ('wav', 'pcm'): ('audio.wav', 'audio/wav'),
+    ('mp3', None): ('audio.mp3', 'audio/mpeg'),
+    ('flac', None): ('audio.flac', 'audio/flac'),
+}
+
+# 音声認識用の16kHzモノラルWAVに変換するFFmpegの引数（入力は標準入力、出力は標準出力）
+WAV_TRANSCODE_ARGS = [
+    '-hide_banner', '-loglevel', 'error',
+    '-i', 'pipe:0',
+    '-ar', '16000',  # Whisper APIの推奨サンプルレート
+    '-ac', '1',      # モノラル
+    '-map_metadata', '-1',
+    '-f', 'wav',
+    'pipe:1'
+]
+
+# 発話区間の検出でWAV以外の録音をデコードするときのサンプリングレート
+VAD_SAMPLE_RATE = 16000
+
+# 発話区間の検出用に16kHzモノラルの16bit PCMへデコードするFFmpegの引数（入力は標準入力、出力は標準出力）
+VAD_DECODE_ARGS = [
+    '-hide_banner', '-loglevel', 'error',
+    '-i', 'pipe:0',
+    '-ac', '1', '-ar', str(VAD_SAMPLE_RATE),
+    '-f', 's16le',
+    'pipe:1'
+]
+
+# クライアントに推奨する録音形式（優先順。どれもWhisperへそのまま送れる）
+RECORDING_MIME_TYPES = ['audio/webm;codecs=opus', 'audio/ogg;codecs=opus', 'audio/mp4']
+
+
+def sniff_audio_format(audio_data):
+    """
+    先頭のマジックバイトから音声のコンテナとコーデックを判定
+
+    Returns:
+        (コンテナ, コーデック)。判定できない部分はNone
+    """
+    head = audio_data[:4096]
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        # Matroska/WebM: CodecIDの文字列から判定
+        for marker, codec in ((b'A_OPUS', 'opus'), (b'A_VORBIS', 'vorbis'), (b'A_AAC', 'aac'), (b'A_PCM', 'pcm')):
+            if marker in head:
+                return 'webm', codec
+        return 'webm', None
+    if head[:4] == b'OggS':
+        for marker, codec in ((b'OpusHead', 'opus'), (b'\x01vorbis', 'vorbis'), (b'\x7fFLAC', 'flac'), (b'Speex', 'speex')):
+            if marker in head:
+                return 'ogg', codec
+        return 'ogg', None
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        # fmtチャンクの形式タグ（1=リニアPCM, 3=浮動小数点PCM）
+        format_tag = struct.unpack('<H', head[20:22])[0] if len(head) >= 22 else None
+        return 'wav', 'pcm' if format_tag in (1, 3, 0xFFFE) else None
+    if head[:4] == b'fLaC':
+        return 'flac', None
+    if head[4:8] == b'ftyp':
+        return 'mp4', 'aac' if b'mp4a' in audio_data[:65536] else None
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0):
+        return 'mp3', None
+    return None, None
+
+
+def get_passthrough_format(container, codec):
+    """Whisperへそのまま送れる形式なら (ファイル名, MIMEタイプ)、変換が必要ならNone"""
+    return (WHISPER_PASSTHROUGH_FORMATS.get((container, codec))
+            or WHISPER_PASSTHROUGH_FORMATS.get((container, None)))
 
-FFMPEG_AVAILABLE = find_ffmpeg()
 
 class SpeechProcessor:
     def __init__(self):
-        self.client = OpenAI()
+        self.client = get_openai_client()
         self.supported_formats = ['webm', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'wav', 'ogg']
-        self.ffmpeg_available = FFMPEG_AVAILABLE
-        print(f"🎤 SpeechProcessor初期化完了 (FFmpeg利用可能: {self.ffmpeg_available})")
-    
-    def transcribe_audio(self, audio_base64, language='ja'):
-        """Base64エンコードされた音声データをテキストに変換"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            print("⚠️ FFmpegが利用できないため、音声処理ができません。")
-            return "音声認識機能は現在利用できません。FFmpegをインストールしてください。テキストで入力してください。"
-            
+        self.audio_decoder = AudioEncoder(codec='none')  # 音声長さの解析（デコード）にのみ使用
+        # Whisper APIのファイル上限（25MB）より小さい上限を設ける
+        self.max_upload_bytes = int(os.getenv('MAX_AUDIO_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+        self.ffmpeg_timeout = float(os.getenv('FFMPEG_TIMEOUT', '30'))
+        self.recording_bitrate = int(os.getenv('RECORDING_BITRATE', '24000'))
+        # 録音をチャンクに分けて送るストリーミングアップロード
+        self.streaming_upload = os.getenv('AUDIO_STREAMING_UPLOAD', 'true').lower() == 'true'
+        self.upload_chunk_ms = int(os.getenv('AUDIO_UPLOAD_CHUNK_MS', '250'))
+        self.max_chunk_bytes = int(os.getenv('MAX_AUDIO_CHUNK_BYTES', str(256 * 1024)))
+        # 発話区間の検出（無音・雑音だけの録音はWhisperに送らず、前後の無音は切り詰める）
+        self.vad = VoiceActivityDetector()
+        # 圧縮形式のまま送れる録音は、これ以上切り詰められる場合だけWAVに変換して送る
+        self.vad_min_trim_seconds = float(os.getenv('VAD_MIN_TRIM_SECONDS', '1.0'))
+        # 圧縮形式のまま送れる録音も発話区間を検出するか（既定では無効：WAV/PCMだけを解析する）
+        # 有効にするとデコードのためFFmpegワーカーの実行が1ターンに1回増える
+        # （ストリーミングアップロードでは受信と並行してデコードする）
+        self.vad_compressed_input = os.getenv('VAD_COMPRESSED_INPUT', 'false').lower() == 'true'
+        self.stats = {
+            'transcriptions': 0,
+            'passthrough': 0,
+            'transcoded': 0,
+            'ffmpeg_invocations': 0,
+            'input_bytes': 0,
+            'upload_bytes': 0,
+            'streamed_uploads': 0,
+            'streamed_chunks': 0,
+            'aborted_uploads': 0,
+            'vad_analyzed': 0,
+            'vad_skipped': 0,
+            'vad_decodes': 0,
+            'vad_rejected': 0,
+            'vad_trimmed': 0,
+            'vad_input_seconds': 0.0,
+            'vad_speech_seconds': 0.0,
+            'vad_trimmed_seconds': 0.0,
+            'vad_last': None,
+            'formats': {}
+        }
+        print("🎤 SpeechProcessor初期化完了")
+    
+    @property
+    def ffmpeg_available(self):
+        """FFmpegが利用可能か（初回参照時に検出し、結果はキャッシュされる）"""
+        return find_ffmpeg() is not None
+    
+    def get_recording_config(self):
+        """クライアントに伝える推奨の録音形式（変換なしでWhisperへ送れる形式）"""
+        return {
+            'mimeTypes': RECORDING_MIME_TYPES,
+            'audioBitsPerSecond': self.recording_bitrate,
+            'streamingUpload': self.streaming_upload,
+            'chunkMs': self.upload_chunk_ms,
+            'maxChunkBytes': self.max_chunk_bytes,
+            'maxUploadBytes': self.max_upload_bytes
+        }
+    
+    def get_stats(self):
+        """統計情報を取得"""
+        result = dict(self.stats)
+        result['formats'] = dict(self.stats['formats'])
+        turns = result['transcriptions']
+        result['avg_upload_bytes'] = (result['upload_bytes'] / turns) if turns else 0.0
+        result['ffmpeg_per_turn'] = (result['ffmpeg_invocations'] / turns) if turns else 0.0
+        result['vad_decodes_per_turn'] = (result['vad_decodes'] / turns) if turns else 0.0
+        result['vad_enabled'] = self.vad.enabled
+        result['vad_speech_ratio'] = (result['vad_speech_seconds'] / result['vad_input_seconds']) if result['vad_input_seconds'] else 0.0
+        return result
+    
+    def transcribe_audio(self, audio, language='ja'):
+        """
+        音声データをテキストに変換
+        
+        Args:
+            audio: 音声のバイト列（Socket.IOのバイナリ添付。bytes / bytearray / memoryview）、
+                   またはBase64文字列・data URL（従来のクライアント）
+        
+        Whisperが受け付ける形式はそのまま送り、それ以外だけFFmpegのパイプで16kHzモノラルWAVに変換する。
+        """
         try:
             print(f"🎤 音声認識開始 (言語: {language})")
             
-            # Base64データの検証
-            if not audio_base64:
+            if not audio:
                 print("❌ 音声データが空です")
                 return None
             
-            # データURLスキームの処理
-            if audio_base64.startswith('data:'):
-                # data:audio/webm;base64,xxxxx の形式から実際のデータを抽出
-                try:
-                    header, data = audio_base64.split(',', 1)
-                    audio_base64 = data
-                    print(f"📊 データURLヘッダー: {header}")
-                except Exception as e:
-                    print(f"❌ データURL解析エラー: {e}")
+            if isinstance(audio, (bytes, bytearray, memoryview)):
+                # バイナリ添付はデコード不要
+                if len(audio) > self.max_upload_bytes:
+                    print(f"❌ 音声データが大きすぎます: {len(audio)} バイト (上限 {self.max_upload_bytes})")
+                    return None
+                audio_data = audio if isinstance(audio, bytes) else bytes(audio)
+                print(f"✅ バイナリ受信: [audio_data {len(audio_data)} bytes]")
+            else:
+                audio_data = self._decode_base64_audio(audio)
+                if audio_data is None:
                     return None
             
-            # Base64デコード
-            try:
-                audio_data = base64.b64decode(audio_base64)
-                print(f"✅ Base64デコード成功: [audio_data {len(audio_data)} bytes]")
-            except Exception as e:
-                print(f"❌ Base64デコードエラー: {e}")
-                return None
-            
-            # 一時ファイルを作成して音声データを保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
-                temp_webm.write(audio_data)
-                temp_webm_path = temp_webm.name
-                print(f"📁 一時ファイル作成: {temp_webm_path}")
+            container, codec = sniff_audio_format(audio_data)
+            self._count_input(len(audio_data), container, codec)
             
-            try:
-                # WAVファイルとして一時保存するパス
-                temp_wav_path = tempfile.mktemp(suffix='.wav')
+            passthrough = get_passthrough_format(container, codec)
+            if passthrough:
+                # Whisperがそのまま受け付ける形式は変換しない
+                filename, mime = passthrough
+                upload = (filename, audio_data, mime)
+                self.stats['passthrough'] += 1
+            else:
+                # FFmpegが利用できない場合
+                if not self.ffmpeg_available:
+                    print("⚠️ FFmpegが利用できないため、音声処理ができません。")
+                    return "音声認識機能は現在利用できません。FFmpegをインストールしてください。テキストで入力してください。"
                 
-                # FFmpegを使用してWebMからWAVに変換
+                # FFmpegで16kHzモノラルWAVに変換（標準入出力のパイプを使い、ファイルは作らない）
                 print(f"🔄 FFmpegでWAVに変換中...")
-                subprocess.run([
-                    'ffmpeg', 
-                    '-i', temp_webm_path, 
-                    '-ar', '16000',  # Whisper APIの推奨サンプルレート
-                    '-ac', '1',      # モノラル
-                    '-y',            # 既存ファイルを上書き
-                    temp_wav_path
-                ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                print(f"✅ WAV変換成功: {temp_wav_path}")
-                
-                # OpenAI Whisper APIで音声認識
-                with open(temp_wav_path, 'rb') as audio_file:
-                    print("🔄 Whisper APIに送信中...")
-                    
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=language,
-                        response_format="text",
-                        prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
-                    )
-                    
-                    # Whisper APIはテキストを直接返す
-                    text = transcript.strip() if isinstance(transcript, str) else str(transcript).strip()
-                    
-                    print(f"✅ 音声認識成功: '{text}'")
-                    
-                    # 空の結果チェック
-                    if not text or text == "":
-                        print("⚠️ 音声認識結果が空です")
-                        return None
-                    
-                    return text
-                    
-            except subprocess.SubprocessError as e:
-                print(f"❌ FFmpeg実行エラー: {e}")
-                return "音声の変換に失敗しました。FFmpegの設定を確認してください。"
-            except Exception as e:
-                print(f"❌ 音声処理エラー: {type(e).__name__}: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # エラーの詳細情報
-                if hasattr(e, 'response'):
-                    print(f"API応答: {e.response}")
-                
-                return None
-                
-            finally:
-                # 一時ファイルのクリーンアップ
                 try:
-                    if os.path.exists(temp_webm_path):
-                        os.unlink(temp_webm_path)
-                        print(f"🗑️ 一時ファイル削除: {temp_webm_path}")
-                    if 'temp_wav_path' in locals() and os.path.exists(temp_wav_path):
-                        os.unlink(temp_wav_path)
-                        print(f"🗑️ 一時ファイル削除: {temp_wav_path}")
-                except Exception as e:
-                    print(f"⚠️ 一時ファイル削除エラー: {e}")
+                    wav_data = self._transcode_to_wav(audio_data)
+                except (subprocess.SubprocessError, OSError) as e:
+                    print(f"❌ FFmpeg実行エラー: {e}")
+                    return "音声の変換に失敗しました。FFmpegの設定を確認してください。"
+                if wav_data is None:
+                    return None
+                print(f"✅ WAV変換成功: [wav_data {len(wav_data)} bytes]")
+                upload = ("audio.wav", wav_data, "audio/wav")
+                self.stats['transcoded'] += 1
+            return self.transcribe_upload(upload, language)
                     
         except Exception as e:
             print(f"❌ 音声認識エラー: {type(e).__name__}: {e}")
@@ -139,70 +228,433 @@ class SpeechProcessor:
             traceback.print_exc()
             return None
     
-    def validate_audio_data(self, audio_base64):
-        """音声データの妥当性を検証"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            return False
-            
-        try:
-            # データURLスキームの確認
-            if audio_base64.startswith('data:'):
-                header, data = audio_base64.split(',', 1)
-                # サポートされている形式かチェック
-                if 'audio/' in header:
-                    return True
-                else:
-                    print(f"❌ サポートされていない形式: {header}")
-                    return False
-            
-            # Base64データの基本的な検証
+    def _decode_base64_audio(self, audio_base64):
+        """Base64文字列・data URLをバイト列にデコード（サイズ超過・不正な場合None）"""
+        # データURLスキームの処理
+        if audio_base64.startswith('data:'):
+            # data:audio/webm;base64,xxxxx の形式から実際のデータを抽出
             try:
-                decoded = base64.b64decode(audio_base64)
-                if len(decoded) < 100:  # 最小サイズチェック
-                    print(f"❌ 音声データが小さすぎます: {len(decoded)} バイト")
-                    return False
-                return True
-            except:
-                return False
-                
+                header, data = audio_base64.split(',', 1)
+                audio_base64 = data
+                print(f"📊 データURLヘッダー: {header}")
+            except Exception as e:
+                print(f"❌ データURL解析エラー: {e}")
+                return None
+        
+        # デコード前にサイズを確認（Base64は元データの約4/3倍）
+        if len(audio_base64) * 3 // 4 > self.max_upload_bytes:
+            print(f"❌ 音声データが大きすぎます: 約{len(audio_base64) * 3 // 4} バイト (上限 {self.max_upload_bytes})")
+            return None
+        
+        # Base64デコード
+        try:
+            audio_data = base64.b64decode(audio_base64)
+            print(f"✅ Base64デコード成功: [audio_data {len(audio_data)} bytes]")
+            return audio_data
         except Exception as e:
-            print(f"❌ 音声データ検証エラー: {e}")
-            return False
+            print(f"❌ Base64デコードエラー: {e}")
+            return None
     
-    def get_audio_duration(self, audio_base64):
-        """音声の長さを取得"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            return 0
-            
+    def transcribe_upload(self, upload, language='ja', pcm=None):
+        """
+        Whisper APIに送れる形に整えた音声をテキストに変換
+        
+        Args:
+            upload: (ファイル名, バイト列, MIMEタイプ)
+            pcm: 発話区間の検出に使う、デコード済みの16kHzモノラルPCM（あればFFmpegでデコードし直さない）
+        """
+        upload = self._apply_vad(upload, pcm)
+        if upload is None:
+            return None
+        self.stats['upload_bytes'] += len(upload[1])
+        
         try:
-            if audio_base64.startswith('data:'):
-                _, data = audio_base64.split(',', 1)
-                audio_base64 = data
+            # OpenAI Whisper APIで音声認識（メモリ上のデータをそのまま送信）
+            print(f"🔄 Whisper APIに送信中... [{upload[0]} {len(upload[1])} bytes]")
+            transcript = self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=upload,
+                language=language,
+                response_format="text",
+                prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
+            )
             
-            audio_data = base64.b64decode(audio_base64)
+            # Whisper APIはテキストを直接返す
+            text = transcript.strip() if isinstance(transcript, str) else str(transcript).strip()
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                temp_file.write(audio_data)
-                temp_path = temp_file.name
+            print(f"✅ 音声認識成功: '{text}'")
             
-            try:
-                # FFmpegを使って長さを取得
-                result = subprocess.run([
-                    'ffprobe', 
-                    '-v', 'error', 
-                    '-show_entries', 'format=duration', 
-                    '-of', 'default=noprint_wrappers=1:nokey=1', 
-                    temp_path
-                ], capture_output=True, text=True, check=True)
+            # 空の結果チェック
+            if not text or text == "":
+                print("⚠️ 音声認識結果が空です")
+                return None
+            
+            return text
                 
-                duration = float(result.stdout.strip())
-                return duration
-            finally:
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+        except Exception as e:
+            print(f"❌ 音声処理エラー: {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # エラーの詳細情報
+            if hasattr(e, 'response'):
+                print(f"API応答: {e.response}")
+            
+            return None
+    
+    def open_upload_stream(self, mime_type=None):
+        """録音チャンクを受け取りながら変換するストリームを開始"""
+        return AudioUploadStream(self, mime_type)
+    
+    def transcribe_stream(self, stream, language='ja', expected_chunks=None):
+        """
+        ストリーミングアップロードを締めくくってテキストに変換
+        
+        Raises:
+            AudioUploadError: チャンクの欠落・変換の失敗・サイズ超過
+        """
+        print(f"🎤 音声認識開始 (言語: {language}, ストリーミング {expected_chunks}チャンク)")
+        upload = stream.finish(expected_chunks)
+        if upload is None:
+            return None
+        self.stats['streamed_uploads'] += 1
+        return self.transcribe_upload(upload, language, pcm=stream.decoded_pcm)
+    
+    def _count_input(self, size, container, codec):
+        format_name = f"{container or 'unknown'}/{codec or '-'}"
+        print(f"📊 音声形式: {format_name}")
+        self.stats['transcriptions'] += 1
+        self.stats['input_bytes'] += size
+        self.stats['formats'][format_name] = self.stats['formats'].get(format_name, 0) + 1
+    
+    def _apply_vad(self, upload, pcm=None):
+        """
+        発話区間を検出し、発話がなければNone、前後の無音を切り詰められればトリミングしたWAVを返す
+        （解析できない場合はそのまま返す）
+        
+        Args:
+            pcm: デコード済みの16kHzモノラルPCM（ストリーミングアップロードで受信と並行してデコードしたもの）
+        """
+        if not self.vad.enabled:
+            return upload
+        filename, audio_data, mime = upload
+        try:
+            decoded = decode_wav(audio_data)
+        except (wave.Error, EOFError, ValueError):
+            decoded = None
+        if decoded is None and pcm:
+            decoded = pcm16_to_samples(pcm), VAD_SAMPLE_RATE
+        if decoded is None:
+            if not self.vad_compressed_input or not self.ffmpeg_available:
+                self.stats['vad_skipped'] += 1
+                return upload
+            # 圧縮形式はFFmpegでデコードしてから解析する（変換ではないため vad_decodes に数える）
+            self.stats['vad_decodes'] += 1
+            pcm_bytes = self.audio_decoder.decode_pcm(audio_data, VAD_SAMPLE_RATE)
+            if pcm_bytes:
+                decoded = pcm16_to_samples(pcm_bytes), VAD_SAMPLE_RATE
+        if decoded is None:
+            return upload
+        
+        samples, sample_rate = decoded
+        result = self.vad.detect(samples, sample_rate)
+        self.stats['vad_analyzed'] += 1
+        self.stats['vad_input_seconds'] += result['duration']
+        self.stats['vad_speech_seconds'] += result['speech_seconds']
+        self.stats['vad_last'] = result
+        print(f"🗣️ 発話検出: 発話 {result['speech_seconds']:.2f}秒 / 録音 {result['duration']:.2f}秒 "
+              f"(割合 {result['speech_ratio'] * 100:.0f}%, 切り詰め {result['trimmed_seconds']:.2f}秒)")
+        
+        if not result['speech']:
+            print("⚠️ 発話が検出されないため音声認識を行いません")
+            self.stats['vad_rejected'] += 1
+            return None
+        
+        # WAVはそのまま切り詰め、圧縮形式は効果が大きい場合だけWAVにして送る（Whisperは音声の長さで課金）
+        if result['trimmed_seconds'] > 0 and (filename == 'audio.wav' or result['trimmed_seconds'] >= self.vad_min_trim_seconds):
+            self.stats['vad_trimmed'] += 1
+            self.stats['vad_trimmed_seconds'] += result['trimmed_seconds']
+            return 'audio.wav', encode_wav(samples[result['start']:result['end']], sample_rate), 'audio/wav'
+        return upload
+    
+    def _transcode_to_wav(self, audio_data):
+        """
+        音声をFFmpegのパイプ（stdin→stdout）で16kHzモノラルWAVに変換
+        （FFmpegは常駐ワーカープールで実行する）
+        
+        Returns:
+            WAVのバイト列（失敗・サイズ超過時None）
+        """
+        self.stats['ffmpeg_invocations'] += 1
+        result = get_ffmpeg_pool().run([find_ffmpeg()] + WAV_TRANSCODE_ARGS, audio_data, timeout=self.ffmpeg_timeout)
+        
+        if result.returncode != 0 or not result.stdout:
+            print(f"❌ FFmpeg変換失敗: {result.stderr.decode('utf-8', 'replace').strip()[-200:]}")
+            return None
+        if len(result.stdout) > self.max_upload_bytes:
+            print(f"❌ 変換後の音声が大きすぎます: {len(result.stdout)} バイト (上限 {self.max_upload_bytes})")
+            return None
+        return self._fix_wav_header(result.stdout)
+    
+    @staticmethod
+    def _fix_wav_header(wav_data):
+        """パイプ出力ではサイズ未確定のまま書かれるRIFF・dataチャンクのサイズを実際の値に直す"""
+        data_index = wav_data.find(b'data', 12)
+        if wav_data[:4] != b'RIFF' or data_index < 0:
+            return wav_data
+        fixed = bytearray(wav_data)
+        fixed[4:8] = struct.pack('<I', len(wav_data) - 8)
+        fixed[data_index + 4:data_index + 8] = struct.pack('<I', len(wav_data) - data_index - 8)
+        return bytes(fixed)
+    
+    def validate_audio_data(self, audio):
+        """音声データの妥当性を検証（Base64はデコードせず、長さから元のサイズを求める）"""
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            size = len(audio)
+        else:
+            try:
+                header, data = audio.split(',', 1) if audio.startswith('data:') else ('', audio)
+            except ValueError:
+                return False
+            if header and 'audio/' not in header:
+                print(f"❌ サポートされていない形式: {header}")
+                return False
+            data = data.strip()
+            size = len(data) * 3 // 4 - data[-2:].count('=')
+        
+        if size < 100:  # 最小サイズチェック
+            print(f"❌ 音声データが小さすぎます: {size} バイト")
+            return False
+        if size > self.max_upload_bytes:
+            print(f"❌ 音声データが大きすぎます: {size} バイト (上限 {self.max_upload_bytes})")
+            return False
+        return True
+    
+    def get_audio_duration(self, audio):
+        """音声（バイト列・Base64・data URL）の長さを取得（一時ファイルやffprobeを使わず、メモリ上でデコードして求める）"""
+        try:
+            if isinstance(audio, (bytes, bytearray, memoryview)):
+                audio_data, mime = bytes(audio), None
+            elif audio.startswith('data:'):
+                audio_data, mime = parse_data_url(audio)
+            else:
+                audio_data, mime = base64.b64decode(audio), None
+            
+            metadata = analyze_audio(
+                audio_data, mime,
+                decode_pcm=self.audio_decoder.decode_pcm if self.ffmpeg_available else None
+            )
+            if metadata is not None:
+                return metadata['duration']
+            return estimate_audio_duration(audio_data, mime) or 0
                     
         except Exception as e:
             print(f"❌ 音声長さ取得エラー: {e}")
             return 0
+
+
+class AudioUploadError(Exception):
+    """ストリーミングアップロードを中断すべきエラー（サイズ超過・チャンクの欠落・変換の失敗など）"""
+
+
+class AudioUploadStream:
+    """
+    録音のチャンクを受け取りながら音声認識に送れる形に整えるストリーム
+    
+    最初のチャンクで形式を判定し、Whisperがそのまま受け付ける形式なら連結するだけ、
+    それ以外は受信と並行してFFmpegワーカープールのストリーミングジョブに流し込み、
+    録音終了時には変換がほぼ終わっているようにする（プールに空きがなければ録音終了時にまとめて変換する）。
+    そのまま送る形式でも圧縮形式の発話区間を検出する設定（VAD_COMPRESSED_INPUT）なら、
+    受信と並行して発話区間の検出用のPCMにデコードする。
+    チャンクには連番を付けて送ってもらい、ハンドラの実行順が前後しても番号順に処理する。
+    """
+    
+    # 形式の判定に使う先頭のバイト数（これだけ届くまで判定を待つ）
+    SNIFF_BYTES = 64
+    
+    def __init__(self, processor, mime_type=None):
+        self.processor = processor
+        self.mime_type = mime_type
+        self.received_bytes = 0
+        self.next_seq = 0
+        self.created_at = time.time()
+        self.closed = False
+        self.finished = False
+        self.aborted = False
+        self._pending = {}  # 順番より先に届いたチャンク: 連番 -> バイト列
+        self._buffer = bytearray()  # 受信したバイト列（変換に失敗した場合のまとめての変換にも使う）
+        self._format = None  # (コンテナ, コーデック)
+        self._passthrough = None
+        self._job = None  # FFmpegワーカープールのストリーミングジョブ
+        self._condition = threading.Condition()
+        self.decoded_pcm = None  # そのまま送る形式を受信と並行してデコードしたPCM（発話区間の検出用）
+    
+    def feed(self, seq, chunk):
+        """
+        チャンクを受け取る
+        
+        Raises:
+            AudioUploadError: チャンク・発話全体のサイズ上限を超えた場合
+        """
+        if not isinstance(chunk, (bytes, bytearray)):
+            raise AudioUploadError('音声チャンクの形式が不正です')
+        if len(chunk) > self.processor.max_chunk_bytes:
+            raise AudioUploadError(f'音声チャンクが大きすぎます ({len(chunk)} バイト, 上限 {self.processor.max_chunk_bytes})')
+        
+        with self._condition:
+            if self.closed:
+                raise AudioUploadError('音声のアップロードは終了しています')
+            if seq < self.next_seq or seq in self._pending:
+                return  # 重複して届いたチャンク
+            self.received_bytes += len(chunk)
+            if self.received_bytes > self.processor.max_upload_bytes:
+                raise AudioUploadError(f'音声データが大きすぎます (上限 {self.processor.max_upload_bytes} バイト)')
+            self._pending[seq] = bytes(chunk)
+            while self.next_seq in self._pending:
+                self._consume(self._pending.pop(self.next_seq))
+                self.next_seq += 1
+                self.processor.stats['streamed_chunks'] += 1
+            self._condition.notify_all()
+    
+    def finish(self, expected_chunks=None, timeout=5.0):
+        """
+        全チャンクの到着と変換の完了を待ち、Whisperに送る (ファイル名, バイト列, MIMEタイプ) を返す
+        （音声が空ならNone）
+        
+        Args:
+            timeout: チャンクの到着と、受信と並行して実行している変換の完了をそれぞれ待つ最大秒数
+        
+        Raises:
+            AudioUploadError: チャンクの欠落・変換の失敗・変換後のサイズ超過
+        """
+        with self._condition:
+            if expected_chunks is not None:
+                deadline = time.time() + timeout
+                while self.next_seq < expected_chunks:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise AudioUploadError(f'音声チャンクが揃いませんでした ({self.next_seq}/{expected_chunks})')
+                    self._condition.wait(remaining)
+            self.closed = True
+            if self._format is None:
+                if not self._buffer:
+                    self.finished = True
+                    return None
+                self._detect_format()
+        
+        self.processor._count_input(self.received_bytes, *self._format)
+        if self._passthrough:
+            filename, mime = self._passthrough
+            self.processor.stats['passthrough'] += 1
+            # 発話区間の検出用のデコードは失敗してもアップロードは続ける（解析を省くだけ）
+            result = self._finish_job(timeout, required=False)
+            if result is not None and result.returncode == 0:
+                self.decoded_pcm = result.stdout or None
+            self.finished = True
+            return filename, bytes(self._buffer), mime
+        
+        if self._job is not None:
+            result = self._finish_job(timeout, required=True)
+            if result.returncode != 0 or not result.stdout:
+                print(f"❌ FFmpeg変換失敗: {result.stderr.decode('utf-8', 'replace').strip()[-200:]}")
+                raise AudioUploadError('音声の変換に失敗しました')
+            output = result.stdout
+            if len(output) > self.processor.max_upload_bytes:
+                raise AudioUploadError(f'変換後の音声が大きすぎます ({len(output)} バイト)')
+            output = SpeechProcessor._fix_wav_header(output)
+        else:
+            # 受信中に変換できなかった（プールに空きがなかった等）：まとめて変換する
+            print("🔄 FFmpegでWAVに変換中...（受信後にまとめて変換）")
+            try:
+                output = self.processor._transcode_to_wav(bytes(self._buffer))
+            except (subprocess.SubprocessError, OSError) as e:
+                print(f"❌ FFmpeg実行エラー: {e}")
+                raise AudioUploadError('音声の変換に失敗しました')
+            if output is None:
+                raise AudioUploadError('音声の変換に失敗しました')
+        self.processor.stats['transcoded'] += 1
+        self.finished = True
+        elapsed = time.time() - self.created_at
+        print(f"✅ ストリーミング変換完了: [{self.received_bytes} → {len(output)} bytes] (受信開始から{elapsed:.2f}秒)")
+        return 'audio.wav', output, 'audio/wav'
+    
+    def abort(self):
+        """アップロードを中断（実行中の変換を終了する。完了・中断済みのアップロードは数えない）"""
+        with self._condition:
+            counted = not (self.finished or self.aborted)
+            self.aborted = True
+            self.closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+        if counted:
+            self.processor.stats['aborted_uploads'] += 1
+        self._stop_job()
+    
+    # ====== 内部処理 ======
+    
+    def _consume(self, data):
+        self._buffer.extend(data)
+        if self._job is not None:
+            self._feed_job(data)
+        elif self._format is None and len(self._buffer) >= self.SNIFF_BYTES:
+            self._detect_format()
+    
+    def _detect_format(self):
+        """先頭から形式を判定し、変換が必要ならプールのストリーミングジョブを開始して受信済みの分を流し込む"""
+        self._format = sniff_audio_format(bytes(self._buffer))
+        self._passthrough = get_passthrough_format(*self._format)
+        processor = self.processor
+        format_name = f"{self._format[0] or 'unknown'}/{self._format[1] or '-'}"
+        if self._passthrough:
+            # WAVはFFmpegなしで解析できる。圧縮形式は設定で有効な場合だけ受信と並行してデコードする
+            if (self._format[0] == 'wav' or not processor.vad.enabled
+                    or not processor.vad_compressed_input or find_ffmpeg() is None):
+                return
+            self._job = get_ffmpeg_pool().open_stream([find_ffmpeg()] + VAD_DECODE_ARGS,
+                                                      max_output=processor.max_upload_bytes)
+            if self._job is not None:
+                processor.stats['vad_decodes'] += 1
+                print(f"🔄 発話区間の検出用にデコードしながら受信中... ({format_name})")
+        else:
+            if find_ffmpeg() is None:
+                raise AudioUploadError('FFmpegが利用できないため、この形式の音声は処理できません')
+            self._job = get_ffmpeg_pool().open_stream([find_ffmpeg()] + WAV_TRANSCODE_ARGS,
+                                                      max_output=processor.max_upload_bytes)
+            if self._job is None:
+                return  # 録音終了時にまとめて変換する
+            processor.stats['ffmpeg_invocations'] += 1
+            print(f"🔄 FFmpegでWAVに変換しながら受信中... ({format_name})")
+        if self._job is not None:
+            self._feed_job(bytes(self._buffer))
+    
+    def _feed_job(self, data):
+        try:
+            self._job.feed(data)
+        except FFmpegWorkerError as e:
+            # 受信したバイト列は残っているため、録音終了時にまとめて変換する（発話区間の検出用なら省く）
+            print(f"⚠️ 受信と並行した変換を中止します: {e}")
+            self._job = None
+    
+    def _finish_job(self, timeout, required):
+        """
+        ストリーミングジョブの入力を閉じ、timeout 秒まで終了を待って結果を返す
+        （required でなければ失敗時にNone、required なら AudioUploadError）
+        """
+        job, self._job = self._job, None
+        if job is None:
+            return None
+        try:
+            return job.finish(timeout)
+        except subprocess.TimeoutExpired:
+            message = '音声の変換がタイムアウトしました'
+        except (FFmpegWorkerError, OSError) as e:
+            message = f'音声の変換に失敗しました ({e})'
+        if required:
+            raise AudioUploadError(message)
+        print(f"⚠️ 発話区間の検出用のデコードを省きます: {message}")
+        return None
+    
+    def _stop_job(self):
+        job, self._job = self._job, None
+        if job is not None:
+            job.abort()
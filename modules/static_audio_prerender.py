@@ -0,0 +1,298 @@
+# modules/static_audio_prerender.py
+# -*- coding: utf-8 -*-
+# 静的Q&A・段階別Q&Aの回答音声を事前生成するバッチジョブ
+#
+# 使い方:
+#   python -m modules.static_audio_prerender                 # 未生成・変更分のみ生成
+#   python -m modules.static_audio_prerender --force         # 全件再生成
+#   python -m modules.static_audio_prerender --dry-run       # 生成対象の確認のみ
+#   python -m modules.static_audio_prerender --concurrency 2 --languages ja
+#
+# 生成した音声はTTS音声キャッシュ（ディスク層）に保存され、マニフェストは
+# サーバー起動時に読み込まれてメモリキャッシュへ展開される。
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from modules.audio_cache import make_engine_cache_key, normalize_cache_text
+from modules.tts_hedging import get_engine_preference
+
+# 事前生成する感情（キャラクターの感情遷移で使われるもの）
+PRERENDER_EMOTIONS = ['happy', 'sad', 'angry', 'surprised', 'neutral']
+
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path() -> str:
+    return os.getenv('STATIC_AUDIO_MANIFEST', 'data/static_audio_manifest.json')
+
+
+def collect_static_texts(languages: List[str]) -> List[Tuple[str, str]]:
+    """
+    事前生成対象の (言語, テキスト) を列挙
+
+    日本語は静的Q&A・段階別Q&Aの回答と、繰り返し質問の前置き（単独。再生時に回答音声と連結する）。
+    英語は英語版の静的Q&A・段階別Q&Aの回答。
+    """
+    from modules import static_qa_data
+
+    texts = []
+    if 'ja' in languages:
+        answers = list(static_qa_data.static_qa_responses.values())
+        for qa_data in static_qa_data.staged_qa_responses.values():
+            answers.extend(qa_data.values())
+        for answer in answers:
+            texts.append(('ja', answer))
+        for prefix in static_qa_data.REPEAT_QUESTION_PREFIXES.values():
+            texts.append(('ja', prefix))
+
+    if 'en' in languages:
+        answers = list(static_qa_data.static_qa_responses_en.values())
+        for qa_data in static_qa_data.staged_qa_responses_en.values():
+            answers.extend(qa_data.values())
+        for answer in answers:
+            texts.append(('en', answer))
+
+    # 同じ回答が複数のキーに登録されているため重複を除く
+    seen = set()
+    unique_texts = []
+    for item in texts:
+        if item not in seen:
+            seen.add(item)
+            unique_texts.append(item)
+    return unique_texts
+
+
+def make_entry_id(language: str, emotion: str, text: str) -> str:
+    """マニフェストのエントリIDを生成"""
+    raw = f"{language}\n{emotion}\n{normalize_cache_text(text)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def load_static_audio_manifest(path: Optional[str] = None) -> Optional[Dict]:
+    """マニフェストを読み込む。存在しないか不正な場合はNone"""
+    path = path or get_manifest_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 音声マニフェスト読み込みエラー: {e}")
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        print(f"⚠️ 音声マニフェストのバージョンが異なります: {manifest.get('version')}")
+        return None
+    return manifest
+
+
+def save_static_audio_manifest(manifest: Dict, path: Optional[str] = None):
+    """マニフェストをアトミックに書き出す"""
+    path = path or get_manifest_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def warm_audio_cache_from_manifest(manifest: Optional[Dict], audio_cache) -> int:
+    """マニフェストに載っている音声をメモリキャッシュへ展開。展開した件数を返す"""
+    if not manifest:
+        return 0
+    keys = set()
+    for entry in manifest.get('entries', {}).values():
+        keys.add(entry['cache_key'])
+        if entry.get('encoded_cache_key'):
+            keys.add(entry['encoded_cache_key'])
+    return sum(1 for key in keys if audio_cache.preload(key))
+
+
+class StaticAudioPrerenderer:
+    """静的回答の音声を並列数を制限して事前生成する"""
+
+    def __init__(self, audio_cache, tts_client, coe_font_client=None, concurrency: int = 4, encoder=None,
+                 postprocessor=None):
+        self.audio_cache = audio_cache
+        self.tts_client = tts_client
+        self.coe_font_client = coe_font_client
+        self.concurrency = max(1, concurrency)
+        self.encoder = encoder  # 指定時は配信用の圧縮音声も生成しておく
+        self.postprocessor = postprocessor  # 指定時はサーバーと同じ後処理をしてから保存する
+
+    def _preferred_engine(self, language: str) -> str:
+        """application.get_engine_order と同じ優先順位でエンジンを選択"""
+        coe_font_usable = (language == 'ja' and self.coe_font_client is not None
+                           and self.coe_font_client.is_available())
+        preferred = get_engine_preference().get(language, 'coe_font' if language == 'ja' else 'openai_tts')
+        if coe_font_usable and preferred == 'coe_font':
+            return 'coe_font'
+        return 'openai_tts'
+
+    def _cache_key(self, text: str, engine: str, emotion: str) -> str:
+        return make_engine_cache_key(text, engine, emotion,
+                                     coe_font_client=self.coe_font_client,
+                                     tts_client=self.tts_client,
+                                     postprocess=self.postprocessor.fingerprint if self.postprocessor else '')
+
+    def _synthesize(self, text: str, language: str, emotion: str) -> Optional[Dict]:
+        """音声を生成してキャッシュへ保存。CoeFont失敗時はOpenAI TTSにフォールバック"""
+        engine = self._preferred_engine(language)
+        generated = None
+        if engine == 'coe_font':
+            generated = self.coe_font_client.generate_audio_bytes(text, emotion=emotion)
+            if not generated:
+                print(f"⚠️ CoeFont生成失敗 → OpenAI TTSで生成: {text[:20]}...")
+                engine = 'openai_tts'
+        if not generated:
+            voice = "nova" if language == 'ja' else "echo"
+            generated = self.tts_client.generate_audio_bytes(text, voice=voice, emotion_params=emotion)
+        if not generated or not generated[0]:
+            return None
+
+        audio_bytes, mime = generated
+        if self.postprocessor is not None:
+            processed = self.postprocessor.process(audio_bytes, mime, engine)
+            if processed is not None:
+                audio_bytes, mime = processed, 'audio/wav'
+        cache_key = self._cache_key(text, engine, emotion)
+        self.audio_cache.put(cache_key, audio_bytes, mime)
+        result = {'engine': engine, 'cache_key': cache_key, 'bytes': len(audio_bytes), 'mime': mime}
+
+        if self.encoder is not None and self.encoder.should_encode(mime):
+            encoded = self.encoder.encode(audio_bytes)
+            if encoded is not None:
+                encoded_bytes, encoded_mime, _ = encoded
+                variant_key = self.encoder.variant_key(cache_key, self.encoder.codec)
+                self.audio_cache.put(variant_key, encoded_bytes, encoded_mime)
+                result['encoded_cache_key'] = variant_key
+                result['encoded_bytes'] = len(encoded_bytes)
+        return result
+
+    def run(self, languages: List[str], force: bool = False, dry_run: bool = False,
+            manifest_path: Optional[str] = None) -> Dict:
+        """
+        事前生成を実行してマニフェストを更新
+
+        Returns:
+            実行結果の統計
+        """
+        start_time = time.time()
+        previous = load_static_audio_manifest(manifest_path) or {}
+        previous_entries = previous.get('entries', {})
+
+        # 生成計画を作る（同じキャッシュキーは一度だけ生成する）
+        entries = {}
+        pending = {}  # planned_key -> (text, language, emotion)
+        reused = 0
+        for language, text in collect_static_texts(languages):
+            for emotion in PRERENDER_EMOTIONS:
+                entry_id = make_entry_id(language, emotion, text)
+                planned_key = self._cache_key(text, self._preferred_engine(language), emotion)
+                prev = previous_entries.get(entry_id)
+                if (not force and prev and prev.get('cache_key') == planned_key
+                        and self.audio_cache.contains(planned_key)):
+                    entries[entry_id] = prev
+                    reused += 1
+                    continue
+                entries[entry_id] = {
+                    'language': language,
+                    'emotion': emotion,
+                    'text': text,
+                    'cache_key': planned_key
+                }
+                pending.setdefault(planned_key, (text, language, emotion))
+
+        print(f"📋 事前生成計画: 全{len(entries)}件 / 再利用{reused}件 / 生成対象{len(pending)}音声")
+        if dry_run:
+            for text, language, emotion in pending.values():
+                print(f"  - [{language}/{emotion}] {text[:40]}...")
+            return {'entries': len(entries), 'reused': reused, 'to_render': len(pending), 'rendered': 0, 'failed': 0}
+
+        # 並列数を制限して生成
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                planned_key: executor.submit(self._synthesize, text, language, emotion)
+                for planned_key, (text, language, emotion) in pending.items()
+            }
+            for planned_key, future in futures.items():
+                try:
+                    results[planned_key] = future.result()
+                except Exception as e:
+                    print(f"❌ 事前生成エラー: {e}")
+                    results[planned_key] = None
+
+        rendered = sum(1 for r in results.values() if r)
+        failed = len(results) - rendered
+        total_bytes = 0
+        for entry_id in list(entries.keys()):
+            entry = entries[entry_id]
+            if entry.get('cache_key') not in results:
+                continue
+            result = results[entry['cache_key']]
+            if result is None:
+                # 失敗したものはマニフェストに載せず次回再試行する
+                del entries[entry_id]
+                continue
+            entry.update(result)
+            entry['rendered_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            total_bytes += result['bytes']
+
+        save_static_audio_manifest({
+            'version': MANIFEST_VERSION,
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'entries': entries
+        }, manifest_path)
+
+        elapsed = time.time() - start_time
+        print(f"✅ 事前生成完了: 生成{rendered}音声 ({total_bytes // 1024}KB) / 失敗{failed} / {elapsed:.1f}秒")
+        return {'entries': len(entries), 'reused': reused, 'to_render': len(pending),
+                'rendered': rendered, 'failed': failed, 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='静的Q&A回答音声の事前生成')
+    parser.add_argument('--languages', default='ja,en', help='対象言語（カンマ区切り）')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('PRERENDER_CONCURRENCY', '4')),
+                        help='同時に実行するTTSリクエスト数')
+    parser.add_argument('--force', action='store_true', help='既存の音声も再生成する')
+    parser.add_argument('--dry-run', action='store_true', help='生成対象の表示のみ')
+    parser.add_argument('--manifest', default=None, help='マニフェストの出力先')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from modules.audio_cache import AudioCache
+    from modules.openai_tts_client import OpenAITTSClient
+    from modules.coe_font_client import CoeFontClient
+    from modules.audio_encoder import AudioEncoder
+    from modules.audio_postprocess import AudioPostProcessor
+
+    coe_font_client = CoeFontClient()
+    if not coe_font_client.is_available():
+        print("⚠️ CoeFont設定が不完全なため、日本語もOpenAI TTSで生成します")
+
+    encoder = AudioEncoder()
+    prerenderer = StaticAudioPrerenderer(
+        audio_cache=AudioCache(),
+        tts_client=OpenAITTSClient(),
+        coe_font_client=coe_font_client,
+        concurrency=args.concurrency,
+        encoder=encoder,
+        postprocessor=AudioPostProcessor(decode_pcm=encoder.decode_pcm)
+    )
+    languages = [lang.strip() for lang in args.languages.split(',') if lang.strip()]
+    prerenderer.run(languages, force=args.force, dry_run=args.dry_run, manifest_path=args.manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -620,4 +620,27 @@ def get_contextual_suggestions_multilang(context=None, language='ja'):
         return get_contextual_suggestions(context)
         
     # application.py との互換性のために追加
-STATIC_QA_PAIRS = static_qa_responses  # 既存の辞書を参照
\ No newline at end of file
+STATIC_QA_PAIRS = static_qa_responses  # 既存の辞書を参照
+
+# ============================================================================
+# 🎯 同じ質問を繰り返された時の前置き（質問回数 → 前置き文）
+# ============================================================================
+REPEAT_QUESTION_PREFIXES = {
+    2: "あ、さっきも聞かれたね。",
+    3: "また同じ質問？よっぽど気になるんやね〜。",
+    4: "もう覚えてや〜（笑）でも、もう一回説明するね。"
+}
+
+def get_repeat_question_prefix(question_count):
+    """
+    質問回数に応じた前置き文を取得
+
+    Args:
+        question_count: この質問が何回目か
+
+    Returns:
+        str: 前置き文（初回は空文字）
+    """
+    if question_count <= 1:
+        return ""
+    return REPEAT_QUESTION_PREFIXES[min(question_count, 4)]
\ No newline at end of file
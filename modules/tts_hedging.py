@@ -0,0 +1,182 @@
+# modules/tts_hedging.py
+# -*- coding: utf-8 -*-
+# 優先エンジンの応答が遅い場合に別エンジンへ並行リクエストを出す（ヘッジ）モジュール
+import os
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Optional
+
+
+def get_engine_preference(value: Optional[str] = None) -> Dict[str, str]:
+    """
+    言語別の優先TTSエンジンを取得
+
+    'ja:coe_font,en:openai_tts' 形式（環境変数 TTS_ENGINE_PREFERENCE）を解析する。
+    """
+    if value is None:
+        value = os.getenv('TTS_ENGINE_PREFERENCE', 'ja:coe_font,en:openai_tts')
+    preference = {}
+    for item in value.split(','):
+        if ':' in item:
+            language, engine = item.split(':', 1)
+            preference[language.strip()] = engine.strip()
+    return preference
+
+
+class HedgedTTSRunner:
+    """
+    優先エンジンの観測レイテンシのパーセンタイルを期限として、
+    期限までに応答がなければ代替エンジンにも並行リクエストを出し、先に成功した方を使う。
+
+    負けた側のリクエストは中断せず、結果は呼び出し側（キャッシュ保存など）で活かされる。
+    """
+
+    def __init__(self,
+                 executor: Executor,
+                 percentile: float = 90,
+                 min_delay: float = 1.0,
+                 max_delay: float = 8.0,
+                 default_delay: float = 3.0,
+                 min_samples: int = 20,
+                 window: int = 200):
+        """
+        Args:
+            executor: 音声合成を実行するExecutor
+            percentile: ヘッジ期限に使うレイテンシのパーセンタイル
+            min_delay / max_delay: ヘッジ期限の下限・上限（秒）
+            default_delay: 観測数が min_samples に満たない間の期限（秒）
+            window: エンジンごとに保持するレイテンシの件数
+        """
+        self.executor = executor
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'primary_only': 0,     # 期限内に優先エンジンが成功
+            'fallbacks': 0,        # 優先エンジンが期限内に失敗 → 代替エンジンを直列実行
+            'hedged': 0,           # 期限切れで代替エンジンにも並行リクエスト
+            'hedge_wins': 0,       # ヘッジ後、代替エンジンが先に成功
+            'hedge_losses': 0,     # ヘッジ後、優先エンジンが先に成功
+            'wasted_calls': 0,     # 結果が使われなかった成功リクエスト
+            'failures': 0          # どちらのエンジンも失敗
+        }
+
+    def record_latency(self, engine: str, seconds: float):
+        """上流エンジンの応答時間を記録（キャッシュヒットは記録しない）"""
+        with self._lock:
+            self._latencies[engine].append(seconds)
+
+    def get_percentile(self, engine: str, percentile: Optional[float] = None) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies[engine])
+        if not samples:
+            return None
+        percentile = self.percentile if percentile is None else percentile
+        index = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def get_deadline(self, engine: str) -> float:
+        """ヘッジを出すまでの待ち時間（秒）"""
+        with self._lock:
+            sample_count = len(self._latencies[engine])
+        if sample_count < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, min(self.max_delay, self.get_percentile(engine)))
+
+    def run(self, primary: str, secondary: str, synthesize: Callable[[str], Optional[str]]) -> Optional[str]:
+        """
+        優先エンジンで合成し、期限を過ぎたら代替エンジンと競争させる
+
+        Args:
+            synthesize: エンジン名を受け取り音声データ（失敗時None）を返す関数
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+
+        primary_future = self.executor.submit(self._call, synthesize, primary)
+        done, _ = wait([primary_future], timeout=self.get_deadline(primary))
+        if done:
+            result = primary_future.result()
+            if result:
+                self._count('primary_only')
+                return result
+            # 優先エンジンが早々に失敗した場合は代替エンジンへ直列にフォールバック
+            self._count('fallbacks')
+            result = self._call(synthesize, secondary)
+            if not result:
+                self._count('failures')
+            return result
+
+        print(f"⏱️ {primary} の応答が期限を超過 → {secondary} にヘッジリクエスト")
+        self._count('hedged')
+        pending = {
+            primary_future: primary,
+            self.executor.submit(self._call, synthesize, secondary): secondary
+        }
+        winner = None
+        while pending and winner is None:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                engine = pending.pop(future)
+                result = future.result()
+                if result and winner is None:
+                    winner = engine, result
+                elif result:
+                    self._count('wasted_calls')
+
+        if winner is None:
+            self._count('failures')
+            return None
+
+        engine, result = winner
+        self._count('hedge_losses' if engine == primary else 'hedge_wins')
+        print(f"🏁 ヘッジ結果: {engine} が先に完了")
+        # 残ったリクエストは最後まで実行させ、成功したら無駄になった呼び出しとして数える
+        for future in pending:
+            future.add_done_callback(self._count_if_wasted)
+        return result
+
+    def get_stats(self) -> Dict:
+        """統計情報を取得"""
+        with self._lock:
+            result = dict(self.stats)
+            engines = list(self._latencies.keys())
+            sample_counts = {engine: len(self._latencies[engine]) for engine in engines}
+        result['latency'] = {
+            engine: {
+                'samples': sample_counts[engine],
+                'p50': self.get_percentile(engine, 50),
+                'p90': self.get_percentile(engine, 90),
+                'p99': self.get_percentile(engine, 99),
+                'hedge_deadline': self.get_deadline(engine)
+            }
+            for engine in engines
+        }
+        hedged = result['hedged']
+        result['hedge_win_rate'] = (result['hedge_wins'] / hedged * 100) if hedged else 0.0
+        result['hedge_rate'] = (hedged / result['requests'] * 100) if result['requests'] else 0.0
+        return result
+
+    @staticmethod
+    def _call(synthesize, engine):
+        try:
+            return synthesize(engine)
+        except Exception as e:
+            print(f"❌ 音声合成エラー ({engine}): {e}")
+            return None
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _count_if_wasted(self, future):
+        if future.result():
+            self._count('wasted_calls')
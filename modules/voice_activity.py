@@ -0,0 +1,114 @@
+# modules/voice_activity.py
+# -*- coding: utf-8 -*-
+# 録音から発話区間を検出する（短時間エネルギー＋ゼロ交差率による音声区間検出）
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """
+    短時間エネルギーとゼロ交差率で発話区間を検出する
+
+    - フレームごとのエネルギー（dBFS）が、録音内の雑音レベル（下位パーセンタイル）から
+      margin_db 以上大きいフレームを発話候補とする（無音のない録音に備え、しきい値は最大音量の30dB下を上限にする）
+    - ゼロ交差率が高いフレーム（空調・ホワイトノイズ的な雑音）は、雑音レベルより十分に大きくない限り除く
+    - min_run_ms より短い候補（物音・クリック）は捨て、前後に hangover_ms の余白を付ける
+    """
+
+    def __init__(self,
+                 frame_ms: float = 30.0,
+                 margin_db: Optional[float] = None,
+                 min_db: Optional[float] = None,
+                 max_zcr: float = 0.35,
+                 min_run_ms: float = 90.0,
+                 hangover_ms: Optional[float] = None,
+                 min_speech_ms: Optional[float] = None,
+                 noise_percentile: float = 10.0):
+        """
+        Args:
+            frame_ms: 解析フレームの長さ（ミリ秒）
+            margin_db: 雑音レベルに対する発話のしきい値（dB）
+            min_db: これより小さいフレームは常に無音（dBFS）
+            max_zcr: 雑音とみなすゼロ交差率（1サンプルあたり）
+            min_run_ms: 発話とみなす最短の連続時間（ミリ秒）
+            hangover_ms: 発話区間の前後に残す余白（ミリ秒）
+            min_speech_ms: 発話の合計がこれ未満なら「発話なし」とする（ミリ秒）
+            noise_percentile: 雑音レベルの推定に使うパーセンタイル
+        """
+        self.enabled = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db if margin_db is not None else float(os.getenv('VAD_MARGIN_DB', '10'))
+        self.min_db = min_db if min_db is not None else float(os.getenv('VAD_MIN_DB', '-55'))
+        self.max_zcr = max_zcr
+        self.min_run_ms = min_run_ms
+        self.hangover_ms = hangover_ms if hangover_ms is not None else float(os.getenv('VAD_HANGOVER_MS', '200'))
+        self.min_speech_ms = min_speech_ms if min_speech_ms is not None else float(os.getenv('VAD_MIN_SPEECH_MS', '250'))
+        self.noise_percentile = noise_percentile
+
+    def detect(self, samples: np.ndarray, sample_rate: int) -> Dict:
+        """
+        発話区間を検出
+
+        Returns:
+            {'speech': 発話があるか, 'start': 開始サンプル, 'end': 終了サンプル,
+             'duration': 録音の秒数, 'speech_seconds': 発話フレームの合計秒数,
+             'speech_ratio': 発話の割合, 'trimmed_seconds': 前後から除ける秒数}
+        """
+        duration = samples.size / float(sample_rate) if sample_rate else 0.0
+        frame = max(1, int(sample_rate * self.frame_ms / 1000.0))
+        frame_count = samples.size // frame
+        no_speech = {
+            'speech': False, 'start': 0, 'end': 0,
+            'duration': round(duration, 3), 'speech_seconds': 0.0,
+            'speech_ratio': 0.0, 'trimmed_seconds': round(duration, 3)
+        }
+        if frame_count == 0:
+            return no_speech
+
+        frames = samples[:frame_count * frame].astype(np.float64).reshape(frame_count, frame)
+        energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame)
+
+        noise_db = np.percentile(energy_db, self.noise_percentile)
+        threshold = max(min(noise_db + self.margin_db, energy_db.max() - 30.0), self.min_db)
+        candidate = energy_db > threshold
+        # ゼロ交差率が高いフレームは、雑音レベルを大きく超える場合（摩擦音など）だけ残す
+        candidate &= (zcr < self.max_zcr) | (energy_db > noise_db + 2 * self.margin_db)
+
+        speech = self._drop_short_runs(candidate, int(round(self.min_run_ms / self.frame_ms)))
+        speech_frames = int(np.count_nonzero(speech))
+        if speech_frames * self.frame_ms < self.min_speech_ms:
+            no_speech['speech_seconds'] = round(speech_frames * frame / float(sample_rate), 3)
+            return no_speech
+
+        hangover = int(round(self.hangover_ms / self.frame_ms))
+        first = max(0, int(np.argmax(speech)) - hangover)
+        last = min(frame_count, frame_count - int(np.argmax(speech[::-1])) + hangover)
+        start = first * frame
+        end = samples.size if last == frame_count else last * frame
+        speech_seconds = speech_frames * frame / float(sample_rate)
+        return {
+            'speech': True,
+            'start': start,
+            'end': end,
+            'duration': round(duration, 3),
+            'speech_seconds': round(speech_seconds, 3),
+            'speech_ratio': round(speech_seconds / duration, 3) if duration else 0.0,
+            'trimmed_seconds': round((samples.size - (end - start)) / float(sample_rate), 3)
+        }
+
+    @staticmethod
+    def _drop_short_runs(mask: np.ndarray, min_run: int) -> np.ndarray:
+        """min_run フレームより短い連続区間を取り除く"""
+        if min_run <= 1 or not mask.any():
+            return mask
+        padded = np.concatenate([[False], mask, [False]])
+        edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+        result = mask.copy()
+        for run_start, run_end in zip(edges[::2], edges[1::2]):
+            if run_end - run_start < min_run:
+                result[run_start:run_end] = False
+        return result
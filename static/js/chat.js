@@ -473,7 +473,7 @@
             introductionManager.debugLog(`🎵 音声付き自己紹介: ${emotion}`);
             
             setTimeout(() => {
-                startConversation(emotion, data.audio);
+                startConversation(emotion, data.audio, data.lipSync);
             }, 200);
             
             setTimeout(() => {
@@ -527,6 +527,39 @@
         originalVolume: 1.0  // 元の音量を保存
     };
     
+    // 🔊 文単位で届く音声チャンクの再生状態
+    let audioChunkState = {
+        messageId: null,
+        chunks: {},          // index -> チャンク
+        nextIndex: 0,
+        totalCount: null,    // responseの受信で確定
+        isPlaying: false,
+        started: false,
+        fallback: null       // 音声が1つもなかった場合の処理
+    };
+    
+    // 👄 サーバーで解析済みの口の開き具合（リップシンク）の再生状態
+    let lipSyncState = {
+        audio: null,
+        frameId: null
+    };
+    
+    // ⌨️ response_partial で届く生成途中の回答（入力中の吹き出し）
+    let partialResponseState = {
+        messageId: null,
+        element: null,
+        finishedMessageId: null  // response受信後に遅れて届いた途中経過を無視する
+    };
+    
+    // 🔊 テキスト先行表示後に audio_ready で届く音声の待ち状態
+    const AUDIO_READY_TIMEOUT_MS = 15000;
+    let pendingAudioState = {
+        messageId: null,
+        emotion: 'neutral',
+        fallback: null,
+        timer: null
+    };
+    
     let appState = {
         currentLanguage: 'ja',
         isWaitingResponse: false,
@@ -939,6 +972,11 @@
         socket.on('language_changed', handleLanguageUpdate);
         socket.on('greeting', handleGreetingMessage);
         socket.on('response', handleResponseMessage);
+        socket.on('response_partial', handleResponsePartial);
+        socket.on('audio_chunk', handleAudioChunk);
+        socket.on('audio_ready', handleAudioReady);
+        socket.on('recording_config', handleRecordingConfig);
+        socket.on('audio_upload_aborted', handleAudioUploadAborted);
         socket.on('transcription', handleTranscription);
         socket.on('error', handleErrorMessage);
         socket.on('context_aware_response', handleContextAwareResponse);
@@ -1178,7 +1216,9 @@
                 visitData: visitorManager.visitData,
                 interactionCount: appState.interactionCount,
                 relationshipLevel: relationshipManager.getCurrentLevelStyle(visitorManager.visitData.totalConversations),
-                selectedSuggestions: visitorManager.getSelectedSuggestions()  // 🎯 選択済みサジェスチョンも送信
+                selectedSuggestions: visitorManager.getSelectedSuggestions(),  // 🎯 選択済みサジェスチョンも送信
+                streamAudio: true,  // 🔊 文ごとの音声チャンク受信に対応
+                deferredAudio: true  // 🔊 テキストを先に受け取り、音声は audio_ready で受信
             });
             
             domElements.messageInput.value = '';
@@ -1391,6 +1431,102 @@
         });
     }
     
+    // 🎤 サーバーが推奨する録音形式（変換なしで音声認識に回せる形式）
+    let recordingConfig = {
+        mimeTypes: ['audio/webm;codecs=opus', 'audio/ogg;codecs=opus', 'audio/mp4'],
+        audioBitsPerSecond: 24000,
+        streamingUpload: false,
+        chunkMs: 250,
+        maxChunkBytes: 256 * 1024,
+        maxUploadBytes: 10 * 1024 * 1024
+    };
+    
+    // 📤 録音のストリーミングアップロード状態（録音中にチャンクを順次送信する）
+    let uploadState = {
+        active: false,
+        seq: 0,
+        bytes: 0,
+        sending: Promise.resolve()
+    };
+
+    function handleRecordingConfig(data) {
+        if (data && Array.isArray(data.mimeTypes)) {
+            recordingConfig = Object.assign({}, recordingConfig, data);
+            console.log('🎤 録音形式の設定を受信:', data);
+        }
+    }
+
+    function getRecorderOptions() {
+        const options = {};
+        if (window.MediaRecorder && MediaRecorder.isTypeSupported) {
+            const mimeType = recordingConfig.mimeTypes.find(type => MediaRecorder.isTypeSupported(type));
+            if (mimeType) options.mimeType = mimeType;
+        }
+        if (recordingConfig.audioBitsPerSecond) {
+            options.audioBitsPerSecond = recordingConfig.audioBitsPerSecond;
+        }
+        return options;
+    }
+    
+    // 録音と一緒に送る会話の情報
+    function getVoiceMessageContext() {
+        return {
+            language: appState.currentLanguage,
+            visitorId: visitorManager.visitorId,
+            conversationHistory: conversationMemory.getRecentContext(5),
+            visitData: visitorManager.visitData,
+            interactionCount: appState.interactionCount,
+            relationshipLevel: relationshipManager.getCurrentLevelStyle(visitorManager.visitData.totalConversations),
+            selectedSuggestions: visitorManager.getSelectedSuggestions(),
+            streamAudio: true,
+            deferredAudio: true
+        };
+    }
+    
+    function startAudioUpload(mimeType) {
+        uploadState = { active: true, seq: 0, bytes: 0, sending: Promise.resolve() };
+        socket.emit('audio_upload_start', { mimeType: mimeType });
+    }
+    
+    function sendAudioUploadChunk(blob) {
+        if (!uploadState.active || !blob || blob.size === 0) return;
+        uploadState.bytes += blob.size;
+        if (blob.size > recordingConfig.maxChunkBytes || uploadState.bytes > recordingConfig.maxUploadBytes) {
+            // サーバーの上限を超える前に録音を打ち切る（送信済みの分で認識する）
+            console.warn('⚠️ 録音が長すぎるため送信を打ち切ります');
+            uploadState.bytes -= blob.size;
+            if (audioState.isRecording) stopVoiceRecording();
+            return;
+        }
+        const seq = uploadState.seq++;
+        // Blobの読み出しは非同期のため、送信順が入れ替わらないようつなぐ
+        uploadState.sending = uploadState.sending
+            .then(() => blob.arrayBuffer())
+            .then(buffer => {
+                socket.emit('audio_upload_chunk', { seq: seq, data: buffer });
+            });
+    }
+    
+    function finishAudioUpload() {
+        if (!uploadState.active) {
+            // サーバー側で中断された
+            appState.isWaitingResponse = false;
+            updateConnectionStatus('connected');
+            return;
+        }
+        const chunks = uploadState.seq;
+        uploadState.sending.then(() => {
+            socket.emit('audio_upload_end', Object.assign({ chunks: chunks }, getVoiceMessageContext()));
+            uploadState.active = false;
+        });
+    }
+    
+    function handleAudioUploadAborted(data) {
+        console.warn('⚠️ 音声アップロードが中断されました:', data && data.message);
+        uploadState.active = false;
+        if (audioState.isRecording) stopVoiceRecording();
+    }
+    
     function startVoiceRecording() {
         appState.isWaitingResponse = true;
         updateConnectionStatus('recording');
@@ -1398,34 +1534,48 @@
         
         navigator.mediaDevices.getUserMedia({ audio: true })
             .then(function(stream) {
-                audioState.recorder = new MediaRecorder(stream);
+                const recorderOptions = getRecorderOptions();
+                try {
+                    audioState.recorder = new MediaRecorder(stream, recorderOptions);
+                } catch (e) {
+                    console.warn('推奨の録音形式を使えないため既定の形式で録音します:', e);
+                    audioState.recorder = new MediaRecorder(stream);
+                }
                 audioState.chunks = [];
+                const mimeType = audioState.recorder.mimeType || recorderOptions.mimeType || 'audio/webm';
+                // 録音しながらチャンクを送り、サーバー側で受信と並行して変換する
+                const streaming = recordingConfig.streamingUpload;
+                if (streaming) startAudioUpload(mimeType);
                 
                 audioState.recorder.ondataavailable = function(e) {
-                    audioState.chunks.push(e.data);
+                    if (streaming) {
+                        sendAudioUploadChunk(e.data);
+                    } else {
+                        audioState.chunks.push(e.data);
+                    }
                 };
                 
                 audioState.recorder.onstop = function() {
-                    const audioBlob = new Blob(audioState.chunks, { type: 'audio/webm' });
+                    stream.getTracks().forEach(track => track.stop());
                     
-                    convertBlobToBase64(audioBlob).then(base64data => {
-                        // 会話履歴と訪問者情報を含めて送信
-                        socket.emit('audio_message', { 
-                            audio: base64data,
-                            language: appState.currentLanguage,
-                            visitorId: visitorManager.visitorId,
-                            conversationHistory: conversationMemory.getRecentContext(5),
-                            visitData: visitorManager.visitData,
-                            interactionCount: appState.interactionCount,
-                            relationshipLevel: relationshipManager.getCurrentLevelStyle(visitorManager.visitData.totalConversations),
-                            selectedSuggestions: visitorManager.getSelectedSuggestions()
-                        });
-                    });
+                    if (streaming) {
+                        finishAudioUpload();
+                        return;
+                    }
                     
-                    stream.getTracks().forEach(track => track.stop());
+                    const audioBlob = new Blob(audioState.chunks, { type: mimeType });
+                    
+                    audioBlob.arrayBuffer().then(buffer => {
+                        // 会話履歴と訪問者情報を含めて送信（音声はBase64にせずバイナリのまま送る）
+                        socket.emit('audio_message', Object.assign({ audio: buffer, mimeType: mimeType }, getVoiceMessageContext()));
+                    });
                 };
                 
-                audioState.recorder.start();
+                if (streaming) {
+                    audioState.recorder.start(recordingConfig.chunkMs);
+                } else {
+                    audioState.recorder.start();
+                }
                 domElements.voiceButton.textContent = '■';
                 domElements.voiceButton.classList.add('recording');
                 audioState.isRecording = true;
@@ -1455,19 +1605,6 @@
         updateConnectionStatus('processing');
     }
     
-    function convertBlobToBase64(blob) {
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onloadend = function() {
-                resolve(reader.result);
-            };
-            reader.onerror = function() {
-                reject(new Error("ファイル変換エラー"));
-            };
-            reader.readAsDataURL(blob);
-        });
-    }
-    
     // ====== 感情送信システム ======
     function sendEmotionToAvatar(emotion, isTalking = false, reason = 'manual', conversationId = null) {
         const now = Date.now();
@@ -1604,7 +1741,7 @@
     }
     
     // ====== 会話フロー制御 ======
-    function startConversation(emotion, audioData) {
+    function startConversation(emotion, audioData, lipSync) {
         console.log('🎬 会話開始:', emotion);
         
         stopAllAudio();
@@ -1621,7 +1758,7 @@
         sendEmotionToAvatar(emotion, true, 'conversation_start', conversationId);
         
         if (audioData && !isAudioPlaying()) {
-            playAudioWithLipSync(audioData, emotion);
+            playAudioWithLipSync(audioData, emotion, null, lipSync);
         } else if (!audioData) {
             setTimeout(() => {
                 endConversation();
@@ -1636,6 +1773,8 @@
     }
 
     function stopAllAudio() {
+        stopLipSyncPlayback();
+        
         if (unityState.activeAudioElement) {
             unityState.activeAudioElement.pause();
             unityState.activeAudioElement.currentTime = 0;
@@ -1651,9 +1790,114 @@
         console.log('🔇 すべての音声を停止しました');
     }
 
+    // 🔊 Opus(Ogg)を再生できないブラウザ（古いSafariなど）ではMP3版を要求する
+    const canPlayOpus = !!new Audio().canPlayType('audio/ogg; codecs="opus"');
+    
+    function resolveAudioSource(audioData) {
+        if (isBinaryAudio(audioData)) {
+            // バイナリ添付 {data: ArrayBuffer, mime} はBlob URLにして再生する（再生後に解放）
+            if (!audioData.url) {
+                audioData.url = URL.createObjectURL(new Blob([audioData.data], { type: audioData.mime }));
+            }
+            return audioData.url;
+        }
+        if (!canPlayOpus && audioData && audioData.indexOf('codec=opus') !== -1) {
+            return audioData.replace('codec=opus', 'codec=mp3');
+        }
+        return audioData;
+    }
+    
+    function isBinaryAudio(audioData) {
+        return !!audioData && typeof audioData === 'object' && audioData.data instanceof ArrayBuffer;
+    }
+    
+    function releaseAudioSource(audioData) {
+        if (isBinaryAudio(audioData) && audioData.url) {
+            URL.revokeObjectURL(audioData.url);
+            audioData.url = null;
+        }
+    }
+    
     // 🔇 音声再生（ミュート対応版）
-    function playAudioWithLipSync(audioData, emotion) {
-        const audio = new Audio(audioData);
+    // 👄 口の開き具合（0〜1）をUnityへ直接送る（毎フレーム送るため感情メッセージのキューは通さない）
+    function sendMouthOpenToUnity(value) {
+        const instance = unityState.instance;
+        if (!instance) return false;
+        
+        const message = JSON.stringify({
+            type: "mouth",
+            value: value,
+            sessionId: unityState.sessionId
+        });
+        try {
+            if (instance.Module && instance.Module.SendMessage) {
+                instance.Module.SendMessage('WebGLBridge', 'OnMessage', message);
+            } else if (instance.SendMessage) {
+                instance.SendMessage('WebGLBridge', 'OnMessage', message);
+            } else {
+                return false;
+            }
+            return true;
+        } catch (error) {
+            console.error('口パク送信エラー:', error);
+            return false;
+        }
+    }
+
+    function decodeLipSyncEnvelope(lipSync) {
+        if (!lipSync || !lipSync.envelope) return null;
+        try {
+            const binary = atob(lipSync.envelope);
+            const envelope = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                envelope[i] = binary.charCodeAt(i);
+            }
+            return envelope;
+        } catch (error) {
+            console.error('リップシンクデータの解析エラー:', error);
+            return null;
+        }
+    }
+
+    // サーバーで計算済みのエンベロープを再生位置に合わせて送る（クライアント側での音声解析は不要）
+    function startLipSyncPlayback(audio, lipSync) {
+        stopLipSyncPlayback();
+        
+        const envelope = decodeLipSyncEnvelope(lipSync);
+        if (!envelope || envelope.length === 0) return;
+        
+        const fps = lipSync.fps || 60;
+        let lastValue = -1;
+        lipSyncState.audio = audio;
+        
+        const step = () => {
+            if (lipSyncState.audio !== audio) return;
+            
+            const index = Math.floor(audio.currentTime * fps);
+            const value = index < envelope.length ? envelope[index] : 0;
+            if (value !== lastValue) {
+                sendMouthOpenToUnity(value / 255);
+                lastValue = value;
+            }
+            lipSyncState.frameId = requestAnimationFrame(step);
+        };
+        lipSyncState.frameId = requestAnimationFrame(step);
+    }
+
+    function stopLipSyncPlayback() {
+        if (lipSyncState.frameId !== null) {
+            cancelAnimationFrame(lipSyncState.frameId);
+        }
+        if (lipSyncState.audio) {
+            sendMouthOpenToUnity(0);
+        }
+        lipSyncState.audio = null;
+        lipSyncState.frameId = null;
+    }
+    
+    function playAudioWithLipSync(audioData, emotion, onEnded, lipSync) {
+        const finish = onEnded || onAudioEnd;
+        const audio = new Audio(resolveAudioSource(audioData));
         audio.muted = audioState.isMuted;  // 現在のミュート状態を適用
         
         unityState.activeAudioElement = audio;
@@ -1665,16 +1909,23 @@
         
         audio.onplay = function() {
             console.log(`🔊 音声再生開始 (ミュート: ${audioState.isMuted})`);
+            if (lipSync) {
+                startLipSyncPlayback(audio, lipSync);
+            }
         };
         
         audio.onended = function() {
             console.log('🔊 音声再生完了');
-            onAudioEnd();
+            if (lipSyncState.audio === audio) stopLipSyncPlayback();
+            releaseAudioSource(audioData);
+            finish();
         };
         
         audio.onerror = function(error) {
             console.error('🔊 音声再生エラー:', error);
-            onAudioEnd();
+            if (lipSyncState.audio === audio) stopLipSyncPlayback();
+            releaseAudioSource(audioData);
+            finish();
         };
         
         audio.play().catch(error => {
@@ -1690,10 +1941,10 @@
                     console.log('🔇 ミュート状態で再生を開始しました');
                 }).catch(e => {
                     console.error('ミュート状態でも再生できませんでした:', e);
-                    onAudioEnd();
+                    finish();
                 });
             } else {
-                onAudioEnd();
+                finish();
             }
         });
     }
@@ -1703,6 +1954,136 @@
         endConversation();
     }
 
+    // ====== 🔊 音声チャンクの順次再生 ======
+    function resetAudioChunkState(messageId) {
+        audioChunkState.messageId = messageId || null;
+        audioChunkState.chunks = {};
+        audioChunkState.nextIndex = 0;
+        audioChunkState.totalCount = null;
+        audioChunkState.isPlaying = false;
+        audioChunkState.started = false;
+        audioChunkState.fallback = null;
+    }
+
+    function handleAudioChunk(data) {
+        if (!data || !data.messageId) return;
+        
+        if (data.messageId !== audioChunkState.messageId) {
+            // 新しい応答の音声が届いたら前の応答の再生を止める
+            stopAllAudio();
+            resetAudioChunkState(data.messageId);
+        }
+        
+        console.log(`🔊 音声チャンク受信: #${data.index} (${data.audio ? '音声あり' : '音声なし'})`);
+        if (typeof data.audio === 'string' && !data.audio.startsWith('data:')) {
+            // 前のチャンクの再生中に取得を始めておく（2回目以降はブラウザキャッシュから読まれる）
+            const prefetch = new Audio();
+            prefetch.preload = 'auto';
+            prefetch.src = resolveAudioSource(data.audio);
+        }
+        audioChunkState.chunks[data.index] = data;
+        playNextAudioChunk();
+    }
+
+    function playNextAudioChunk() {
+        if (audioChunkState.isPlaying) return;
+        
+        while (audioChunkState.chunks[audioChunkState.nextIndex]) {
+            const chunk = audioChunkState.chunks[audioChunkState.nextIndex];
+            delete audioChunkState.chunks[audioChunkState.nextIndex];
+            audioChunkState.nextIndex++;
+            
+            // 合成に失敗したチャンクは飛ばす
+            if (!chunk.audio) continue;
+            
+            if (!audioChunkState.started) {
+                // 最初のチャンクで会話（talking）を開始
+                audioChunkState.started = true;
+                conversationState.isActive = true;
+                conversationState.startTime = Date.now();
+                conversationState.currentEmotion = chunk.emotion || 'neutral';
+                conversationState.conversationId = 'conv_' + Date.now() + '_' + Math.random().toString(36).substring(2, 9);
+                sendEmotionToAvatar(conversationState.currentEmotion, true, 'conversation_start', conversationState.conversationId);
+            }
+            
+            const messageId = audioChunkState.messageId;
+            audioChunkState.isPlaying = true;
+            playAudioWithLipSync(chunk.audio, chunk.emotion, () => {
+                if (audioChunkState.messageId !== messageId) return;
+                audioChunkState.isPlaying = false;
+                playNextAudioChunk();
+            }, chunk.lipSync);
+            return;
+        }
+        
+        // 全チャンクを再生し終えたら会話を終了
+        if (audioChunkState.totalCount !== null && audioChunkState.nextIndex >= audioChunkState.totalCount) {
+            const started = audioChunkState.started;
+            const fallback = audioChunkState.fallback;
+            resetAudioChunkState();
+            if (started) {
+                endConversation();
+            } else if (fallback) {
+                fallback();
+            }
+        }
+    }
+
+    function finishAudioChunkStream(messageId, totalCount, fallback) {
+        if (audioChunkState.messageId !== messageId) {
+            // チャンクより先に応答が届くことはないが、念のため状態を合わせる
+            stopAllAudio();
+            resetAudioChunkState(messageId);
+        }
+        audioChunkState.totalCount = totalCount;
+        audioChunkState.fallback = fallback;
+        playNextAudioChunk();
+    }
+
+    // ====== 🔊 後送音声（audio_ready）の再生 ======
+    function clearPendingAudio() {
+        if (pendingAudioState.timer) {
+            clearTimeout(pendingAudioState.timer);
+        }
+        pendingAudioState.messageId = null;
+        pendingAudioState.emotion = 'neutral';
+        pendingAudioState.fallback = null;
+        pendingAudioState.timer = null;
+    }
+
+    function waitForAudioReady(messageId, emotion, fallback) {
+        clearPendingAudio();
+        pendingAudioState.messageId = messageId;
+        pendingAudioState.emotion = emotion;
+        pendingAudioState.fallback = fallback;
+        // 音声が届かない場合はテキストのみの会話にフォールバック
+        pendingAudioState.timer = setTimeout(() => {
+            if (pendingAudioState.messageId !== messageId) return;
+            console.warn('⏱️ 音声の到着がタイムアウト - テキストのみで会話');
+            const pendingFallback = pendingAudioState.fallback;
+            clearPendingAudio();
+            if (pendingFallback) pendingFallback();
+        }, AUDIO_READY_TIMEOUT_MS);
+    }
+
+    function handleAudioReady(data) {
+        if (!data || !data.messageId || data.messageId !== pendingAudioState.messageId) {
+            // 既に次の応答を受信済み、またはタイムアウト済み
+            return;
+        }
+        
+        const emotion = pendingAudioState.emotion || data.emotion || 'neutral';
+        const fallback = pendingAudioState.fallback;
+        clearPendingAudio();
+        
+        console.log(`🔊 後送音声を受信: ${data.audio ? '音声あり' : '音声なし (' + (data.error || 'unknown') + ')'}`);
+        if (data.audio) {
+            startConversation(emotion, data.audio, data.lipSync);
+        } else if (fallback) {
+            fallback();
+        }
+    }
+
     function endConversation() {
         console.log('🏁 会話終了処理開始');
         
@@ -1941,7 +2322,34 @@
         showSuggestions();
         
         // 音声付き自己紹介を開始
-        requestIntroduction('greeting_with_audio', { emotion, audio: data.audio });
+        requestIntroduction('greeting_with_audio', { emotion, audio: data.audio, lipSync: data.lipSync });
+    }
+    
+    function handleResponsePartial(data) {
+        if (!data || !data.messageId || data.messageId === partialResponseState.finishedMessageId) return;
+        
+        if (data.messageId !== partialResponseState.messageId || !partialResponseState.element) {
+            partialResponseState.messageId = data.messageId;
+            partialResponseState.element = addMessage('', false);
+            partialResponseState.element.classList.add('typing');
+        }
+        // 途中経過は回答全体のスナップショットなので置き換える
+        partialResponseState.element.textContent = data.text || '';
+        smoothScrollToBottom(domElements.chatMessages);
+    }
+    
+    function finishPartialResponse(data) {
+        // 入力中の吹き出しがあれば確定した回答で置き換える
+        const element = data.messageId && data.messageId === partialResponseState.messageId
+            ? partialResponseState.element
+            : null;
+        partialResponseState.finishedMessageId = data.messageId || null;
+        partialResponseState.messageId = null;
+        partialResponseState.element = null;
+        if (!element) return false;
+        element.textContent = data.message;
+        element.classList.remove('typing');
+        return true;
     }
     
     function handleResponseMessage(data) {
@@ -1950,7 +2358,9 @@
             updateConnectionStatus('connected');
             appState.lastResponseTime = Date.now();
             
-            addMessage(data.message, false);
+            if (!finishPartialResponse(data)) {
+                addMessage(data.message, false);
+            }
             
             // AIの応答を会話履歴に追加
             conversationMemory.addMessage('assistant', data.message, data.emotion);
@@ -1971,9 +2381,7 @@
             // 感情の処理
             let emotion = data.emotion || 'neutral';
             
-            if (data.audio) {
-                startConversation(emotion, data.audio);
-            } else {
+            const startSimpleConversation = () => {
                 // 音声データがない場合でもneutral+talkingで会話を開始
                 console.log('🔇 音声データなし - シンプル会話モード');
                 
@@ -1988,6 +2396,22 @@
                 setTimeout(() => {
                     sendEmotionToAvatar(emotion, false, 'simple_conversation_end');
                 }, estimatedDuration * 1000);
+            };
+            
+            // 前の応答の後送音声は破棄
+            clearPendingAudio();
+            
+            if (data.streamed && data.audioChunkCount > 0) {
+                // 音声は audio_chunk で再生中（または再生済み）
+                finishAudioChunkStream(data.messageId, data.audioChunkCount, startSimpleConversation);
+            } else if (data.audioPending) {
+                // テキストを先に表示し、感情モーションだけ先に始める（音声は audio_ready で届く）
+                sendEmotionToAvatar(emotion, false, 'text_first');
+                waitForAudioReady(data.messageId, emotion, startSimpleConversation);
+            } else if (data.audio) {
+                startConversation(emotion, data.audio, data.lipSync);
+            } else {
+                startSimpleConversation();
             }
             
             if (data.suggestions && data.suggestions.length > 0) {
@@ -2022,6 +2446,13 @@
     
     function handleErrorMessage(data) {
         console.error('エラー:', data.message);
+        // 回答の途中でエラーになった場合は入力中の表示を止める
+        if (partialResponseState.element) {
+            partialResponseState.element.classList.remove('typing');
+            partialResponseState.finishedMessageId = partialResponseState.messageId;
+            partialResponseState.messageId = null;
+            partialResponseState.element = null;
+        }
         showError(data.message || '不明なエラーが発生しました');
         updateConnectionStatus('error');
         sendEmotionToAvatar('neutral', false, 'emergency');